@@ -0,0 +1,66 @@
+"""
+Throughput of `_poll_once` against fake Gmail/Gemini backends.
+
+    python -m app.bench.concurrency --messages 200 --latency 0.05 --concurrency 1 16
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from app import main
+from app.bench.fakes import FakeGeminiClient, FakeGmailService, make_message
+from app.core import config
+from app.email.sync import MailboxSync
+from app.graph import deps
+from app.graph.build_graph import build_graph
+
+SUBJECTS = ["Invoice request", "Refund for cancellation", "Change booking please", "Lunch on friday?"]
+
+
+def _setup(n: int, latency: float):
+    msgs = [make_message(f"m{i:05d}", SUBJECTS[i % len(SUBJECTS)], "Hello, can you help?") for i in range(n)]
+    service = FakeGmailService(msgs, latency=latency)
+    llm = FakeGeminiClient(latency=latency)
+    texts = ["Invoices are sent free of charge.", "Refunds depend on fare.", "Bookings can be changed online."]
+    import numpy as np
+    index = {"texts": texts, "embeds": np.array(llm.embed(texts))}
+    main.SERVICE, main.LLM, main.INDEX = service, llm, index
+    main.KEYWORDS = {"phrases": ["change booking"], "unigrams": ["invoice", "refund", "cancellation"]}
+    main.GRAPH = build_graph()
+    main.SYNC = MailboxSync("", mode="full")
+    deps.set_runtime(service, llm, {}, index)
+    return service, llm
+
+
+def run(n: int, latency: float, concurrency: int) -> float:
+    config.MAX_CONCURRENCY = concurrency
+    main.EXECUTOR = None
+    service, llm = _setup(n, latency)
+    t0 = time.perf_counter()
+    asyncio.run(main._poll_once())
+    dt = time.perf_counter() - t0
+    main.EXECUTOR.shutdown(wait=True)
+    calls = sum(service.calls.values()) + sum(llm.calls.values())
+    print(f"concurrency={concurrency:>3}  {n} msgs in {dt:6.2f}s  {n / dt:7.1f} msg/s  api_calls={calls}")
+    return dt
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=200)
+    ap.add_argument("--latency", type=float, default=0.05, help="seconds per fake API call")
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 16])
+    args = ap.parse_args()
+    config.REPLY_CACHE_ENABLED = False  # measure concurrency, not cache hits on repeated fake emails
+    with tempfile.TemporaryDirectory(prefix="agent-bench-") as tmp:
+        # event logs go to a scratch dir (never data/)
+        config.LOGS_PATH = os.path.join(tmp, "logs.jsonl")
+        config.LOG_SEGMENT_DIR = os.path.join(tmp, "log_segments")
+        times = [run(args.messages, args.latency, c) for c in args.concurrency]
+        deps.close_logs()
+    if len(times) > 1:
+        print(f"speedup {args.concurrency[-1]} vs {args.concurrency[0]}: {times[0] / times[-1]:.1f}x")
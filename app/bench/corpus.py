@@ -0,0 +1,109 @@
+"""
+Synthetic customer emails seeded from the policy FAQ.
+
+Every numbered / "?" question in airlines_policy.md becomes a template;
+emails paraphrase it with greetings, filler and sign-offs, and a share of
+them carry PII, repeat an earlier question (reply-cache hits) or are off
+topic (keyword-gate SKIPs). Fully determined by `seed`.
+
+    python -m app.bench.corpus --messages 20 --seed 7
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import re
+from typing import Any, Dict, List, Tuple
+
+from app.bench.fakes import make_message
+from app.retrieval.chunker import RE_QUESTION, _sections
+
+GREETINGS = ["Hi,", "Hello,", "Dear support,", "Good morning,", "Hi team,"]
+FILLERS = [
+    "I booked a trip for next month.",
+    "I have a flight coming up soon.",
+    "My family and I are travelling in the summer.",
+    "I couldn't find this on the website.",
+    "",
+]
+SIGNOFFS = ["Thanks,\nAlex", "Best regards,\nSam", "Thank you!\nJordan", "Kind regards,\nTaylor"]
+SUBJECT_PREFIXES = ["Question: ", "Help with ", "", "Re: ", "Query about "]
+OFF_TOPIC = [
+    ("Lunch on friday?", "Are we still on for lunch this Friday?"),
+    ("Newsletter", "Here is this week's newsletter."),
+    ("Your order has shipped", "Your package is on its way."),
+]
+PII = [
+    "My booking reference is QX7R2P.",
+    "You can call me on +41 44 564 45 45.",
+    "My email is alex.traveller@example.org.",
+    "My card ending 4111 1111 1111 1111 was charged twice.",
+]
+
+
+def policy_questions(md: str) -> List[Tuple[str, str]]:
+    """[(section title, question text)] for every FAQ question line."""
+    out: List[Tuple[str, str]] = []
+    for path, lines in _sections(md):
+        title = path[-1][1] if path else ""
+        for line in lines:
+            if RE_QUESTION.match(line) and not line.startswith(("\t", "  ")):
+                q = re.sub(r"^\s*(?:\d+[.)]|Q[:.])\s*", "", line).strip()
+                if q:
+                    out.append((title, q))
+    return out
+
+
+def generate(md: str, n: int, seed: int = 0, pii_rate: float = 0.1, repeat_rate: float = 0.2,
+             off_topic_rate: float = 0.1) -> List[Dict[str, Any]]:
+    """
+    `n` Gmail 'full' messages. Each carries a `_bench` dict with the source
+    question (or kind) so evaluations can check what was expected.
+    """
+    rng = random.Random(seed)
+    questions = policy_questions(md)
+    if not questions:
+        raise ValueError("no questions found in policy markdown")
+    sent: List[Tuple[str, str, str]] = []
+    msgs: List[Dict[str, Any]] = []
+    for i in range(n):
+        mid = f"bench{seed:03d}-{i:05d}"
+        r = rng.random()
+        if r < off_topic_rate:
+            subject, body = rng.choice(OFF_TOPIC)
+            kind, question = "off_topic", ""
+        elif r < off_topic_rate + repeat_rate and sent:
+            subject, body, question = rng.choice(sent)  # verbatim repeat
+            kind = "repeat"
+        else:
+            title, question = rng.choice(questions)
+            subject = rng.choice(SUBJECT_PREFIXES) + title
+            parts = [rng.choice(GREETINGS), rng.choice(FILLERS), question]
+            kind = "question"
+            if rng.random() < pii_rate:
+                parts.append(rng.choice(PII))
+                kind = "pii"
+            parts.append(rng.choice(SIGNOFFS))
+            body = "\n\n".join(p for p in parts if p)
+            if kind == "question":
+                sent.append((subject, body, question))
+        msg = make_message(mid, subject, body)
+        msg["_bench"] = {"kind": kind, "question": question}
+        msgs.append(msg)
+    return msgs
+
+
+if __name__ == "__main__":
+    from app.core import config
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--policy", default=config.POLICY_MD)
+    ap.add_argument("--messages", type=int, default=10)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    md = open(args.policy, "r", encoding="utf-8").read()
+    from app.email.gmail_client import extract_text_body, headers_map
+
+    for m in generate(md, args.messages, args.seed):
+        print(f"--- [{m['_bench']['kind']}] {headers_map(m).get('Subject')}")
+        print(extract_text_body(m))
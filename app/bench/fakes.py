@@ -0,0 +1,373 @@
+"""
+In-memory stand-ins for the Gmail service and GeminiClient.
+
+They implement only the surface used by app.email.gmail_client and
+app.graph.nodes, with a configurable per-call latency so blocking
+behaviour (and therefore concurrency) can be measured offline.
+
+FakeGenai goes one level lower: it replaces the google-genai client
+*inside* a real GeminiClient, so rate limiting, retries (with injected
+429s), the embedding cache and metrics all run as in production.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.keywords.extract_keywords import tokenize
+
+
+def hashed_embedding(text: str, dim: int = 768) -> List[float]:
+    """
+    Deterministic bag-of-words embedding (feature hashing of content words),
+    so texts sharing vocabulary are close: good enough for offline
+    retrieval benchmarks.
+    """
+    vec = np.zeros(dim, dtype=np.float32)
+    for tok in tokenize(text):
+        h = int.from_bytes(hashlib.md5(tok.encode("utf-8")).digest()[:8], "little")
+        vec[h % dim] += 1.0 if (h >> 63) & 1 else -1.0
+    n = float(np.linalg.norm(vec))
+    if n == 0.0:
+        vec[int(hashlib.md5(text.encode("utf-8")).hexdigest(), 16) % dim] = 1.0
+        n = 1.0
+    return (vec / n).tolist()
+
+
+class _Req:
+    """A request object; counted as an API call only when it is executed."""
+
+    def __init__(self, svc: "FakeGmailService", name: str, fn):
+        self.svc = svc
+        self.name = name
+        self._fn = fn
+
+    def execute(self):
+        self.svc._count(self.svc.calls, self.name)
+        if self.svc.latency:
+            time.sleep(self.svc.latency)
+        return self._fn()
+
+
+class _Messages:
+    def __init__(self, svc: "FakeGmailService"):
+        self.svc = svc
+
+    def list(self, userId="me", q=None, labelIds=None, pageToken=None):
+        def run():
+            ids = sorted(self.svc.messages)
+            start = int(pageToken or 0)
+            page = ids[start : start + self.svc.page_size]
+            resp: Dict[str, Any] = {"messages": [{"id": i, "threadId": i} for i in page]}
+            if start + self.svc.page_size < len(ids):
+                resp["nextPageToken"] = str(start + self.svc.page_size)
+            return resp
+        return self.svc._req("messages.list", run)
+
+    def list_next(self, previous_request=None, previous_response=None):
+        token = (previous_response or {}).get("nextPageToken")
+        if not token:
+            return None
+        return self.list(pageToken=token)
+
+    def get(self, userId="me", id=None, format="full", metadataHeaders=None):
+        return self.svc._req("messages.get", lambda: self.svc.messages[id])
+
+    def send(self, userId="me", body=None):
+        def run():
+            self.svc.sent.append(body)
+            return {"id": f"sent-{len(self.svc.sent)}"}
+        return self.svc._req("messages.send", run)
+
+    def modify(self, userId="me", id=None, body=None):
+        def run():
+            self.svc.modified.append((id, body))
+            return {"id": id}
+        return self.svc._req("messages.modify", run)
+
+
+    def batchModify(self, userId="me", body=None):
+        def run():
+            for mid in body.get("ids", []):
+                self.svc.modified.append((mid, {k: v for k, v in body.items() if k != "ids"}))
+            return {}
+        return self.svc._req("messages.batchModify", run)
+
+
+class _Batch:
+    """
+    BatchHttpRequest stand-in: one counted call (and one latency) per
+    execute(); its sub-requests are tallied in `svc.batched`, not `svc.calls`.
+    """
+
+    def __init__(self, svc: "FakeGmailService", callback):
+        self.svc = svc
+        self.callback = callback
+        self.items: List[Any] = []
+
+    def add(self, request, request_id=None):
+        self.items.append((request_id, request))
+
+    def execute(self):
+        self.svc._req("batch", lambda: None).execute()
+        for rid, req in self.items:
+            self.svc._count(self.svc.batched, req.name)
+            try:
+                resp, exc = req._fn(), None
+            except Exception as e:
+                resp, exc = None, e
+            self.callback(rid, resp, exc)
+
+
+class _Labels:
+    def __init__(self, svc: "FakeGmailService"):
+        self.svc = svc
+
+    def list(self, userId="me"):
+        return self.svc._req("labels.list", lambda: {"labels": [{"name": n, "id": i} for n, i in self.svc.labels.items()]})
+
+    def create(self, userId="me", body=None):
+        def run():
+            lid = f"Label_{len(self.svc.labels) + 1}"
+            self.svc.labels[body["name"]] = lid
+            return {"id": lid, "name": body["name"]}
+        return self.svc._req("labels.create", run)
+
+
+class _History:
+    def __init__(self, svc: "FakeGmailService"):
+        self.svc = svc
+
+    def list(self, userId="me", startHistoryId=None, historyTypes=None, labelId=None, pageToken=None):
+        def run():
+            start = int(startHistoryId or 0)
+            added = self.svc.order[start:]
+            return {
+                "history": [{"messagesAdded": [{"message": {"id": i, "labelIds": ["UNREAD", labelId or "INBOX"]}}]} for i in added],
+                "historyId": str(self.svc.history_id),
+            }
+        return self.svc._req("history.list", run)
+
+    def list_next(self, previous_request=None, previous_response=None):
+        return None
+
+
+class _Users:
+    def __init__(self, svc: "FakeGmailService"):
+        self.svc = svc
+
+    def messages(self):
+        return _Messages(self.svc)
+
+    def labels(self):
+        return _Labels(self.svc)
+
+    def history(self):
+        return _History(self.svc)
+
+    def getProfile(self, userId="me"):
+        return self.svc._req("getProfile", lambda: {"emailAddress": "agent@example.com", "historyId": str(self.svc.history_id)})
+
+    def watch(self, userId="me", body=None):
+        return self.svc._req("watch", lambda: {"historyId": str(self.svc.history_id), "expiration": "0"})
+
+
+class FakeGmailService:
+    """
+    Minimal `service.users().messages()/labels()` fake.
+    `latency` seconds are slept (blocking) on every `.execute()`.
+    `calls` counts executed HTTP round trips by method (a batch is one
+    "batch" call); `batched` counts the sub-requests carried inside batches.
+    """
+
+    def __init__(self, messages: Optional[List[Dict[str, Any]]] = None, latency: float = 0.0, page_size: int = 100):
+        self.messages: Dict[str, Dict[str, Any]] = {m["id"]: m for m in (messages or [])}
+        self.order: List[str] = list(self.messages)  # arrival order; historyId == len(order)
+        self.latency = latency
+        self.page_size = page_size
+        self.labels: Dict[str, str] = {}
+        self.sent: List[Dict[str, Any]] = []
+        self.modified: List[Any] = []
+        self.calls: Dict[str, int] = {}
+        self.batched: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, counts: Dict[str, int], name: str):
+        with self._lock:
+            counts[name] = counts.get(name, 0) + 1
+
+    def _req(self, name: str, fn) -> _Req:
+        return _Req(self, name, fn)
+
+    @property
+    def history_id(self) -> int:
+        return len(self.order)
+
+    def add_messages(self, messages: List[Dict[str, Any]]):
+        """Simulate new mail arriving (visible to list and history.list)."""
+        for m in messages:
+            self.messages[m["id"]] = m
+            self.order.append(m["id"])
+
+    def users(self):
+        return _Users(self)
+
+    def new_batch_http_request(self, callback=None):
+        return _Batch(self, callback)
+
+
+def make_message(msg_id: str, subject: str, body: str, from_addr: str = "customer@example.com") -> Dict[str, Any]:
+    """Build a Gmail API 'full' message with a single text/plain part."""
+    data = base64.urlsafe_b64encode(body.encode("utf-8")).decode("utf-8")
+    return {
+        "id": msg_id,
+        "threadId": msg_id,
+        "labelIds": ["UNREAD"],
+        "snippet": body[:100],
+        "payload": {
+            "mimeType": "text/plain",
+            "headers": [
+                {"name": "Subject", "value": subject},
+                {"name": "From", "value": from_addr},
+                {"name": "Message-ID", "value": f"<{msg_id}@example.com>"},
+            ],
+            "body": {"data": data},
+        },
+    }
+
+
+class FakeGeminiClient:
+    """
+    Deterministic GeminiClient stand-in: hash-based embeddings and canned
+    generations (validator prompts get a passing JSON verdict).
+    """
+
+    def __init__(self, latency: float = 0.0, emb_dim: int = 768):
+        self.latency = latency
+        self.emb_dim = emb_dim
+        self.gen_model = "fake-gen"
+        self.emb_model = "fake-emb"
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _vec(self, text: str, dim: int) -> List[float]:
+        return hashed_embedding(text, dim)
+
+    def embed(self, texts: List[str], task: str = "RETRIEVAL_DOCUMENT", dim: Optional[int] = None,
+              max_wait: Optional[float] = None) -> list[list[float]]:
+        self._count("embed")
+        return [self._vec(t, dim or self.emb_dim) for t in texts]
+
+    def generate(self, prompt: str) -> str:
+        self._count("generate")
+        return fake_response(prompt)
+
+
+DRAFT_TEXT = "Thank you for reaching out. Per our policy, this is possible.\n\nSincerely,\nTeam Indigo"
+VALID_JSON = '{"is_valid": true, "reason": "ok", "tone_ok": true, "grounded_ok": true}'
+RE_FUSED_CHUNK = re.compile(r"^\[C1\] (.*?)(?=^\[C2\] |^Customer email:)", re.MULTILINE | re.DOTALL)
+
+
+def fake_response(prompt: str) -> str:
+    """
+    Canned output for the three prompt kinds: validator JSON, plain draft,
+    and the fused draft (which answers from the first chunk and cites it).
+    """
+    if "citations" in prompt and "JSON ONLY" in prompt:
+        m = RE_FUSED_CHUNK.search(prompt)
+        lines = m.group(1).strip().split("\n") if m else []
+        lines = lines[1:] or lines  # drop the heading-path line
+        answer = " ".join(" ".join(lines).split()[:40])
+        return json.dumps({
+            "reply": f"Thank you for reaching out. {answer}\n\nSincerely,\nTeam Indigo",
+            "citations": ["C1"] if answer else [],
+            "self_check": {"grounded": True, "tone_ok": True, "contains_pii": False,
+                           "needs_escalation": not answer, "notes": ""},
+        })
+    return VALID_JSON if "JSON ONLY" in prompt else DRAFT_TEXT
+
+
+class _FakeModels:
+    def __init__(self, fake: "FakeGenai"):
+        self.fake = fake
+
+    def embed_content(self, model=None, contents=None, config=None):
+        self.fake._enter("embed")
+        dim = getattr(config, "output_dimensionality", None) or 768
+        texts = [contents] if isinstance(contents, str) else list(contents)
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=hashed_embedding(t, dim)) for t in texts])
+
+    def generate_content(self, model=None, contents=None, config=None):
+        self.fake._enter("generate")
+        prompt = contents if isinstance(contents, str) else str(contents)
+        text = self.fake.responder(prompt)
+        usage = SimpleNamespace(prompt_token_count=max(1, len(prompt) // 4), candidates_token_count=max(1, len(text) // 4))
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+class _FakeAioModels:
+    def __init__(self, models: _FakeModels):
+        self._models = models
+
+    async def embed_content(self, **kw):
+        return self._models.embed_content(**kw)
+
+    async def generate_content(self, **kw):
+        return self._models.generate_content(**kw)
+
+
+class FakeGenai:
+    """
+    Drop-in for `google.genai.Client` (the `.models` / `.aio.models` calls
+    GeminiClient makes). Blocking `latency` per call and seeded 429
+    injection at `error_rate`, raised as real google.genai APIErrors so the
+    client's retry/backoff path is exercised.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0, responder=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.responder = responder or fake_response
+        self.calls: Dict[str, int] = {}
+        self.injected = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.models = _FakeModels(self)
+        self.aio = SimpleNamespace(models=_FakeAioModels(self.models))
+
+    def _enter(self, kind: str):
+        from google.genai.errors import APIError
+
+        with self._lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+            fail = self.error_rate > 0 and self._rng.random() < self.error_rate
+            if fail:
+                self.injected += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise APIError(429, {"error": {"code": 429, "message": "Resource has been exhausted (injected)", "status": "RESOURCE_EXHAUSTED"}})
+
+
+def make_gemini_client(latency: float = 0.0, error_rate: float = 0.0, seed: int = 0, cache=None, **kw):
+    """A real GeminiClient whose transport is a FakeGenai."""
+    from app.llm.gemini_client import GeminiClient
+
+    client = GeminiClient(api_key="offline-bench", cache=cache, **kw)
+    client.client = FakeGenai(latency=latency, error_rate=error_rate, seed=seed)
+    return client
@@ -0,0 +1,77 @@
+"""
+Subject gate microbenchmark: legacy per-keyword loop vs KeywordMatcher.
+
+    python -m app.bench.keywords --phrases 300 3000 --unigrams 300 3000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import time
+from typing import List
+
+from app.keywords.matcher import KeywordMatcher
+
+
+def legacy_subject_matches(subject: str, kw: dict) -> List[str]:
+    """The original app.main.subject_matches, kept verbatim for comparison."""
+    subject_norm = subject.lower()
+    matched = set()
+    for p in kw.get("phrases", []):
+        if len(p) >= 5 and p in subject_norm:
+            matched.add(p)
+    words = set(re.sub(r"[^a-z0-9]+", " ", subject_norm).split())
+    for u in kw.get("unigrams", []):
+        if u in words:
+            matched.add(u)
+    return sorted(matched)
+
+
+def _vocab(rng: random.Random, n: int) -> List[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(n)]
+
+
+def run(n_phrases: int, n_unigrams: int, n_subjects: int = 5000, seed: int = 7):
+    rng = random.Random(seed)
+    vocab = _vocab(rng, max(n_unigrams, 500))
+    kw = {
+        "phrases": [" ".join(rng.sample(vocab, rng.randint(2, 4))) for _ in range(n_phrases)],
+        "unigrams": vocab[:n_unigrams],
+    }
+    subjects = []
+    for _ in range(n_subjects):
+        words = rng.sample(vocab, 6)
+        if rng.random() < 0.3:
+            words.insert(2, rng.choice(kw["phrases"]))
+        subjects.append(" ".join(words).title() + "?")
+
+    t0 = time.perf_counter()
+    old = [legacy_subject_matches(s, kw) for s in subjects]
+    t_old = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    matcher = KeywordMatcher(kw)
+    t_build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    new = [matcher.match(s) for s in subjects]
+    t_new = time.perf_counter() - t0
+
+    assert old == new, "matcher disagrees with legacy gate"
+    print(
+        f"phrases={n_phrases:>5} unigrams={n_unigrams:>5}  "
+        f"legacy {t_old / n_subjects * 1e6:8.1f} us/subject  "
+        f"matcher {t_new / n_subjects * 1e6:7.1f} us/subject  "
+        f"(build {t_build * 1e3:.1f} ms)  speedup {t_old / t_new:5.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--phrases", type=int, nargs="+", default=[300, 3000, 10000])
+    ap.add_argument("--unigrams", type=int, nargs="+", default=[300, 3000, 10000])
+    ap.add_argument("--subjects", type=int, default=5000)
+    args = ap.parse_args()
+    for p, u in zip(args.phrases, args.unigrams):
+        run(p, u, args.subjects)
@@ -0,0 +1,170 @@
+"""
+End-to-end offline benchmark of the full poll -> triage ->
+process_message_with_graph path on a synthetic corpus, with a fake Gmail
+service and a real GeminiClient over a fake transport (latency + injected
+429s). Reports msgs/sec, per-node latency percentiles and API calls, so
+performance changes can be compared on the same numbers.
+
+    python -m app.bench.pipeline --messages 200 --concurrency 8 --gemini-latency 0.05 --error-rate 0.05
+    python -m app.bench.pipeline --json bench.json   # machine-readable result
+    python -m app.bench.pipeline --draft-mode fused --no-reply-cache
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict
+
+from app.core import config
+
+
+def _configure(tmp: str, args):
+    # everything the run writes goes to a scratch dir (never data/)
+    config.INDEX_NPZ = os.path.join(tmp, "policy_index.npz")
+    config.INDEX_CHUNKS = os.path.join(tmp, "policy_chunks.json")
+    config.INDEX_MMAP = os.path.join(tmp, "policy_embeds.npy")
+    config.KEYWORDS_JSON = os.path.join(tmp, "keywords.json")
+    config.LOGS_PATH = os.path.join(tmp, "logs.jsonl")
+    config.LOG_SEGMENT_DIR = os.path.join(tmp, "log_segments")
+    config.LOG_ECHO = False
+    config.MAX_CONCURRENCY = args.concurrency
+    config.GEMINI_BACKOFF_BASE = args.backoff_base
+    config.REPLY_CACHE_ENABLED = args.reply_cache
+    config.RETRIEVAL_MODE = args.retrieval_mode
+    config.DRAFT_MODE = args.draft_mode
+    config.GMAIL_BATCH_LABELS = True
+
+
+def run(args) -> Dict[str, Any]:
+    from app import main
+    from app.bench import corpus
+    from app.bench.fakes import FakeGmailService, make_gemini_client
+    from app.core import metrics
+    from app.email.sync import MailboxSync
+    from app.graph import deps
+    from app.graph.build_graph import build_graph
+    from app.keywords.extract_keywords import build_keywords
+    from app.llm.embed_cache import EmbeddingCache
+
+    md = open(args.policy, "r", encoding="utf-8").read()
+    build_keywords(args.policy, config.KEYWORDS_JSON)
+    msgs = corpus.generate(md, args.messages, seed=args.seed)
+
+    llm = make_gemini_client(
+        latency=args.gemini_latency, error_rate=args.error_rate, seed=args.seed,
+        cache=EmbeddingCache(config.EMBED_CACHE_SIZE, ""),
+    )
+    service = FakeGmailService(msgs, latency=args.gmail_latency)
+
+    # setup (index build, labels) is not part of the measurement
+    main.SERVICE, main.LLM, main.EXECUTOR = service, llm, None
+    main.LABEL_IDS = labels = main.gmail_client.ensure_labels(
+        service, [config.LABEL_IN, config.LABEL_OUT, config.LABEL_REVIEW, config.LABEL_SCANNED]
+    )
+    deps.set_runtime(service, llm, labels, None)
+    main.install_runtime(main.load_runtime(llm))
+    main.GRAPH = build_graph()
+    main.SYNC = MailboxSync("", mode="full")
+    deps.REPLY_CACHE.clear()
+    metrics.REGISTRY.reset()
+    service.calls.clear()
+    service.batched.clear()
+    llm.client.calls.clear()
+    llm.client.injected = 0
+
+    t0 = time.perf_counter()
+    asyncio.run(main._poll_once())
+    elapsed = time.perf_counter() - t0
+    main.EXECUTOR.shutdown(wait=True)
+    deps.flush_logs(timeout=5.0)
+
+    reg = metrics.REGISTRY
+    nodes = {}
+    for labels_, q in sorted(reg.quantiles("node_latency_seconds").items()):
+        h = reg.histograms["node_latency_seconds"][labels_]
+        nodes[dict(labels_)["node"]] = {
+            "count": h.count,
+            "mean_ms": round(1000 * h.sum / h.count, 2) if h.count else 0.0,
+            **{f"p{int(k * 100)}_ms": round(1000 * v, 2) for k, v in q.items()},
+        }
+
+    def counter(name: str, key: str) -> Dict[str, float]:
+        out: Dict[str, float] = {}
+        for labels_, v in reg.counters.get(name, {}).items():
+            k = dict(labels_).get(key, "")
+            out[k] = out.get(k, 0) + v
+        return out
+
+    gmail_calls = dict(sorted(service.calls.items()))
+    gemini_calls = dict(sorted(llm.client.calls.items()))
+    total_calls = sum(gmail_calls.values()) + sum(gemini_calls.values())
+    # emails that reached the graph (SKIPs never call Gemini past the gate)
+    graph_runs = int(counter("events_total", "decision").get("RETRIEVE", 0))
+    return {
+        "params": vars(args),
+        "messages": args.messages,
+        "seconds": round(elapsed, 3),
+        "msgs_per_sec": round(args.messages / elapsed, 2) if elapsed else 0.0,
+        "nodes": nodes,
+        "gmail_calls": gmail_calls,
+        "gmail_batched": dict(sorted(service.batched.items())),
+        "gemini_calls": gemini_calls,
+        "gemini_429_injected": llm.client.injected,
+        "gemini_retries": int(sum(counter("llm_retries_total", "kind").values())),
+        "tokens": counter("llm_tokens_total", "direction"),
+        "api_calls_per_msg": round(total_calls / args.messages, 2) if args.messages else 0.0,
+        "gemini_calls_per_email": round(sum(gemini_calls.values()) / graph_runs, 2) if graph_runs else 0.0,
+        "local_checks": counter("fused_checks_total", "verdict"),
+        "events": counter("events_total", "decision"),
+        "reply_cache": deps.REPLY_CACHE.stats(),
+    }
+
+
+def report(res: Dict[str, Any]):
+    print(f"{res['messages']} msgs in {res['seconds']:.2f}s  ->  {res['msgs_per_sec']:.1f} msg/s"
+          f"   ({res['api_calls_per_msg']} API calls/msg)")
+    print(f"{'node':<18}{'n':>6}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}   (ms)")
+    for node, s in res["nodes"].items():
+        print(f"{node:<18}{s['count']:>6}{s['mean_ms']:>10.1f}{s.get('p50_ms', 0):>10.1f}"
+              f"{s.get('p95_ms', 0):>10.1f}{s.get('p99_ms', 0):>10.1f}")
+    print("gmail :", ", ".join(f"{k}={v}" for k, v in res["gmail_calls"].items())
+          + ("  | inside batches " + ", ".join(f"{k}={v}" for k, v in res["gmail_batched"].items())
+             if res["gmail_batched"] else ""))
+    print("gemini:", ", ".join(f"{k}={v}" for k, v in res["gemini_calls"].items()),
+          f"| 429 injected={res['gemini_429_injected']} retries={res['gemini_retries']}",
+          "| tokens " + ", ".join(f"{k}={int(v)}" for k, v in res["tokens"].items()))
+    print(f"gemini calls per answered email: {res['gemini_calls_per_email']}"
+          + ("  | local checks " + ", ".join(f"{k}={int(v)}" for k, v in sorted(res["local_checks"].items()))
+             if res["local_checks"] else ""))
+    print("events:", ", ".join(f"{k}={int(v)}" for k, v in sorted(res["events"].items())))
+    rc = res["reply_cache"]
+    print(f"reply cache: hits={rc['hits']} misses={rc['misses']} hit_rate={rc['hit_rate']}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--policy", default=config.POLICY_MD)
+    ap.add_argument("--messages", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--concurrency", type=int, default=config.MAX_CONCURRENCY)
+    ap.add_argument("--gmail-latency", type=float, default=0.02, help="seconds per fake Gmail call")
+    ap.add_argument("--gemini-latency", type=float, default=0.05, help="seconds per fake Gemini call")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="share of Gemini calls failing with 429")
+    ap.add_argument("--backoff-base", type=float, default=0.05, help="GEMINI_BACKOFF_BASE for the run")
+    ap.add_argument("--retrieval-mode", default=config.RETRIEVAL_MODE, choices=["hybrid", "dense", "lexical"])
+    ap.add_argument("--draft-mode", default=config.DRAFT_MODE, choices=["separate", "fused"])
+    ap.add_argument("--no-reply-cache", dest="reply_cache", action="store_false")
+    ap.add_argument("--json", default="", help="also write the result to this file")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="agent-bench-") as tmp:
+        _configure(tmp, args)
+        res = run(args)
+    report(res)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(res, f, indent=2)
@@ -0,0 +1,223 @@
+"""
+Retrieval quality + speed evaluation for the policy index.
+
+Runs labeled (question -> expected chunk) pairs through `deps.retrieve` for
+every combination of index backend, chunk size and retrieval mode, and
+reports recall@k, MRR, query latency percentiles and index memory.
+
+A pair's `expected` is a snippet of the policy text (by default the FAQ
+question line itself) rather than a chunk id, so the same labels hold
+across chunking configurations: a result counts as relevant when it
+contains the snippet.
+
+    python -m app.bench.retrieval_eval --make-pairs data/retrieval_pairs.jsonl
+    python -m app.bench.retrieval_eval --backends numpy mmap --chunk-tokens 120 200 400
+    python -m app.bench.retrieval_eval --embed gemini    # real embeddings, cached in EMBED_CACHE_DB
+
+Embeddings default to deterministic hashed vectors (no network). With
+`--embed gemini` they go through the SQLite embedding cache, so only the
+first run needs the API.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import re
+import resource
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.core import config
+
+
+def _norm(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def make_pairs(md: str, seed: int = 0, wrap: bool = True) -> List[Dict[str, str]]:
+    """
+    One pair per FAQ question. With `wrap`, the query is phrased like an
+    incoming email (greeting + filler + question), since production
+    retrieves on the whole email text.
+    """
+    from app.bench.corpus import FILLERS, GREETINGS, policy_questions
+
+    rng = random.Random(seed)
+    pairs = []
+    for title, q in policy_questions(md):
+        query = "\n\n".join(p for p in (rng.choice(GREETINGS), rng.choice(FILLERS), q) if p) if wrap else q
+        pairs.append({"question": query, "expected": q, "section": title})
+    return pairs
+
+
+def load_pairs(path: str) -> List[Dict[str, str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def first_hit(results: List[str], expected: str) -> int:
+    """1-based rank of the first result containing `expected`, 0 if none."""
+    want = _norm(expected)
+    for rank, text in enumerate(results, 1):
+        if want in _norm(text):
+            return rank
+    return 0
+
+
+def footprint(index: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Approximate bytes held by each part of a loaded index. `embeds` is the
+    in-RAM copy kept on the index dict (0 when it is the backend's own
+    matrix or a memory map); `ram` sums everything resident.
+    """
+    backend = index["backend"]
+    embeds = index["embeds"]
+    if backend.name == "numpy":
+        vectors = int(backend.matrix.nbytes)
+    elif backend.name == "mmap":
+        vectors = 0  # paged in by the OS; see disk
+    else:
+        n, dim = embeds.shape
+        vectors = n * (dim * 4 + 2 * config.HNSW_M * 4 + 8)  # hnswlib layer-0 estimate
+    shared = isinstance(embeds, np.memmap) or embeds is getattr(backend, "matrix", None)
+    out = {
+        "vectors": vectors,
+        "embeds": 0 if shared else int(embeds.nbytes),
+        "bm25": int(sum(ids.nbytes + w.nbytes for ids, w in index["bm25"].postings.values())),
+        "texts": sum(len(t.encode("utf-8")) for t in index["texts"]),
+        "disk": os.path.getsize(backend.path) if backend.name == "mmap" else 0,
+    }
+    out["ram"] = out["vectors"] + out["embeds"] + out["bm25"] + out["texts"]
+    return out
+
+
+def evaluate(pairs: List[Dict[str, str]], ks: List[int], warmup: bool = True) -> Dict[str, Any]:
+    """Score the currently installed index/mode on `pairs`."""
+    from app.graph import deps
+
+    depth = max(ks)
+    if warmup:
+        # fills the embedding cache, so latencies measure retrieval, not the API
+        for p in pairs:
+            deps.retrieve(p["question"], k=depth)
+    ranks, lat = [], []
+    for p in pairs:
+        t0 = time.perf_counter()
+        results = deps.retrieve(p["question"], k=depth)
+        lat.append(time.perf_counter() - t0)
+        ranks.append(first_hit(results, p["expected"]))
+    r = np.asarray(ranks)
+    ms = 1000 * np.asarray(lat)
+    return {
+        "n": len(pairs),
+        **{f"recall@{k}": round(float(np.mean((r > 0) & (r <= k))), 4) for k in ks},
+        "mrr": round(float(np.mean(np.where(r > 0, 1.0 / np.maximum(r, 1), 0.0))), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "misses": [p["expected"] for p, rank in zip(pairs, ranks) if rank == 0],
+    }
+
+
+def run(args) -> List[Dict[str, Any]]:
+    from app import main
+    from app.graph import deps
+    from app.llm.embed_cache import EmbeddingCache
+
+    if args.embed == "gemini":
+        from app.llm.gemini_client import GeminiClient
+
+        llm = GeminiClient(api_key=config.GEMINI_API_KEY,
+                           cache=EmbeddingCache(config.EMBED_CACHE_SIZE, config.EMBED_CACHE_DB,
+                                                config.EMBED_CACHE_ROWS, config.EMBED_CACHE_TTL))
+    else:
+        from app.bench.fakes import make_gemini_client
+
+        llm = make_gemini_client(cache=EmbeddingCache(config.EMBED_CACHE_SIZE, ""))
+
+    md = open(args.policy, "r", encoding="utf-8").read()
+    pairs = load_pairs(args.pairs) if args.pairs else make_pairs(md, args.seed, wrap=not args.bare)
+    config.EXPAND_PARENTS = args.expand_parents
+    config.LOG_ECHO = False
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="agent-retrieval-eval-") as tmp:
+        config.INDEX_NPZ = os.path.join(tmp, "policy_index.npz")
+        config.INDEX_CHUNKS = os.path.join(tmp, "policy_chunks.json")
+        config.INDEX_MMAP = os.path.join(tmp, "policy_embeds.npy")
+        for tokens in args.chunk_tokens:
+            config.CHUNK_MAX_TOKENS = tokens
+            config.CHUNK_OVERLAP_TOKENS = min(args.overlap, tokens // 4)
+            for backend in args.backends:
+                config.INDEX_BACKEND = backend
+                t0 = time.perf_counter()
+                try:
+                    index = main.build_index(llm)
+                except ImportError as e:
+                    print(f"skipping {backend}: {e}")
+                    continue
+                build_s = time.perf_counter() - t0
+                deps.set_runtime(None, llm, {}, index)
+                mem = footprint(index)
+                for mode in args.modes:
+                    config.RETRIEVAL_MODE = mode
+                    res = evaluate(pairs, args.k, warmup=not args.cold)
+                    rows.append({
+                        "chunk_tokens": tokens, "backend": backend, "mode": mode,
+                        "chunks": len(index["texts"]), "build_s": round(build_s, 3),
+                        "memory": mem, **res,
+                    })
+    return rows
+
+
+def report(rows: List[Dict[str, Any]], ks: List[int]):
+    rec = "".join(f"{'R@' + str(k):>7}" for k in ks)
+    print(f"{'tokens':>6} {'backend':<7} {'mode':<8}{'chunks':>7}{rec}{'MRR':>7}"
+          f"{'p50ms':>8}{'p95ms':>8}{'p99ms':>8}{'vecKB':>8}{'bm25KB':>8}{'ramKB':>8}")
+    for r in rows:
+        rec = "".join(f"{r[f'recall@{k}']:>7.3f}" for k in ks)
+        m = r["memory"]
+        print(f"{r['chunk_tokens']:>6} {r['backend']:<7} {r['mode']:<8}{r['chunks']:>7}{rec}{r['mrr']:>7.3f}"
+              f"{r['p50_ms']:>8.3f}{r['p95_ms']:>8.3f}{r['p99_ms']:>8.3f}"
+              f"{(m['vectors'] + m['embeds']) / 1024:>8.0f}{m['bm25'] / 1024:>8.0f}{m['ram'] / 1024:>8.0f}")
+    if rows:
+        print(f"{rows[0]['n']} pairs; peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--policy", default=config.POLICY_MD)
+    ap.add_argument("--pairs", default="", help="JSONL of {question, expected}; default: generated from the policy")
+    ap.add_argument("--make-pairs", default="", help="write the generated pairs here (for hand editing) and exit")
+    ap.add_argument("--bare", action="store_true", help="generated queries are the bare question (no email wrapper)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--embed", choices=["hashed", "gemini"], default="hashed")
+    ap.add_argument("--backends", nargs="+", default=["numpy", "mmap", "hnsw"])
+    ap.add_argument("--chunk-tokens", nargs="+", type=int, default=[config.CHUNK_MAX_TOKENS])
+    ap.add_argument("--overlap", type=int, default=config.CHUNK_OVERLAP_TOKENS)
+    ap.add_argument("--modes", nargs="+", default=["dense", "lexical", "hybrid"], choices=["dense", "lexical", "hybrid"])
+    ap.add_argument("--expand-parents", action="store_true")
+    ap.add_argument("-k", nargs="+", type=int, default=[1, 3, 5])
+    ap.add_argument("--cold", action="store_true", help="no warm-up pass (latency includes embedding calls)")
+    ap.add_argument("--json", default="", help="also write the results to this file")
+    args = ap.parse_args()
+
+    if args.make_pairs:
+        md = open(args.policy, "r", encoding="utf-8").read()
+        pairs = make_pairs(md, args.seed, wrap=not args.bare)
+        os.makedirs(os.path.dirname(os.path.abspath(args.make_pairs)), exist_ok=True)
+        with open(args.make_pairs, "w", encoding="utf-8") as f:
+            for p in pairs:
+                f.write(json.dumps(p, ensure_ascii=False) + "\n")
+        print(f"wrote {len(pairs)} pairs to {args.make_pairs}")
+    else:
+        rows = run(args)
+        report(rows, args.k)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(rows, f, indent=2)
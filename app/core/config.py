@@ -19,6 +19,9 @@ INDEX_NPZ     = os.getenv("INDEX_NPZ", "./data/policy_index.npz")
 INDEX_CHUNKS  = os.getenv("INDEX_CHUNKS", "./data/policy_chunks.json")
 LOGS_PATH     = os.getenv("LOGS_PATH", "./data/logs.jsonl")
 
+# Hot reload: watch POLICY_MD / KEYWORDS_JSON and swap in a rebuilt index + matcher
+RELOAD_WATCH_INTERVAL = float(os.getenv("RELOAD_WATCH_INTERVAL", "5"))  # seconds between mtime checks (0 = off)
+
 # === Gmail Labels ===
 LABEL_IN      = os.getenv("LABEL_IN", "agent_inbox")
 LABEL_OUT     = os.getenv("LABEL_OUT", "processed_by_agent")
@@ -28,3 +31,90 @@ LABEL_SCANNED = os.getenv("LABEL_SCANNED", "scanned_by_agent")
 # === Behavior toggles ===
 ESCALATE_ON_NOMATCH = os.getenv("ESCALATE_ON_NOMATCH", "false").lower() == "true"
 MAX_CONCURRENCY     = max(1, int(os.getenv("MAX_CONCURRENCY", "4")))
+
+# === Gemini rate limiting ===
+# Defaults apply to every model; GEMINI_RATE_LIMITS overrides per model as
+# "model=rpm:tpm,model=rpm:tpm" (0 = unlimited).
+GEMINI_RPM          = int(os.getenv("GEMINI_RPM", "0"))
+GEMINI_TPM          = int(os.getenv("GEMINI_TPM", "0"))
+GEMINI_RATE_LIMITS  = os.getenv("GEMINI_RATE_LIMITS", "").strip()
+GEMINI_MAX_INFLIGHT = max(1, int(os.getenv("GEMINI_MAX_INFLIGHT", "8")))
+GEMINI_MAX_RETRIES  = max(0, int(os.getenv("GEMINI_MAX_RETRIES", "6")))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "1.0"))
+GEMINI_BACKOFF_MAX  = float(os.getenv("GEMINI_BACKOFF_MAX", "65"))
+# document (index) embeds keep retrying 429s past GEMINI_MAX_RETRIES for this long (seconds)
+EMBED_RETRY_DEADLINE = float(os.getenv("EMBED_RETRY_DEADLINE", "900"))
+
+# === Vector index ===
+INDEX_BACKEND = os.getenv("INDEX_BACKEND", "numpy").lower()   # numpy | mmap | hnsw
+INDEX_MMAP    = os.getenv("INDEX_MMAP", "./data/policy_embeds.npy")
+HNSW_M        = int(os.getenv("HNSW_M", "16"))
+HNSW_EF       = int(os.getenv("HNSW_EF", "64"))
+
+# === Chunking / retrieval ===
+CHUNK_MAX_TOKENS     = int(os.getenv("CHUNK_MAX_TOKENS", "200"))      # child chunk size (~4 chars/token)
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))   # overlap between windows of one long answer
+RETRIEVAL_K          = int(os.getenv("RETRIEVAL_K", "4"))             # child chunks per query
+EXPAND_PARENTS       = os.getenv("EXPAND_PARENTS", "false").lower() == "true"  # swap children for their section
+PARENT_MAX_TOKENS    = int(os.getenv("PARENT_MAX_TOKENS", "1200"))    # ...unless the section is bigger than this
+RETRIEVAL_MODE       = os.getenv("RETRIEVAL_MODE", "hybrid").lower()  # hybrid | dense | lexical
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))   # per ranker, before fusion
+RRF_K                = int(os.getenv("RRF_K", "60"))                  # reciprocal rank fusion damping
+KEYWORD_BOOST        = float(os.getenv("KEYWORD_BOOST", "0.5"))       # per matched keyword, in top-rank votes
+EMBED_MAX_WAIT       = float(os.getenv("EMBED_MAX_WAIT", "2.0"))      # query embed throttled longer -> BM25 only
+
+# === Drafting ===
+DRAFT_MODE        = os.getenv("DRAFT_MODE", "separate").lower()     # separate | fused (draft + self-check in one call)
+FUSED_MIN_SUPPORT = float(os.getenv("FUSED_MIN_SUPPORT", "0.6"))     # share of reply words found in cited chunks
+
+# === Embedding cache ===
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))                  # in-memory LRU entries
+EMBED_CACHE_DB   = os.getenv("EMBED_CACHE_DB", "./data/embed_cache.sqlite")     # "" disables the disk tier
+EMBED_CACHE_ROWS = int(os.getenv("EMBED_CACHE_ROWS", "200000"))                # disk tier cap, least recently used pruned (0 = none)
+EMBED_CACHE_TTL  = float(os.getenv("EMBED_CACHE_TTL_DAYS", "0")) * 86400       # drop disk rows unused this long (0 = never)
+
+# === Reply cache (reuse validated replies for near-identical questions) ===
+REPLY_CACHE_ENABLED   = os.getenv("REPLY_CACHE_ENABLED", "true").lower() == "true"
+REPLY_CACHE_TTL       = int(os.getenv("REPLY_CACHE_TTL", "3600"))            # seconds
+REPLY_CACHE_THRESHOLD = float(os.getenv("REPLY_CACHE_THRESHOLD", "0.95"))   # min query cosine similarity
+REPLY_CACHE_SIZE      = int(os.getenv("REPLY_CACHE_SIZE", "512"))           # max cached replies
+
+# === Gmail sync ===
+SYNC_MODE       = os.getenv("SYNC_MODE", "history").lower()   # history | full
+SYNC_STATE      = os.getenv("SYNC_STATE", "./data/gmail_sync.json")
+SYNC_FULL_EVERY = int(os.getenv("SYNC_FULL_EVERY", "60"))     # polls between safety full scans (0 = never)
+SYNC_MAX_TRIES  = int(os.getenv("SYNC_MAX_TRIES", "5"))       # times an unfinished message is re-offered
+
+# === Push ingestion (Gmail watch -> Pub/Sub push) ===
+GMAIL_PUBSUB_TOPIC  = os.getenv("GMAIL_PUBSUB_TOPIC", "").strip()   # projects/<id>/topics/<name>
+PUSH_ENABLED        = os.getenv("PUSH_ENABLED", "true" if GMAIL_PUBSUB_TOPIC else "false").lower() == "true"
+PUSH_TOKEN          = os.getenv("PUSH_TOKEN", "")                   # shared secret in the push URL (?token=)
+PUSH_POLL_INTERVAL  = int(os.getenv("PUSH_POLL_INTERVAL", "900"))   # safety-net polling when push is on
+PUSH_QUEUE_SIZE     = int(os.getenv("PUSH_QUEUE_SIZE", "100"))      # prefetched messages waiting for ingest workers
+WATCH_RENEW_SECONDS = int(os.getenv("WATCH_RENEW_SECONDS", "86400"))
+
+# === Gmail batching ===
+GMAIL_BATCH_SIZE   = max(1, min(100, int(os.getenv("GMAIL_BATCH_SIZE", "50"))))  # messages per BatchHttpRequest (Gmail advises <= 50)
+GMAIL_BATCH_LABELS = os.getenv("GMAIL_BATCH_LABELS", "true").lower() == "true"    # coalesce SKIP/escalate label changes
+
+# === Event log sink ===
+LOG_BATCH_SIZE     = int(os.getenv("LOG_BATCH_SIZE", "256"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "0.5"))   # seconds
+LOG_FSYNC          = os.getenv("LOG_FSYNC", "never").lower()         # never | batch | always
+LOG_ECHO           = os.getenv("LOG_ECHO", "true").lower() == "true" # pretty console echo
+
+# === Log segments ===
+LOG_SEGMENT_DIR     = os.getenv("LOG_SEGMENT_DIR", "./data/log_segments")
+LOG_SEGMENT_BYTES   = int(os.getenv("LOG_SEGMENT_BYTES", str(64 * 1024 * 1024)))  # rotate at this size (0 = off)
+LOG_SEGMENT_SECONDS = int(os.getenv("LOG_SEGMENT_SECONDS", "86400"))              # ...or this age (0 = off)
+LOG_PARQUET_DIR     = os.getenv("LOG_PARQUET_DIR", "./data/log_parquet")
+
+# === Log maintenance (compaction + retention, run by the API server) ===
+LOG_RETENTION_DAYS       = float(os.getenv("LOG_RETENTION_DAYS", "0"))        # 0 = keep everything
+LOG_COMPACT              = os.getenv("LOG_COMPACT", "true").lower() == "true" # compact closed segments to Parquet
+LOG_MAINTENANCE_INTERVAL = int(os.getenv("LOG_MAINTENANCE_INTERVAL", "3600")) # seconds
+LOG_RETENTION_BACKUP_DIR = os.getenv("LOG_RETENTION_BACKUP_DIR", "")          # keep deleted events here ("" = discard)
+
+# === Live log streaming (/logs/stream) ===
+LOG_STREAM_QUEUE     = int(os.getenv("LOG_STREAM_QUEUE", "1000"))        # per-subscriber buffer (events)
+LOG_STREAM_HEARTBEAT = float(os.getenv("LOG_STREAM_HEARTBEAT", "15"))    # seconds between keep-alive comments
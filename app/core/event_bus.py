@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+
+
+class Subscription:
+    """
+    One live listener: a bounded asyncio.Queue owned by the subscriber's event
+    loop, plus the filters applied before anything is queued for it.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        maxsize: int,
+        decisions: Optional[List[str]] = None,
+        message_id: Optional[str] = None,
+    ):
+        self.loop = loop
+        self.queue: "asyncio.Queue" = asyncio.Queue(maxsize=max(1, maxsize))
+        self.decisions = {d.upper() for d in decisions} if decisions else None
+        self.message_id = message_id or None
+        self.dropped = 0  # events lost because the client fell behind
+
+    def wants(self, event: Dict[str, Any]) -> bool:
+        if self.decisions is not None and str(event.get("decision") or "").upper() not in self.decisions:
+            return False
+        if self.message_id is not None and event.get("message_id") != self.message_id:
+            return False
+        return True
+
+    def _put(self, event: Dict[str, Any]):
+        # runs on the subscriber's loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # slow client: drop the oldest event rather than block the agent
+            try:
+                self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            self.queue.put_nowait(event)
+            self.dropped += 1
+
+
+class EventBus:
+    """
+    In-process fan-out of log events. `publish()` may be called from any
+    thread (graph nodes run in the executor); each matching subscriber gets
+    the event via `call_soon_threadsafe` on its own loop. With no
+    subscribers, publishing is a lock + an empty loop.
+    """
+
+    def __init__(self):
+        self._subs: List[Subscription] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, maxsize: int = 1000, decisions: Optional[List[str]] = None,
+                  message_id: Optional[str] = None) -> Subscription:
+        sub = Subscription(asyncio.get_running_loop(), maxsize, decisions, message_id)
+        with self._lock:
+            self._subs.append(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            if sub in self._subs:
+                self._subs.remove(sub)
+
+    def publish(self, event: Dict[str, Any]):
+        with self._lock:
+            subs = list(self._subs)
+        for sub in subs:
+            if not sub.wants(event):
+                continue
+            try:
+                sub.loop.call_soon_threadsafe(sub._put, event)
+            except RuntimeError:
+                # subscriber's loop is closed
+                self.unsubscribe(sub)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._subs)
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import queue
+import threading
+import time
+from typing import Callable, List, Optional
+
+from rich import print as rprint
+
+from app.core import metrics
+
+try:  # POSIX advisory locks; on other platforms O_APPEND alone keeps lines whole
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+@contextlib.contextmanager
+def file_lock(lock_path: str):
+    """
+    Exclusive cross-process lock on `lock_path` (a sidecar file). Writers hold
+    it while appending; rotation/retention hold it while moving files.
+    """
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+class EventLogSink:
+    """
+    Buffered JSONL appender. `emit()` only enqueues; a daemon thread batches
+    lines and appends each batch with a single O_APPEND write under a
+    cross-process lock, flushing when `batch_size` lines are waiting or
+    `flush_interval` seconds have passed.
+
+    fsync policy:
+      - "never":  leave durability to the OS (fastest)
+      - "batch":  fsync after every batch write
+      - "always": write + fsync every event (no batching)
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 256,
+        flush_interval: float = 0.5,
+        fsync: str = "never",
+        echo: Optional[Callable[[dict], None]] = None,
+        on_write: Optional[Callable[[int], None]] = None,
+    ):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.fsync = fsync
+        self.batch_size = 1 if fsync == "always" else max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval)
+        self.echo = echo
+        self.on_write = on_write  # called with the active file size after each batch (e.g. rotation)
+        self.dropped = 0
+        self._q: "queue.Queue" = queue.Queue()
+        self._fd: Optional[int] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="event-log-writer", daemon=True)
+        self._thread.start()
+
+    # -----------------
+    # Producer side
+    # -----------------
+    def emit(self, event: dict):
+        if self._closed:
+            self.dropped += 1
+            return
+        self._q.put(dict(event))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything emitted so far is on disk (or timeout)."""
+        if self._closed or not self._thread.is_alive():
+            return True  # close() already drained the queue; nothing would set the event
+        done = threading.Event()
+        self._q.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        if self._closed:
+            return
+        self.flush(timeout)
+        self._closed = True
+        self._q.put(None)
+        self._thread.join(timeout)
+
+    # -----------------
+    # Writer thread
+    # -----------------
+    def _open(self) -> int:
+        """(Re)open the active file; reopens if it was rotated/replaced underneath us."""
+        if self._fd is not None:
+            try:
+                if os.stat(self.path).st_ino == os.fstat(self._fd).st_ino:
+                    return self._fd
+            except FileNotFoundError:
+                pass
+            os.close(self._fd)
+            self._fd = None
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def _write(self, events: List[dict]) -> int:
+        data = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in events).encode("utf-8")
+        with file_lock(self.lock_path):
+            fd = self._open()
+            view = memoryview(data)
+            while view:
+                n = os.write(fd, view)
+                view = view[n:]
+            if self.fsync in ("batch", "always"):
+                os.fsync(fd)
+            return os.fstat(fd).st_size
+
+    def _run(self):
+        batch: List[dict] = []
+        waiters: List[threading.Event] = []
+        deadline = None
+        stop = False
+        while not stop:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._q.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                stop = True
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+            elif isinstance(item, dict):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            due = deadline is not None and time.monotonic() >= deadline
+            if batch and (stop or waiters or due or len(batch) >= self.batch_size):
+                size = None
+                try:
+                    size = self._write(batch)
+                except Exception as e:
+                    self.dropped += len(batch)
+                    metrics.REGISTRY.inc("log_events_dropped_total", len(batch),
+                                         help="Events the log writer failed to write.")
+                    rprint(f"[red]ERROR:[/] event log: write to {self.path} failed ({e}); dropped {len(batch)} event(s)")
+                if size is not None and self.on_write is not None:
+                    try:
+                        self.on_write(size)
+                    except Exception:
+                        pass
+                if self.echo is not None:
+                    for e in batch:
+                        try:
+                            self.echo(e)
+                        except Exception:
+                            pass
+                batch, deadline = [], None
+            elif not batch:
+                deadline = None
+            for w in waiters:
+                w.set()
+            waiters = []
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,281 @@
+"""
+Compact closed JSONL log segments into date-partitioned Parquet for analytics.
+
+    python -m app.core.log_compact            # compact every closed segment not yet converted
+
+Layout: <LOG_PARQUET_DIR>/date=YYYY-MM-DD/<segment>.parquet plus a
+_compacted.json manifest ({segment name: max ts}) so each segment is
+converted exactly once. Retention (app.core.log_retention) prunes this
+tier with `prune_before` after the JSONL pass.
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.core.log_store import LogStore
+
+# Fixed schema (column -> pyarrow type name); missing fields become nulls.
+SCHEMA_FIELDS = [
+    ("message_id", "string"),
+    ("decision", "string"),
+    ("reason", "string"),
+    ("ts", "float64"),
+    ("subject", "string"),
+    ("from_addr", "string"),
+    ("event", "string"),
+    ("matched_keywords", "list<string>"),
+    ("pii_request", "list<string>"),
+    ("pii_draft", "list<string>"),
+    ("pii", "bool"),
+    ("node", "string"),
+    ("latency_ms", "float64"),
+    ("prompt_tokens", "int64"),
+    ("response_tokens", "int64"),
+]
+
+
+def _pa():
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet log compaction requires pyarrow: pip install pyarrow") from e
+    return pa, ds, pq
+
+
+def arrow_schema():
+    pa, _, _ = _pa()
+    types = {
+        "string": pa.string(),
+        "float64": pa.float64(),
+        "int64": pa.int64(),
+        "bool": pa.bool_(),
+        "list<string>": pa.list_(pa.string()),
+    }
+    return pa.schema([(name, types[t]) for name, t in SCHEMA_FIELDS])
+
+
+def _str_list(v) -> Optional[List[str]]:
+    if v is None:
+        return None
+    if isinstance(v, (list, tuple)):
+        return [str(x) for x in v]
+    return [str(v)]
+
+
+def _num(v, cast):
+    try:
+        return cast(v) if v is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def to_record(ev: Dict[str, Any]) -> Dict[str, Any]:
+    pii_req = _str_list(ev.get("pii_request"))
+    pii_draft = _str_list(ev.get("pii_draft"))
+    legacy_pii = _str_list(ev.get("pii"))
+    return {
+        "message_id": ev.get("message_id"),
+        "decision": (ev.get("decision") or ev.get("event") or None),
+        "reason": ev.get("reason") if ev.get("reason") is not None else ev.get("detail"),
+        "ts": _num(ev.get("ts"), float),
+        "subject": ev.get("subject"),
+        "from_addr": ev.get("from_addr"),
+        "event": ev.get("event"),
+        "matched_keywords": _str_list(ev.get("matched_keywords")),
+        "pii_request": pii_req,
+        "pii_draft": pii_draft,
+        "pii": bool(pii_req or pii_draft or legacy_pii),
+        "node": ev.get("node"),
+        "latency_ms": _num(ev.get("latency_ms"), float),
+        "prompt_tokens": _num(ev.get("prompt_tokens"), int),
+        "response_tokens": _num(ev.get("response_tokens"), int),
+    }
+
+
+def _day(ts: float) -> str:
+    # UTC, like the dashboard's date pickers and displayed timestamps
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+class ParquetLogs:
+    """Writer (compaction) and reader (pushdown queries) for the Parquet log tier."""
+
+    def __init__(self, out_dir: str):
+        self.out_dir = out_dir
+        self.manifest_path = os.path.join(out_dir, "_compacted.json")
+
+    def manifest(self) -> Dict[str, float]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, man: Dict[str, float]):
+        os.makedirs(self.out_dir, exist_ok=True)
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(man, f)
+        os.replace(tmp, self.manifest_path)
+
+    def watermark(self) -> float:
+        """Newest ts already in Parquet (live views add events after this)."""
+        # "_watermark" keeps it once retention has dropped the newest segment's entry
+        return max(self.manifest().values(), default=0.0)
+
+    # -----------------
+    # Compaction
+    # -----------------
+    def compact_segment(self, path: str, name: str) -> float:
+        pa, _, pq = _pa()
+        by_day: Dict[str, List[Dict[str, Any]]] = {}
+        max_ts = 0.0
+        with open(path, "rb") as f:
+            for raw in f:
+                try:
+                    ev = json.loads(raw)
+                except ValueError:
+                    continue
+                if not isinstance(ev, dict):
+                    continue
+                rec = to_record(ev)
+                if rec["ts"] is None:
+                    continue
+                max_ts = max(max_ts, rec["ts"])
+                by_day.setdefault(_day(rec["ts"]), []).append(rec)
+        schema = arrow_schema()
+        stem = os.path.splitext(name)[0]
+        for day, recs in by_day.items():
+            part = os.path.join(self.out_dir, f"date={day}")
+            os.makedirs(part, exist_ok=True)
+            table = pa.Table.from_pylist(recs, schema=schema)
+            tmp = os.path.join(part, f".{stem}.parquet.tmp")
+            pq.write_table(table, tmp, compression="zstd")
+            os.replace(tmp, os.path.join(part, f"{stem}.parquet"))
+        return max_ts
+
+    def compact(self, store: LogStore) -> int:
+        """Convert every closed segment not yet in the manifest. Returns segments converted."""
+        man = self.manifest()
+        done = 0
+        for seg in store.segments():
+            if seg["name"] in man:
+                continue
+            path = store.segment_path(seg)
+            if not os.path.exists(path):
+                continue
+            man[seg["name"]] = self.compact_segment(path, seg["name"])
+            self._save_manifest(man)
+            done += 1
+        return done
+
+    # -----------------
+    # Retention
+    # -----------------
+    def prune_before(self, cutoff_ts: float) -> int:
+        """
+        Drop rows with ts < cutoff_ts: whole date partitions before the
+        cutoff's (UTC) day, and the older rows of that day's files. Manifest
+        entries of segments that ended before the cutoff are forgotten; the
+        watermark is kept. Returns rows removed.
+        """
+        if not os.path.isdir(self.out_dir):
+            return 0
+        _, _, pq = _pa()
+        import pyarrow.compute as pc
+
+        cut_day = _day(cutoff_ts)
+        removed = 0
+        for name in sorted(os.listdir(self.out_dir)):
+            part = os.path.join(self.out_dir, name)
+            if not name.startswith("date=") or name[5:] > cut_day or not os.path.isdir(part):
+                continue
+            files = [os.path.join(part, f) for f in os.listdir(part) if f.endswith(".parquet") and not f.startswith(".")]
+            if name[5:] < cut_day:
+                removed += sum(pq.read_metadata(f).num_rows for f in files)
+                shutil.rmtree(part)
+                continue
+            for path in files:
+                table = pq.read_table(path)
+                keep = table.filter(pc.greater_equal(table.column("ts"), cutoff_ts))
+                if keep.num_rows == table.num_rows:
+                    continue
+                removed += table.num_rows - keep.num_rows
+                if keep.num_rows:
+                    tmp = os.path.join(part, "." + os.path.basename(path) + ".tmp")
+                    pq.write_table(keep, tmp, compression="zstd")
+                    os.replace(tmp, path)
+                else:
+                    os.remove(path)
+
+        man = self.manifest()
+        expired = [k for k, ts in man.items() if not k.startswith("_") and ts < cutoff_ts]
+        if expired:
+            man["_watermark"] = max(man.values(), default=0.0)
+            for k in expired:
+                del man[k]
+            self._save_manifest(man)
+        return removed
+
+    # -----------------
+    # Queries
+    # -----------------
+    def _dataset(self):
+        pa, ds, _ = _pa()
+        if not os.path.isdir(self.out_dir):
+            return None
+        part = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+        schema = arrow_schema().append(pa.field("date", pa.string()))
+        return ds.dataset(self.out_dir, format="parquet", partitioning=part, schema=schema, ignore_prefixes=[".", "_"])
+
+    def _filter(self, start: Optional[date], end: Optional[date], decisions: Optional[Iterable[str]]):
+        _, ds, _ = _pa()
+        expr = None
+        def _and(a, b):
+            return b if a is None else (a & b)
+        # partition predicates prune whole directories; decision is pushed into row groups
+        if start is not None:
+            expr = _and(expr, ds.field("date") >= start.isoformat())
+        if end is not None:
+            expr = _and(expr, ds.field("date") <= end.isoformat())
+        if decisions:
+            expr = _and(expr, ds.field("decision").isin(list(decisions)))
+        return expr
+
+    def query(self, start: Optional[date] = None, end: Optional[date] = None,
+              decisions: Optional[Iterable[str]] = None, columns: Optional[List[str]] = None):
+        """Rows as a pandas DataFrame (ts as datetime), filtered with predicate pushdown."""
+        import pandas as pd
+        dset = self._dataset()
+        if dset is None:
+            return pd.DataFrame()
+        df = dset.to_table(columns=columns, filter=self._filter(start, end, decisions)).to_pandas()
+        if "ts" in df.columns:
+            df["ts"] = pd.to_datetime(df["ts"], unit="s", errors="coerce")
+        return df
+
+    def decision_counts(self, start: Optional[date] = None, end: Optional[date] = None,
+                        decisions: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """{decision: count} reading only the decision column."""
+        dset = self._dataset()
+        if dset is None:
+            return {}
+        table = dset.to_table(columns=["decision"], filter=self._filter(start, end, decisions))
+        if not table.num_rows:
+            return {}
+        counts = table.column("decision").value_counts()
+        return {str(v["values"]): int(v["counts"]) for v in counts.to_pylist() if v["values"] is not None}
+
+
+if __name__ == "__main__":
+    from app.core import config
+
+    store = LogStore(config.LOGS_PATH, config.LOG_SEGMENT_DIR)
+    n = ParquetLogs(config.LOG_PARQUET_DIR).compact(store)
+    print(f"Compacted {n} segment(s) into {config.LOG_PARQUET_DIR}")
@@ -0,0 +1,122 @@
+"""
+Log retention: drop events older than a cutoff without loading the log into memory.
+
+- Closed segments entirely before the cutoff are dropped whole (moved to the
+  backup dir if one is given).
+- A segment that straddles the cutoff, and the active file, are streamed
+  line by line into a temp file that atomically replaces the original.
+  Every filter-and-replace (and the segment reindex after it) runs under
+  the store lock, so appenders (EventLogSink in any process), rotation and
+  a concurrent retention/compaction run wait and then see the new file.
+- Lines without a parseable ts are kept.
+- With `parquet_dir`, the compacted Parquet tier is pruned to the same
+  cutoff afterwards (see ParquetLogs.prune_before), so expired events do
+  not live on in the historical view.
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Optional, Tuple
+
+from app.core.event_log import file_lock
+from app.core.log_store import LogStore
+
+
+def _line_ts(raw: bytes) -> Optional[float]:
+    try:
+        return float(json.loads(raw).get("ts"))
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def _filter_file(path: str, cutoff_ts: float, backup) -> Tuple[int, int]:
+    """Stream `path` into a temp file keeping lines with ts >= cutoff; atomically replace."""
+    removed = kept = 0
+    fd, tmp = tempfile.mkstemp(prefix=".retention_", suffix=".jsonl", dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as out, open(path, "rb") as src:
+            for raw in src:
+                if not raw.strip():
+                    continue
+                ts = _line_ts(raw)
+                if ts is not None and ts < cutoff_ts:
+                    removed += 1
+                    if backup is not None:
+                        backup.write(raw if raw.endswith(b"\n") else raw + b"\n")
+                else:
+                    kept += 1
+                    out.write(raw if raw.endswith(b"\n") else raw + b"\n")
+        if removed:
+            shutil.copymode(path, tmp)
+            os.replace(tmp, path)
+        else:
+            os.remove(tmp)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return removed, kept
+
+
+def apply_retention(store: LogStore, cutoff_ts: float, backup_dir: Optional[str] = None,
+                    parquet_dir: Optional[str] = None) -> Tuple[int, int]:
+    """
+    Delete events with ts < cutoff_ts from every segment and the active file,
+    then from the Parquet tier in `parquet_dir` (if given and present).
+    Returns (removed, kept) JSONL line counts for the files that were examined
+    (Parquet rows are copies of those events and are not counted again).
+    """
+    removed = kept = 0
+    backup = None
+    if backup_dir:
+        os.makedirs(backup_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        backup = open(os.path.join(backup_dir, f"logs_backup_{stamp}.jsonl"), "ab")
+    try:
+        for seg in store.segments():
+            first, last = seg.get("first_ts"), seg.get("last_ts")
+            if first is not None and first >= cutoff_ts:
+                continue  # entirely newer than cutoff
+            path = store.segment_path(seg)
+            if last is not None and last < cutoff_ts:
+                with file_lock(store.lock_path):
+                    if os.path.exists(path):
+                        if backup_dir:
+                            shutil.move(path, os.path.join(backup_dir, f"segment_{seg['name']}"))
+                        else:
+                            os.remove(path)
+                    store.drop_segment(seg["name"])
+                removed += int(seg.get("lines", 0))
+                continue
+            with file_lock(store.lock_path):
+                if not os.path.exists(path):
+                    continue
+                r, k = _filter_file(path, cutoff_ts, backup)
+                removed, kept = removed + r, kept + k
+                if r:
+                    store.reindex_segment(seg["name"])
+
+        first = store.active_first_ts()
+        if first is not None and first < cutoff_ts:
+            with file_lock(store.lock_path):
+                if os.path.exists(store.path):
+                    r, k = _filter_file(store.path, cutoff_ts, backup)
+                    removed, kept = removed + r, kept + k
+    finally:
+        if backup is not None:
+            backup.close()
+    if parquet_dir and os.path.isdir(parquet_dir):
+        from app.core.log_compact import ParquetLogs
+
+        ParquetLogs(parquet_dir).prune_before(cutoff_ts)
+    return removed, kept
+
+
+def retention_cutoff(days: float) -> float:
+    return time.time() - days * 86400
@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.core.event_log import file_lock
+
+_BLOCK = 64 * 1024
+
+
+def _parse(line: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        obj = json.loads(line)
+        return obj if isinstance(obj, dict) else None
+    except ValueError:
+        return None
+
+
+def _ts(obj: Optional[Dict[str, Any]]) -> Optional[float]:
+    try:
+        return float(obj.get("ts")) if obj else None
+    except (TypeError, ValueError):
+        return None
+
+
+def reverse_lines(path: str, end: Optional[int] = None) -> Iterator[bytes]:
+    """Yield complete lines from the end of `path` backwards, reading 64 KB blocks."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        pos = f.seek(0, os.SEEK_END) if end is None else end
+        rest = b""
+        while pos > 0:
+            step = min(_BLOCK, pos)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + rest
+            lines = buf.split(b"\n")
+            rest = lines.pop(0)
+            for ln in reversed(lines):
+                if ln.strip():
+                    yield ln
+        if rest.strip():
+            yield rest
+
+
+def _seek_ts(f, target: float) -> int:
+    """
+    Byte offset in an (almost) ts-ordered JSONL file at or before the first
+    line with ts >= `target`, found by binary search over line starts.
+    """
+    lo, hi = 0, f.seek(0, os.SEEK_END)
+    while hi - lo > _BLOCK:
+        mid = (lo + hi) // 2
+        f.seek(mid)
+        f.readline()
+        t = None
+        while t is None:
+            raw = f.readline()
+            if not raw:
+                break
+            t = _ts(_parse(raw))
+        if t is not None and t < target:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+class LogStore:
+    """
+    Segmented JSONL event store.
+
+    - `path` is the active segment (what EventLogSink appends to).
+    - Closed segments live in `segment_dir` as NNNNNNNN.jsonl; `index.json`
+      records each one's first/last ts, size and sparse (byte offset, ts)
+      checkpoints every `checkpoint_every` lines.
+    - `tail(n)` reads backwards from the newest data; `since(ts)` skips whole
+      segments by ts range and seeks to the nearest checkpoint, so both cost
+      O(result) rather than O(history).
+    """
+
+    def __init__(self, path: str, segment_dir: Optional[str] = None, checkpoint_every: int = 256):
+        self.path = path
+        self.segment_dir = segment_dir or os.path.join(os.path.dirname(path) or ".", "log_segments")
+        self.manifest_path = os.path.join(self.segment_dir, "index.json")
+        self.lock_path = path + ".lock"
+        self.checkpoint_every = max(1, checkpoint_every)
+        self._manifest_cache: Tuple[float, Dict[str, Any]] = (-1.0, {"segments": [], "next_seq": 1})
+        self._active_first: Tuple[Optional[int], Optional[float]] = (None, None)
+
+    # -----------------
+    # Manifest
+    # -----------------
+    def manifest(self) -> Dict[str, Any]:
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime
+        except FileNotFoundError:
+            return {"segments": [], "next_seq": 1}
+        if mtime != self._manifest_cache[0]:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self._manifest_cache = (mtime, json.load(f))
+        return self._manifest_cache[1]
+
+    def _save_manifest(self, man: Dict[str, Any]):
+        os.makedirs(self.segment_dir, exist_ok=True)
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(man, f)
+        os.replace(tmp, self.manifest_path)
+
+    def segments(self) -> List[Dict[str, Any]]:
+        """Closed segments, oldest first."""
+        return list(self.manifest().get("segments", []))
+
+    def segment_path(self, seg: Dict[str, Any]) -> str:
+        return os.path.join(self.segment_dir, seg["name"])
+
+    # -----------------
+    # Rotation
+    # -----------------
+    def _index_file(self, path: str) -> Dict[str, Any]:
+        checkpoints: List[List[float]] = []
+        first = last = None
+        lines = 0
+        with open(path, "rb") as f:
+            offset = 0
+            for raw in f:
+                ts = _ts(_parse(raw))
+                if ts is not None:
+                    if lines % self.checkpoint_every == 0:
+                        checkpoints.append([offset, ts])
+                    first = ts if first is None else min(first, ts)
+                    last = ts if last is None else max(last, ts)
+                lines += 1
+                offset += len(raw)
+        return {"first_ts": first, "last_ts": last, "lines": lines, "bytes": offset, "checkpoints": checkpoints}
+
+    def active_first_ts(self) -> Optional[float]:
+        try:
+            ino = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return None
+        if self._active_first[0] != ino or self._active_first[1] is None:
+            with open(self.path, "rb") as f:
+                self._active_first = (ino, _ts(_parse(f.readline())))
+        return self._active_first[1]
+
+    def maybe_rotate(self, size: int, max_bytes: int, max_age: float) -> bool:
+        """Rotate when the active segment is larger than max_bytes or older than max_age seconds."""
+        if max_bytes and size >= max_bytes:
+            return self.rotate(min_bytes=max_bytes)
+        if max_age and size:
+            first = self.active_first_ts()
+            if first is not None and time.time() - first >= max_age:
+                return self.rotate()
+        return False
+
+    def rotate(self, min_bytes: int = 1) -> bool:
+        """
+        Close the active file into a new indexed segment. Holds the writer
+        lock, so appenders in any process reopen a fresh active file.
+        """
+        with file_lock(self.lock_path):
+            try:
+                size = os.path.getsize(self.path)
+            except FileNotFoundError:
+                return False
+            if size < max(1, min_bytes):
+                return False  # someone else rotated first
+            man = dict(self.manifest())
+            seq = int(man.get("next_seq", 1))
+            name = f"{seq:08d}.jsonl"
+            os.makedirs(self.segment_dir, exist_ok=True)
+            dest = os.path.join(self.segment_dir, name)
+            os.replace(self.path, dest)
+            seg = {"name": name, **self._index_file(dest)}
+            man["segments"] = list(man.get("segments", [])) + [seg]
+            man["next_seq"] = seq + 1
+            self._save_manifest(man)
+            return True
+
+    def drop_segment(self, name: str):
+        """Remove a closed segment from the index (caller holds the lock and deletes/moves the file)."""
+        man = dict(self.manifest())
+        man["segments"] = [s for s in man.get("segments", []) if s["name"] != name]
+        self._save_manifest(man)
+
+    def reindex_segment(self, name: str):
+        """Recompute a rewritten segment's ts range and checkpoints (caller holds the lock)."""
+        man = dict(self.manifest())
+        segs = []
+        for s in man.get("segments", []):
+            if s["name"] == name:
+                s = {"name": name, **self._index_file(os.path.join(self.segment_dir, name))}
+            segs.append(s)
+        man["segments"] = segs
+        self._save_manifest(man)
+
+    # -----------------
+    # Reads
+    # -----------------
+    def tail(self, n: int, include_active: bool = True) -> List[Dict[str, Any]]:
+        """Last `n` events, oldest first (optionally only from closed segments)."""
+        out: List[Dict[str, Any]] = []
+        if n <= 0:
+            return out
+        sources = ([self.path] if include_active else []) + [self.segment_path(s) for s in reversed(self.segments())]
+        for src in sources:
+            for ln in reverse_lines(src):
+                obj = _parse(ln)
+                if obj is not None:
+                    out.append(obj)
+                    if len(out) >= n:
+                        return out[::-1]
+        return out[::-1]
+
+    def find_segment_by_inode(self, ino: int) -> Optional[str]:
+        """Path of the closed segment that used to be the active file with inode `ino`."""
+        for seg in reversed(self.segments()):
+            p = self.segment_path(seg)
+            try:
+                if os.stat(p).st_ino == ino:
+                    return p
+            except FileNotFoundError:
+                continue
+        return None
+
+    def since(self, ts: float, limit: Optional[int] = None, slack: float = 1.0) -> List[Dict[str, Any]]:
+        """
+        The first `limit` events with ts > `ts`, in file (roughly time) order, so a
+        caller can page forward from the ts of the last event it got. Writers
+        stamp ts slightly before appending, so scans start `slack` seconds
+        early. Reads stop as soon as `limit` events are collected.
+        """
+        out: List[Dict[str, Any]] = []
+        for seg in self.segments():
+            last = seg.get("last_ts")
+            if last is not None and last <= ts:
+                continue
+            start = 0
+            for off, cts in seg.get("checkpoints", []):
+                if cts < ts - slack:
+                    start = int(off)
+                else:
+                    break
+            self._scan(self.segment_path(seg), start, ts, out, limit)
+            if limit is not None and len(out) >= limit:
+                return out
+        try:
+            with open(self.path, "rb") as f:
+                start = _seek_ts(f, ts - slack)
+        except FileNotFoundError:
+            return out
+        self._scan(self.path, start, ts, out, limit)
+        return out
+
+    @staticmethod
+    def _scan(path: str, start: int, ts: float, out: List[Dict[str, Any]], limit: Optional[int]):
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(start)
+            if start:
+                f.readline()  # `start` may fall mid-line
+            for raw in f:
+                obj = _parse(raw)
+                t = _ts(obj)
+                if t is not None and t > ts:
+                    out.append(obj)
+                    if limit is not None and len(out) >= limit:
+                        return
@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import bisect
+import contextlib
+import contextvars
+import functools
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# seconds; wide enough for Gmail round-trips and multi-second LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+PREFIX = "email_agent_"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**kw) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in kw.items()))
+
+
+def _fmt_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+class Histogram:
+    """
+    Cumulative bucket counts (exported as a Prometheus histogram) plus a
+    bounded reservoir of recent samples for exact-ish p50/p95/p99.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, reservoir: int = 2048):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last = +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.recent: deque = deque(maxlen=reservoir)
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def quantiles(self, qs=QUANTILES) -> Dict[float, float]:
+        data = sorted(self.recent)
+        if not data:
+            return {}
+        return {q: data[min(len(data) - 1, int(q * len(data)))] for q in qs}
+
+
+class Registry:
+    """
+    Process-wide counters and histograms keyed by (name, labels). Thread-safe;
+    graph nodes report from executor threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.help: Dict[str, str] = {}
+
+    def inc(self, name: str, value: float = 1.0, help: str = "", **labels):
+        key = _labels(**labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+            if help:
+                self.help.setdefault(name, help)
+
+    def observe(self, name: str, value: float, help: str = "", **labels):
+        key = _labels(**labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            h = series.get(key)
+            if h is None:
+                h = series[key] = Histogram()
+            h.observe(value)
+            if help:
+                self.help.setdefault(name, help)
+
+    def quantiles(self, name: str) -> Dict[Labels, Dict[float, float]]:
+        with self._lock:
+            return {k: h.quantiles() for k, h in self.histograms.get(name, {}).items()}
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def render(self) -> str:
+        """
+        Prometheus text exposition format (0.0.4). Each histogram also gets a
+        `<name>_quantile` gauge with p50/p95/p99 over its recent samples.
+        """
+        out: List[str] = []
+        with self._lock:
+            for name in sorted(self.counters):
+                full = PREFIX + name
+                if name in self.help:
+                    out.append(f"# HELP {full} {self.help[name]}")
+                out.append(f"# TYPE {full} counter")
+                for labels, v in sorted(self.counters[name].items()):
+                    out.append(f"{full}{_fmt_labels(labels)} {v:g}")
+            for name in sorted(self.histograms):
+                full = PREFIX + name
+                series = sorted(self.histograms[name].items())
+                if name in self.help:
+                    out.append(f"# HELP {full} {self.help[name]}")
+                out.append(f"# TYPE {full} histogram")
+                for labels, h in series:
+                    acc = 0
+                    for le, c in zip(list(h.buckets) + ["+Inf"], h.counts):
+                        acc += c
+                        out.append(f"{full}_bucket{_fmt_labels(labels, ('le', f'{le:g}' if le != '+Inf' else le))} {acc}")
+                    out.append(f"{full}_sum{_fmt_labels(labels)} {h.sum:.6f}")
+                    out.append(f"{full}_count{_fmt_labels(labels)} {h.count}")
+                out.append(f"# TYPE {full}_quantile gauge")
+                for labels, h in series:
+                    for q, v in h.quantiles().items():
+                        out.append(f"{full}_quantile{_fmt_labels(labels, ('quantile', f'{q:g}'))} {v:.6f}")
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+
+# ------------------------------------------------------------------
+# Spans: per-node accumulators, carried in a contextvar so LLM/Gmail
+# calls made inside a node are attributed to it (and to its log events)
+# ------------------------------------------------------------------
+_SPAN: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("agent_span", default=None)
+
+
+def _new_span(node: str) -> Dict[str, Any]:
+    return {
+        "node": node,
+        "start": time.perf_counter(),
+        "llm_calls": 0,
+        "retries": 0,
+        "prompt_tokens": 0,
+        "response_tokens": 0,
+        "gmail_calls": 0,
+        "bytes": 0,
+    }
+
+
+@contextlib.contextmanager
+def span(node: str) -> Iterator[Dict[str, Any]]:
+    """
+    Times a pipeline step. Records its latency histogram (and an error
+    counter if it raises) and collects the calls made inside it.
+    """
+    s = _new_span(node)
+    token = _SPAN.set(s)
+    try:
+        yield s
+    except Exception:
+        REGISTRY.inc("node_errors_total", help="Pipeline node exceptions.", node=node)
+        raise
+    finally:
+        _SPAN.reset(token)
+        REGISTRY.observe(
+            "node_latency_seconds", time.perf_counter() - s["start"],
+            help="Wall time per LangGraph node.", node=node,
+        )
+
+
+def trace_node(fn):
+    """Decorator: run a graph node inside `span(<function name>)`."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with span(fn.__name__):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def span_fields() -> Dict[str, Any]:
+    """
+    Fields merged into log events emitted inside a span: node, elapsed
+    latency so far, and the LLM/Gmail usage accumulated by the node.
+    """
+    s = _SPAN.get()
+    if s is None:
+        return {}
+    return {
+        "node": s["node"],
+        "latency_ms": round((time.perf_counter() - s["start"]) * 1000.0, 2),
+        "llm_calls": s["llm_calls"],
+        "retries": s["retries"],
+        "prompt_tokens": s["prompt_tokens"],
+        "response_tokens": s["response_tokens"],
+        "gmail_calls": s["gmail_calls"],
+        "bytes": s["bytes"],
+    }
+
+
+def record_llm(
+    model: str,
+    kind: str,
+    seconds: float,
+    retries: int = 0,
+    prompt_tokens: int = 0,
+    response_tokens: int = 0,
+    nbytes: int = 0,
+    error: bool = False,
+    throttled: bool = False,
+):
+    labels = {"model": model, "kind": kind}
+    REGISTRY.observe("llm_latency_seconds", seconds, help="Gemini call wall time, including retries.", **labels)
+    REGISTRY.inc("llm_calls_total", help="Gemini calls.", **labels)
+    if retries:
+        REGISTRY.inc("llm_retries_total", retries, help="Gemini retries after 429/5xx.", **labels)
+    if error:
+        REGISTRY.inc("llm_errors_total", help="Gemini calls that failed after retries.", **labels)
+    if throttled:
+        REGISTRY.inc("llm_throttled_total", help="Gemini calls given up because they would wait past max_wait.", **labels)
+    if prompt_tokens:
+        REGISTRY.inc("llm_tokens_total", prompt_tokens, help="Gemini tokens.", direction="prompt", **labels)
+    if response_tokens:
+        REGISTRY.inc("llm_tokens_total", response_tokens, help="Gemini tokens.", direction="response", **labels)
+    if nbytes:
+        REGISTRY.inc("llm_bytes_total", nbytes, help="Prompt + response text bytes.", **labels)
+    s = _SPAN.get()
+    if s is not None:
+        s["llm_calls"] += 1
+        s["retries"] += retries
+        s["prompt_tokens"] += prompt_tokens
+        s["response_tokens"] += response_tokens
+        s["bytes"] += nbytes
+
+
+def record_gmail(op: str, seconds: float, nbytes: int = 0, error: bool = False):
+    REGISTRY.observe("gmail_latency_seconds", seconds, help="Gmail API call wall time.", op=op)
+    REGISTRY.inc("gmail_calls_total", help="Gmail API HTTP calls.", op=op)
+    if error:
+        REGISTRY.inc("gmail_errors_total", help="Gmail API calls that raised.", op=op)
+    if nbytes:
+        REGISTRY.inc("gmail_bytes_total", nbytes, help="Message bytes sent/fetched (raw size / sizeEstimate).", op=op)
+    s = _SPAN.get()
+    if s is not None:
+        s["gmail_calls"] += 1
+        s["bytes"] += nbytes
+
+
+@contextlib.contextmanager
+def gmail_call(op: str) -> Iterator[Dict[str, int]]:
+    """
+    Times one Gmail HTTP call; the caller may set `rec["bytes"]`.
+    """
+    rec = {"bytes": 0}
+    t0 = time.perf_counter()
+    error = False
+    try:
+        yield rec
+    except Exception:
+        error = True
+        raise
+    finally:
+        record_gmail(op, time.perf_counter() - t0, rec["bytes"], error)
+
+
+def count_event(decision: str):
+    REGISTRY.inc("events_total", help="Logged pipeline events by decision.", decision=decision or "LOG")
@@ -2,13 +2,16 @@ from __future__ import annotations
 import base64
 import os
 import re
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from google.auth.transport.requests import Request
 
+from app.core import metrics
+
 # Gmail modify scope (read/send/labels)
 SCOPES = ["https://www.googleapis.com/auth/gmail.modify"]
 
@@ -73,6 +76,28 @@ def build_service(creds: Optional[Credentials] = None):
     return build("gmail", "v1", credentials=creds, cache_discovery=False)
 
 
+def service_factory(creds: Optional[Credentials] = None):
+    """
+    Return a zero-arg callable that builds a fresh Gmail service.
+    The underlying httplib2 transport is not thread-safe, so worker threads
+    each build their own service from the same (shared) credentials.
+    """
+    if creds is None:
+        creds = _creds()
+    return lambda: build_service(creds)
+
+
+def _execute(op: str, req, nbytes: int = 0):
+    """
+    req.execute(), timed and counted under `op` (see app.core.metrics).
+    Message fetches count their sizeEstimate as bytes.
+    """
+    with metrics.gmail_call(op) as rec:
+        resp = req.execute()
+        rec["bytes"] = nbytes or (int(resp.get("sizeEstimate") or 0) if isinstance(resp, dict) else 0)
+        return resp
+
+
 def list_messages(
     service, user_id: str = "me", q: Optional[str] = None, label_ids: Optional[List[str]] = None
 ) -> List[Dict[str, Any]]:
@@ -82,18 +107,100 @@ def list_messages(
     msgs: List[Dict[str, Any]] = []
     req = service.users().messages().list(userId=user_id, q=q, labelIds=label_ids or [])
     while req is not None:
-        resp = req.execute()
+        resp = _execute("messages.list", req)
         for m in resp.get("messages", []):
             msgs.append(m)
         req = service.users().messages().list_next(previous_request=req, previous_response=resp)
     return msgs
 
 
+class HistoryExpired(Exception):
+    """startHistoryId is too old (Gmail returns 404); caller must do a full sync."""
+
+
+def get_history_id(service, user_id: str = "me") -> str:
+    """
+    Current mailbox historyId (starting point for incremental sync).
+    """
+    return str(_execute("getProfile", service.users().getProfile(userId=user_id))["historyId"])
+
+
+def list_history(
+    service, start_history_id: str, label_id: Optional[str] = None, user_id: str = "me"
+) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Messages added to the mailbox (or given `label_id`) since `start_history_id`.
+    Returns (messages with their labelIds at change time, latest historyId).
+    Raises HistoryExpired if Gmail no longer has history that far back.
+    """
+    seen: Dict[str, Dict[str, Any]] = {}
+    latest = str(start_history_id)
+    kwargs: Dict[str, Any] = {
+        "userId": user_id,
+        "startHistoryId": start_history_id,
+        "historyTypes": ["messageAdded", "labelAdded"],
+    }
+    if label_id:
+        kwargs["labelId"] = label_id
+    req = service.users().history().list(**kwargs)
+    try:
+        while req is not None:
+            resp = _execute("history.list", req)
+            for h in resp.get("history", []) or []:
+                for rec in (h.get("messagesAdded") or []) + (h.get("labelsAdded") or []):
+                    m = rec.get("message") or {}
+                    if m.get("id"):
+                        seen[m["id"]] = m
+            latest = str(resp.get("historyId") or latest)
+            req = service.users().history().list_next(previous_request=req, previous_response=resp)
+    except HttpError as e:
+        if getattr(e, "resp", None) is not None and e.resp.status == 404:
+            raise HistoryExpired(str(e)) from e
+        raise
+    return list(seen.values()), latest
+
+
 def get_message(service, msg_id: str, user_id: str = "me") -> Dict[str, Any]:
     """
     Fetch a message in 'full' format (includes headers + MIME parts).
     """
-    return service.users().messages().get(userId=user_id, id=msg_id, format="full").execute()
+    return _execute("messages.get", service.users().messages().get(userId=user_id, id=msg_id, format="full"))
+
+
+def batch_get_messages(
+    service,
+    msg_ids: List[str],
+    user_id: str = "me",
+    format: str = "full",
+    metadata_headers: Optional[List[str]] = None,
+    batch_size: int = 50,
+) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+    """
+    Fetch many messages with BatchHttpRequest (<=100 sub-requests per HTTP call;
+    Gmail advises <=50 to avoid rate limiting).
+    Returns ({id: message}, [ids that failed]) so callers can retry stragglers singly.
+    """
+    out: Dict[str, Dict[str, Any]] = {}
+    failed: List[str] = []
+
+    def _cb(request_id, response, exception):
+        if exception is not None:
+            failed.append(request_id)
+        else:
+            out[request_id] = response
+
+    size = max(1, min(batch_size, 100))
+    for i in range(0, len(msg_ids), size):
+        batch = service.new_batch_http_request(callback=_cb)
+        for mid in msg_ids[i : i + size]:
+            kwargs: Dict[str, Any] = {"userId": user_id, "id": mid, "format": format}
+            if metadata_headers:
+                kwargs["metadataHeaders"] = metadata_headers
+            batch.add(service.users().messages().get(**kwargs), request_id=mid)
+        with metrics.gmail_call("batch.messages.get") as rec:
+            batch.execute()
+            rec["bytes"] = sum(int(out[m].get("sizeEstimate") or 0) for m in msg_ids[i : i + size] if m in out)
+    return out, failed
 
 
 def send_reply(
@@ -104,7 +211,7 @@ def send_reply(
     """
     msg = f"To: {to_addr}\r\nSubject: {subject}\r\n\r\n{body}"
     raw = base64.urlsafe_b64encode(msg.encode("utf-8")).decode("utf-8")
-    return service.users().messages().send(userId=user_id, body={"raw": raw}).execute()
+    return _execute("messages.send", service.users().messages().send(userId=user_id, body={"raw": raw}), nbytes=len(raw))
 
 
 def modify_labels(
@@ -118,7 +225,40 @@ def modify_labels(
     Add/remove labels by ID (or name, if you've looked up IDs).
     """
     body = {"addLabelIds": add or [], "removeLabelIds": remove or []}
-    return service.users().messages().modify(userId=user_id, id=msg_id, body=body).execute()
+    return _execute("messages.modify", service.users().messages().modify(userId=user_id, id=msg_id, body=body))
+
+
+def watch(
+    service, topic_name: str, label_ids: Optional[List[str]] = None, user_id: str = "me"
+) -> Dict[str, Any]:
+    """
+    Start (or renew) Gmail push notifications to a Pub/Sub topic.
+    Returns {"historyId", "expiration"}; watches expire after 7 days.
+    """
+    body: Dict[str, Any] = {"topicName": topic_name}
+    if label_ids:
+        body["labelIds"] = label_ids
+        body["labelFilterBehavior"] = "include"
+    return _execute("watch", service.users().watch(userId=user_id, body=body))
+
+
+def batch_modify(
+    service,
+    msg_ids: List[str],
+    add: Optional[List[str]] = None,
+    remove: Optional[List[str]] = None,
+    user_id: str = "me",
+) -> int:
+    """
+    Apply the same label change to many messages (users.messages.batchModify,
+    <=1000 IDs per call). Returns the number of API calls made.
+    """
+    calls = 0
+    for i in range(0, len(msg_ids), 1000):
+        body = {"ids": msg_ids[i : i + 1000], "addLabelIds": add or [], "removeLabelIds": remove or []}
+        _execute("messages.batchModify", service.users().messages().batchModify(userId=user_id, body=body))
+        calls += 1
+    return calls
 
 
 # -----------------------
@@ -129,7 +269,7 @@ def list_labels(service, user_id: str = "me") -> List[Dict[str, Any]]:
     """
     Return all labels (name + id).
     """
-    return service.users().labels().list(userId=user_id).execute().get("labels", [])
+    return _execute("labels.list", service.users().labels().list(userId=user_id)).get("labels", [])
 
 
 def ensure_labels(service, names: List[str], user_id: str = "me") -> Dict[str, str]:
@@ -143,14 +283,14 @@ def ensure_labels(service, names: List[str], user_id: str = "me") -> Dict[str, s
         if name in existing:
             out[name] = existing[name]
         else:
-            created = service.users().labels().create(
+            created = _execute("labels.create", service.users().labels().create(
                 userId=user_id,
                 body={
                     "name": name,
                     "labelListVisibility": "labelShow",
                     "messageListVisibility": "show",
                 },
-            ).execute()
+            ))
             out[name] = created["id"]
     return out
 
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import threading
+from typing import Dict, List, Tuple
+
+from app.email import gmail_client
+
+LabelSet = Tuple[Tuple[str, ...], Tuple[str, ...]]
+
+
+class LabelBatcher:
+    """
+    Coalesces per-message label changes into users.messages.batchModify calls,
+    grouped by identical (add, remove) label sets. Call `flush()` at the end of
+    a poll cycle.
+    """
+
+    def __init__(self):
+        self._pending: Dict[LabelSet, List[str]] = {}
+        self._ids: Dict[str, int] = {}  # msg_id -> queued changes not yet flushed
+        self._lock = threading.Lock()
+
+    def queue(self, msg_id: str, add: List[str], remove: List[str]):
+        key = (tuple(sorted(add or [])), tuple(sorted(remove or [])))
+        with self._lock:
+            self._pending.setdefault(key, []).append(msg_id)
+            self._ids[msg_id] = self._ids.get(msg_id, 0) + 1
+
+    def is_pending(self, msg_id: str) -> bool:
+        return msg_id in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def flush(self, service) -> int:
+        """
+        Send all queued changes; returns the number of API calls made.
+        Groups that fail are re-queued so the next flush retries them.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        calls = 0
+        try:
+            while pending:
+                (add, remove), ids = next(iter(pending.items()))
+                calls += gmail_client.batch_modify(service, ids, add=list(add), remove=list(remove))
+                del pending[(add, remove)]
+                with self._lock:
+                    # an ID re-queued during the flush (for any label set) stays pending
+                    for mid in ids:
+                        n = self._ids.get(mid, 0) - 1
+                        if n > 0:
+                            self._ids[mid] = n
+                        else:
+                            self._ids.pop(mid, None)
+        finally:
+            if pending:
+                with self._lock:
+                    for key, ids in pending.items():
+                        self._pending.setdefault(key, []).extend(ids)
+        return calls
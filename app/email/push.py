@@ -0,0 +1,61 @@
+"""
+Gmail push notifications (users.watch -> Pub/Sub push subscription).
+
+Pub/Sub POSTs an envelope like:
+    {"message": {"data": base64({"emailAddress": ..., "historyId": ...}),
+                 "messageId": "...", "publishTime": "..."},
+     "subscription": "projects/.../subscriptions/..."}
+
+Run this module to act as a local stand-in publisher against a dev server:
+    python -m app.email.push --url http://localhost:8000/gmail/push --history-id 12345
+"""
+from __future__ import annotations
+
+import base64
+import json
+import time
+from typing import Any, Dict, Optional, Tuple
+
+
+def decode_notification(envelope: Dict[str, Any]) -> Tuple[str, int]:
+    """
+    Returns (emailAddress, historyId) from a Pub/Sub push envelope.
+    Raises ValueError on malformed payloads.
+    """
+    msg = (envelope or {}).get("message") or {}
+    data = msg.get("data")
+    if not data:
+        raise ValueError("push envelope has no message.data")
+    try:
+        payload = json.loads(base64.b64decode(data + "=" * (-len(data) % 4)).decode("utf-8"))
+        return str(payload.get("emailAddress", "")), int(payload["historyId"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"bad Gmail notification payload: {e}") from e
+
+
+def encode_notification(email: str, history_id: int, message_id: Optional[str] = None) -> Dict[str, Any]:
+    """Build a Pub/Sub push envelope the way Google would deliver it."""
+    data = base64.b64encode(json.dumps({"emailAddress": email, "historyId": int(history_id)}).encode("utf-8"))
+    return {
+        "message": {
+            "data": data.decode("ascii"),
+            "messageId": message_id or str(int(time.time() * 1000)),
+            "publishTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "subscription": "projects/local/subscriptions/gmail-push",
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import httpx
+
+    ap = argparse.ArgumentParser(description="Send a fake Gmail Pub/Sub push notification")
+    ap.add_argument("--url", default="http://localhost:8000/gmail/push")
+    ap.add_argument("--email", default="me@example.com")
+    ap.add_argument("--history-id", type=int, required=True)
+    ap.add_argument("--token", default="", help="PUSH_TOKEN, if the server requires one")
+    args = ap.parse_args()
+    params = {"token": args.token} if args.token else None
+    r = httpx.post(args.url, json=encode_notification(args.email, args.history_id), params=params)
+    print(r.status_code, r.text)
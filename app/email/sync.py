@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from typing import Any, Collection, Dict, Iterable, List, Optional
+
+from rich import print as rprint
+
+from app.email import gmail_client
+
+
+class MailboxSync:
+    """
+    Finds candidate messages for a poll.
+
+    - mode "full": `list_messages(q=...)` every time (O(backlog) API calls).
+    - mode "history": after one full scan, ask `users.history.list` only for
+      messages added/labelled since the stored historyId (O(new messages)).
+      Falls back to a full scan when there is no saved historyId, when it has
+      expired, and every `full_every` polls as a safety net. A restart resumes
+      from the persisted historyId.
+
+    In history mode the historyId moves past a message as soon as it is
+    returned, so every returned ID stays in a persisted `pending` set until
+    the caller confirms it with `done()`. Pending IDs are offered again on
+    each poll (up to `max_attempts` times), so a message whose processing
+    failed or was cut short by a crash is retried instead of waiting for
+    the next full scan. IDs the caller still has in flight are neither
+    re-offered nor charged an attempt.
+    """
+
+    def __init__(self, state_path: str, mode: str = "history", full_every: int = 60, max_attempts: int = 5):
+        self.state_path = state_path
+        self.mode = mode
+        self.full_every = max(0, full_every)
+        self.max_attempts = max(1, max_attempts)
+        self._polls = 0
+        self._lock = threading.Lock()
+        self.history_id: Optional[str] = None
+        self.pending: Dict[str, int] = {}  # id -> times offered, until done()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.history_id = data.get("history_id")
+        self.pending = {str(k): int(v) for k, v in (data.get("pending") or {}).items()}
+
+    def _save(self):
+        # historyId and pending IDs are written together: a crash can't
+        # advance one without the other
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"history_id": self.history_id, "pending": self.pending}, f)
+        os.replace(tmp, self.state_path)
+
+    def reset(self):
+        with self._lock:
+            self.history_id = None
+            self.pending = {}
+            self._save()
+
+    def _full_scan(self, service, query: str) -> List[Dict[str, Any]]:
+        # record the starting point *before* listing so nothing slips between
+        hid = gmail_client.get_history_id(service)
+        msgs = gmail_client.list_messages(service, q=query)
+        self.history_id = hid
+        return msgs
+
+    def _offer(self, msgs: List[Dict[str, Any]], inflight: Collection[str] = ()) -> List[Dict[str, Any]]:
+        """New candidates plus still-pending retries; persists both with the historyId."""
+        ids = list(dict.fromkeys([m["id"] for m in msgs] + list(self.pending)))
+        out = []
+        for mid in ids:
+            if mid in inflight:
+                # still being processed: track it, but it isn't a new attempt
+                self.pending.setdefault(mid, 0)
+                continue
+            tries = self.pending.get(mid, 0) + 1
+            if tries > self.max_attempts:
+                rprint(f"[yellow]Giving up on {mid} after {self.max_attempts} attempts (next full scan retries it)[/]")
+                del self.pending[mid]
+                continue
+            self.pending[mid] = tries
+            out.append({"id": mid})
+        self._save()
+        return out
+
+    def done(self, ids: Iterable[str]):
+        """Confirm messages as handled (processed, or no longer in the inbox query)."""
+        with self._lock:
+            n = len(self.pending)
+            for mid in ids:
+                self.pending.pop(mid, None)
+            if len(self.pending) != n:
+                self._save()
+
+    def candidates(self, service, query: str, label_in_id: str, scheduled: bool = True,
+                   inflight: Collection[str] = ()) -> List[Dict[str, Any]]:
+        """
+        Candidate messages ({"id": ...}) for this poll. Only `scheduled` polls
+        count towards `full_every` (push-triggered and manual reads don't).
+        `inflight` IDs (queued or processing) are left out.
+        """
+        with self._lock:
+            if scheduled:
+                self._polls += 1
+            if self.mode != "history":
+                return gmail_client.list_messages(service, q=query)
+            if not self.history_id or (self.full_every and self._polls % self.full_every == 0):
+                return self._offer(self._full_scan(service, query), inflight)
+            try:
+                added, latest = gmail_client.list_history(service, self.history_id, label_id=label_in_id)
+            except gmail_client.HistoryExpired:
+                rprint("[yellow]Gmail historyId expired; running full sync[/]")
+                return self._offer(self._full_scan(service, query), inflight)
+            self.history_id = latest
+            # history records carry the labels at change time: keep what the
+            # query would have matched (in our inbox label and still unread)
+            return self._offer([
+                m
+                for m in added
+                if label_in_id in (m.get("labelIds") or []) and "UNREAD" in (m.get("labelIds") or [])
+            ], inflight)
@@ -14,12 +14,17 @@ def build_graph():
     g.add_node("escalate", escalate)
 
     g.set_entry_point("retrieve_context")
-    g.add_edge("retrieve_context", "draft_reply")
+    # reply cache hit: the reused reply was already validated
+    g.add_conditional_edges(
+        "retrieve_context",
+        lambda state: "send_email" if state.get("cache_hit") else "draft_reply",
+        {"send_email": "send_email", "draft_reply": "draft_reply"},
+    )
     g.add_edge("draft_reply", "validate_reply")
 
     def route(state: AgentState):
         v = state.get("validation", {}) or {}
-        ok = bool(v.get("is_valid")) and bool(v.get("tone_ok")) and bool(v.get("grounded_ok")) and not v.get("pii")
+        ok = bool(v.get("is_valid")) and bool(v.get("tone_ok")) and bool(v.get("grounded_ok")) and not v.get("pii_draft")
         if ok:
             return "send_email"
         if int(state.get("rewrite_count", 0)) < 2:
@@ -1,28 +1,96 @@
 from __future__ import annotations
-import os, json, time, numpy as np
-from typing import List, Dict, Any
+import atexit, time, threading, uuid
+from typing import List, Dict, Any, Callable, Optional
 from rich import print as rprint
-from app.core import config
+from app.core import config, metrics
+from app.core.event_bus import EventBus
+from app.core.event_log import EventLogSink
+from app.core.log_store import LogStore
 from app.email import gmail_client
+from app.email.label_batch import LabelBatcher
+from app.graph.reply_cache import ReplyCache
+from app.graph.snapshot import Snapshot, SnapshotRegistry
+from app.llm.rate_limit import RateLimitExceeded, estimate_tokens
+from app.retrieval.bm25 import BM25Index, reciprocal_rank_fusion
+from app.retrieval.vector_index import BruteForceIndex, chunk_id, index_version, normalize_rows
 
 SERVICE = None
 LLM = None
 LABEL_IDS = {}
-INDEX = None  # {"texts": List[str], "embeds": np.ndarray} OR a DB/collection
+INDEX = None  # {"texts": List[str], "embeds": normalized float32 np.ndarray, "backend": VectorIndex}
+SERVICE_FACTORY: Optional[Callable[[], Any]] = None
 
-def set_runtime(service, llm, label_ids, index):
-    global SERVICE, LLM, LABEL_IDS, INDEX
+# googleapiclient services (httplib2) are not thread-safe: each worker thread
+# gets its own service built from SERVICE_FACTORY. set_runtime bumps the
+# generation so every thread rebuilds on its next call, not just the caller.
+_local = threading.local()
+_service_gen = 0
+_log_lock = threading.Lock()
+LOG_SINK: Optional[EventLogSink] = None  # created on first log_event
+LOG_STORE: Optional[LogStore] = None
+BUS = EventBus()  # live subscribers (/logs/stream)
+
+def log_store() -> LogStore:
+    global LOG_STORE
+    if LOG_STORE is None:
+        LOG_STORE = LogStore(config.LOGS_PATH, config.LOG_SEGMENT_DIR)
+    return LOG_STORE
+
+# SKIP/escalate label changes are coalesced and flushed once per poll cycle
+LABELS = LabelBatcher()
+
+# keywords/matcher/index, swapped atomically on reload
+SNAPSHOTS = SnapshotRegistry()
+
+# validated replies, reused for near-identical PII-free questions
+REPLY_CACHE = ReplyCache(
+    ttl=config.REPLY_CACHE_TTL,
+    threshold=config.REPLY_CACHE_THRESHOLD,
+    max_items=config.REPLY_CACHE_SIZE,
+)
+
+def set_runtime(service, llm, label_ids, index, service_factory=None):
+    global SERVICE, LLM, LABEL_IDS, INDEX, SERVICE_FACTORY, _service_gen
     SERVICE = service
     LLM = llm
     LABEL_IDS = label_ids
     INDEX = index
+    SERVICE_FACTORY = service_factory
+    _service_gen += 1
+    if index is not None:
+        install_snapshot(Snapshot(index=index))
 
-def log_event(event: dict):
-    os.makedirs(os.path.dirname(config.LOGS_PATH), exist_ok=True)
-    event["ts"] = event.get("ts") or time.time()
-    with open(config.LOGS_PATH, "a", encoding="utf-8") as f:
-        f.write(json.dumps(event, ensure_ascii=False) + "\n")
+def install_snapshot(snap: Snapshot):
+    """
+    Make `snap` current. Runs already in flight keep the snapshot they
+    started with (looked up by the index_version on their state).
+    """
+    global INDEX
+    if snap.index is not None:
+        index_meta(snap.index)
+    SNAPSHOTS.publish(snap)
+    INDEX = snap.index
+    REPLY_CACHE.set_version(snap.version)
+
+def current_index_version() -> Optional[str]:
+    snap = SNAPSHOTS.current()
+    return snap.version if snap is not None else None
 
+def gmail_service():
+    """
+    Gmail service for the calling thread (falls back to the shared SERVICE
+    when no factory is configured).
+    """
+    if SERVICE_FACTORY is None:
+        return SERVICE
+    gen = _service_gen
+    svc = getattr(_local, "service", None)
+    if svc is None or getattr(_local, "gen", None) != gen:
+        svc = SERVICE_FACTORY()
+        _local.service, _local.gen = svc, gen
+    return svc
+
+def _echo(event: dict):
     # pretty console echo
     decision = (event.get("decision") or "LOG").upper()
     subject  = event.get("subject", "")
@@ -44,37 +112,182 @@ def log_event(event: dict):
     else:
         rprint(f"[white]{decision}[/] • {subject}  — {reason}")
 
-def retrieve(query: str, k: int = 4) -> List[str]:
-    qv = LLM.embed([query], task="RETRIEVAL_QUERY", dim=768)[0]
-    A = INDEX["embeds"]
-    q = np.array(qv)
-    A_norm = A / (np.linalg.norm(A, axis=1, keepdims=True) + 1e-9)
-    q_norm = q / (np.linalg.norm(q) + 1e-9)
-    sims = A_norm @ q_norm
-    topk = sims.argsort()[-k:][::-1]
-    return [INDEX["texts"][i] for i in topk]
+def _log_sink() -> EventLogSink:
+    global LOG_SINK
+    if LOG_SINK is None:
+        with _log_lock:
+            if LOG_SINK is None:
+                LOG_SINK = EventLogSink(
+                    config.LOGS_PATH,
+                    batch_size=config.LOG_BATCH_SIZE,
+                    flush_interval=config.LOG_FLUSH_INTERVAL,
+                    fsync=config.LOG_FSYNC,
+                    echo=_echo if config.LOG_ECHO else None,
+                    on_write=lambda size: log_store().maybe_rotate(
+                        size, config.LOG_SEGMENT_BYTES, config.LOG_SEGMENT_SECONDS
+                    ),
+                )
+                atexit.register(LOG_SINK.close)
+    return LOG_SINK
+
+def log_event(event: dict):
+    """
+    Non-blocking: stamps `ts` and a unique `event_id` and hands the event to the background writer,
+    which batches appends to LOGS_PATH (and echoes to the console), and to
+    any live stream subscribers. Inside a traced node the event also carries
+    the node name, elapsed latency and LLM/Gmail usage so far.
+    """
+    for k, v in metrics.span_fields().items():
+        event.setdefault(k, v)
+    event["ts"] = event.get("ts") or time.time()
+    event.setdefault("event_id", uuid.uuid4().hex)
+    metrics.count_event(event.get("decision") or "")
+    _log_sink().emit(event)
+    BUS.publish(dict(event))
+
+def flush_logs(timeout: Optional[float] = None) -> bool:
+    return LOG_SINK.flush(timeout) if LOG_SINK is not None else True
+
+def close_logs():
+    global LOG_SINK
+    if LOG_SINK is not None:
+        LOG_SINK.close()
+        LOG_SINK = None
+
+def _index(version: Optional[str] = None) -> Dict[str, Any]:
+    snap = SNAPSHOTS.get(version)
+    if version is not None and snap is not None and snap.version != version:
+        # the run's pinned snapshot was evicted (several reloads mid-run): it now
+        # reads the current index, so say so instead of mixing versions silently
+        metrics.REGISTRY.inc("snapshot_fallback_total", help="Lookups of an evicted index snapshot served from the current one.")
+        rprint(f"[yellow]Index snapshot {version} evicted; using current {snap.version}[/]")
+    return snap.index if snap is not None and snap.index is not None else INDEX
+
+def _backend(index: Optional[Dict[str, Any]] = None):
+    index = INDEX if index is None else index
+    backend = index.get("backend")
+    if backend is None:
+        # plain {"texts", "embeds"} dicts (older callers): normalize once, reuse
+        index["embeds"] = normalize_rows(index["embeds"])
+        backend = index["backend"] = BruteForceIndex(index["embeds"])
+    return backend
+
+def index_meta(index: Optional[Dict[str, Any]] = None):
+    """(chunk ids, version) of an index (default: current); derived once for plain dicts."""
+    index = INDEX if index is None else index
+    if "ids" not in index:
+        index["ids"] = [chunk_id(t) for t in index["texts"]]
+        index["version"] = index_version(index["ids"])
+    return index["ids"], index["version"]
+
+def _bm25(index: Dict[str, Any]) -> BM25Index:
+    bm = index.get("bm25")
+    if bm is None:
+        bm = index["bm25"] = BM25Index(index["texts"])
+    return bm
+
+def _embed_query(query: str):
+    """
+    Normalized query vector, or None when the embedding API is throttled
+    past EMBED_MAX_WAIT (callers fall back to BM25 alone).
+    """
+    try:
+        vec = LLM.embed([query], task="RETRIEVAL_QUERY", dim=768, max_wait=config.EMBED_MAX_WAIT)[0]
+    except RateLimitExceeded as e:
+        metrics.REGISTRY.inc("retrieval_fallback_total", help="Queries answered lexically because embedding was throttled.")
+        rprint(f"[yellow]Embedding throttled ({e}); lexical retrieval only[/]")
+        return None
+    return normalize_rows(vec)
+
+def retrieve_scored(query: str, k: int = config.RETRIEVAL_K, version: Optional[str] = None,
+                    keywords: Optional[List[str]] = None):
+    """
+    Returns (texts, chunk ids, normalized query vector or None, index version)
+    for the top-k chunks of the snapshot `version` (default: current).
+
+    RETRIEVAL_MODE:
+      - dense:   cosine over the vector index
+      - lexical: BM25 only (no API call)
+      - hybrid:  reciprocal rank fusion of both, plus a boost for chunks
+                 containing the subject's matched `keywords`; degrades to
+                 lexical if the query embedding is throttled
+    """
+    index = _index(version)
+    mode = config.RETRIEVAL_MODE
+    qv = _embed_query(query) if mode != "lexical" else None
+    if qv is not None and mode == "dense":
+        rows, _ = _backend(index).search(qv, k)
+    else:
+        n = max(k, config.RETRIEVAL_CANDIDATES)
+        rankings = [_bm25(index).search(query, n)[0]]
+        if qv is not None:
+            rankings.insert(0, _backend(index).search(qv, n)[0])
+        boost = {}
+        if keywords:
+            vote = config.KEYWORD_BOOST / (config.RRF_K + 1)
+            boost = {row: hits * vote for row, hits in _bm25(index).containing(keywords).items()}
+        rows = reciprocal_rank_fusion(rankings, k=config.RRF_K, boost=boost)[:k]
+    chunk_ids, ver = index_meta(index)
+    texts = [index["texts"][i] for i in rows]
+    if config.EXPAND_PARENTS:
+        texts = expand_parents(index, rows)
+    return texts, [chunk_ids[i] for i in rows], qv, ver
+
+def expand_parents(index: Dict[str, Any], rows) -> List[str]:
+    """
+    Replace retrieved children by their parent sections (deduped, in rank
+    order). A section longer than PARENT_MAX_TOKENS keeps the child instead.
+    """
+    parent_ids = index.get("parent_ids") or []
+    parents = index.get("parents") or {}
+    out: List[str] = []
+    seen = set()
+    for i in rows:
+        pid = parent_ids[i] if i < len(parent_ids) else None
+        parent = parents.get(pid) if pid else None
+        if parent is None or estimate_tokens(parent) > config.PARENT_MAX_TOKENS:
+            out.append(index["texts"][i])
+        elif pid not in seen:
+            seen.add(pid)
+            out.append(parent)
+    return out
+
+def retrieve(query: str, k: int = config.RETRIEVAL_K) -> List[str]:
+    return retrieve_scored(query, k)[0]
 
 def send_reply(to_addr: str, subject: str, body: str, msg_id: str, escalate_after: bool = False):
-    gmail_client.send_reply(SERVICE, to_addr=to_addr, subject=f"Re: {subject}", body=body)
+    gmail_client.send_reply(gmail_service(), to_addr=to_addr, subject=f"Re: {subject}", body=body)
     add = [LABEL_IDS.get(config.LABEL_OUT, config.LABEL_OUT)]
     if escalate_after:
         add.append(LABEL_IDS.get(config.LABEL_REVIEW, config.LABEL_REVIEW))
     gmail_client.modify_labels(
-        SERVICE, msg_id,
+        gmail_service(), msg_id,
         add=add,
         remove=["UNREAD", LABEL_IDS.get(config.LABEL_IN, config.LABEL_IN)]
     )
 
+def _modify_deferred(msg_id: str, add: List[str], remove: List[str]):
+    # safe to defer: if we crash before flush, the message is just re-scanned
+    # (history sync keeps it pending until main.flush_labels confirms it).
+    # Reply labels are never deferred (a re-scan there would double-reply).
+    if config.GMAIL_BATCH_LABELS:
+        LABELS.queue(msg_id, add, remove)
+    else:
+        gmail_client.modify_labels(gmail_service(), msg_id, add=add, remove=remove)
+
+def flush_labels() -> int:
+    return LABELS.flush(gmail_service()) if len(LABELS) else 0
+
 def escalate(msg_id: str):
-    gmail_client.modify_labels(
-        SERVICE, msg_id,
+    _modify_deferred(
+        msg_id,
         add=[LABEL_IDS.get(config.LABEL_REVIEW, config.LABEL_REVIEW)],
         remove=["UNREAD", LABEL_IDS.get(config.LABEL_IN, config.LABEL_IN)]
     )
 
 def mark_scanned(msg_id: str):
-    gmail_client.modify_labels(
-        SERVICE, msg_id,
+    _modify_deferred(
+        msg_id,
         add=[LABEL_IDS.get(config.LABEL_SCANNED, config.LABEL_SCANNED)],
         remove=["UNREAD", LABEL_IDS.get(config.LABEL_IN, config.LABEL_IN)]
     )
@@ -1,7 +1,9 @@
 from __future__ import annotations
 from app.graph.state import AgentState
 from app.graph import deps
-from app.llm.validators import detect_pii, validate_with_gemini
+from app.core import config, metrics
+from app.core.metrics import trace_node
+from app.llm.validators import detect_pii, parse_fused, validate_with_gemini, verify_grounding
 
 DRAFT_PROMPT = """You are a helpful airline support agent for Team Indigo.
 Use ONLY the policy context below. If the answer is not present, say you'll escalate.
@@ -26,27 +28,113 @@ Customer email:
 Write a concise reply strictly grounded in the policy. If policy doesn't cover it, say you'll escalate to a human agent.
 """
 
+# DRAFT_MODE=fused: draft + citations + self-check in one call, so most
+# replies are validated locally instead of by a second model call
+FUSED_PROMPT = """You are a helpful airline support agent for Team Indigo.
+Use ONLY the numbered policy chunks below. Do NOT invent details. Be concise, polite, professional.
+NEVER echo or reveal any personal data (emails, booking codes, phone, CC); REDACT it as [REDACTED].
+If the policy doesn't cover the question, say you'll escalate to a human agent.
+Close the reply with:
+Sincerely,
+Team Indigo
+
+Policy chunks:
+{context}
+
+Customer email:
+---
+{email}
+---
+{revision}
+Return ONLY JSON with keys:
+- reply: string (the email reply)
+- citations: list of chunk labels the reply is based on, e.g. ["C1", "C3"]
+- self_check: {{"grounded": boolean, "tone_ok": boolean, "contains_pii": boolean, "needs_escalation": boolean, "notes": string}}
+JSON ONLY:
+"""
+
+def _fused_draft(state: AgentState, revision: str = "") -> str:
+    """One generate call -> draft; citations/self-check kept in state['fused'] for validate_reply."""
+    docs = state.get("retrieved_docs", []) or []
+    prompt = FUSED_PROMPT.format(
+        context="\n".join(f"[C{i}] {d}" for i, d in enumerate(docs, 1)),
+        email=state["email_text"],
+        revision=revision,
+    )
+    raw = deps.LLM.generate(prompt)
+    obj = parse_fused(raw)
+    # unparseable output: keep the text as the draft and let the model validator judge it
+    state["fused"] = {"citations": obj["citations"], "self_check": obj["self_check"]} if obj else None
+    return obj["reply"] if obj else raw
 
+
+@trace_node
 def retrieve_context(state: AgentState) -> AgentState:
-    ctx = deps.retrieve(state["email_text"], k=4)
+    # index_version is pinned when the run starts, so a reload mid-run doesn't switch indexes
+    ctx, chunk_ids, qv, version = deps.retrieve_scored(
+        state["email_text"], k=config.RETRIEVAL_K, version=state.get("index_version"),
+        keywords=state.get("matched_keywords"),
+    )
     state["retrieved_docs"] = ctx
+    state["retrieved_ids"] = chunk_ids
+    state["query_vec"] = qv
+    state["index_version"] = version
     deps.log_event({
         "message_id": state["message_id"],
         "from_addr": state["from_addr"],
         "subject": state["subject"],
         "decision": "RETRIEVE",
-        "reason": "Retrieved policy context",
+        "reason": "Retrieved policy context" + (" (lexical)" if qv is None else ""),
         "matched_keywords": state.get("matched_keywords", []),
         "context_preview": ctx[:2]
     })
+    _use_cached_reply(state)
     return state
 
+def _use_cached_reply(state: AgentState):
+    """
+    Same retrieved chunks + (near-)identical question as a reply we already
+    validated and sent -> reuse it and skip draft/validate (PII-free only).
+    """
+    if not config.REPLY_CACHE_ENABLED:
+        return
+    if detect_pii(state.get("email_text", "") or ""):
+        metrics.REGISTRY.inc("reply_cache_requests_total", result="bypass")
+        return
+    hit = deps.REPLY_CACHE.get(state["email_text"], state["query_vec"], state["retrieved_ids"])
+    if hit is None:
+        return
+    reply, sim = hit
+    state["draft_reply"] = reply
+    state["cache_hit"] = True
+    state["pii_in_request"] = False
+    state["escalate_requested"] = False
+    state["validation"] = {
+        "is_valid": True, "tone_ok": True, "grounded_ok": True,
+        "reason": f"Reply cache hit (similarity {sim:.3f})",
+        "pii_request": [], "pii_draft": [],
+    }
+    state["decision"] = "REPLY"
+    state["reason"] = state["validation"]["reason"]
+    deps.log_event({
+        "message_id": state["message_id"],
+        "from_addr": state.get("from_addr", ""),
+        "subject": state.get("subject", ""),
+        "decision": "VALIDATED",
+        "reason": state["reason"],
+        "cache_hit": True,
+    })
+
+@trace_node
 def draft_reply(state: AgentState) -> AgentState:
-    prompt = DRAFT_PROMPT.format(
-        context="\n".join(state["retrieved_docs"]),
-        email=state["email_text"]
-    )
-    draft = deps.LLM.generate(prompt)
+    if config.DRAFT_MODE == "fused":
+        draft = _fused_draft(state)
+    else:
+        prompt = DRAFT_PROMPT.format(
+            context="\n".join(state["retrieved_docs"]),
+            email=state["email_text"]
+        )
+        draft = deps.LLM.generate(prompt)
     state["draft_reply"] = draft
     deps.log_event({
         "message_id": state["message_id"],
@@ -86,21 +174,43 @@ def draft_reply(state: AgentState) -> AgentState:
 #     return state
 
 
+@trace_node
 def validate_reply(state: AgentState) -> AgentState:
     """
     - Valid = validator says ok (grounded + tone) AND draft has no PII.
     - If the *incoming request* had PII, we still allow the reply (with redaction),
       but we mark state['pii_in_request'] so send_email() will escalate-after-reply.
+    - Likewise when a fused draft's self-check asks for escalation
+      (state['escalate_requested']).
     """
     draft = state.get("draft_reply", "") or ""
     ctx = state.get("retrieved_docs", []) or []
 
-    # 1) run model validator (JSON-only, robust)
-    v = validate_with_gemini(deps.LLM, ctx, draft)
+    # 1) fused drafts are checked locally; the model validator runs only when that is inconclusive
+    fused = state.get("fused")
+    state["fused"] = None
+    local = None
+    if fused:
+        local = verify_grounding(draft, fused["citations"], fused["self_check"], ctx, config.FUSED_MIN_SUPPORT)
+        metrics.REGISTRY.inc("fused_checks_total", help="Local checks of fused drafts.", verdict=local["verdict"])
+        if fused["self_check"].get("needs_escalation"):
+            state["escalate_requested"] = True
+    if local and local["verdict"] != "inconclusive":
+        ok = local["verdict"] == "pass"
+        sc = fused["self_check"]
+        v = {
+            "is_valid": ok, "reason": local["reason"],
+            "tone_ok": ok or sc.get("tone_ok") is not False,
+            "grounded_ok": ok or sc.get("grounded") is not False,
+        }
+    else:
+        # run model validator (JSON-only, robust)
+        v = validate_with_gemini(deps.LLM, ctx, draft)
 
     # 2) PII detection (request vs. draft)
     pii_in_request = detect_pii(state.get("email_text", "") or "")
-    pii_in_draft   = detect_pii(draft)
+    # (the local check already ignores PII-like strings quoted from the cited policy)
+    pii_in_draft   = local["pii_draft"] if local else detect_pii(draft)
 
     # 3) validity check
     valid_core = bool(v.get("is_valid")) and bool(v.get("tone_ok")) and bool(v.get("grounded_ok"))
@@ -121,6 +231,8 @@ def validate_reply(state: AgentState) -> AgentState:
         # reply is fine; if request had PII we'll escalate after sending
         state["decision"] = "REPLY"
         state["reason"] = "Validation passed" + (" (PII in request: will escalate after reply)" if pii_in_request else "")
+        if state.get("escalate_requested"):
+            state["reason"] += " (escalation requested: will escalate after reply)"
         log_decision = "VALIDATED"
     else:
         # ask model to fix issues (will trigger rewrite node)
@@ -138,11 +250,30 @@ def validate_reply(state: AgentState) -> AgentState:
         "reason": state["reason"],
         "pii_request": pii_in_request,
         "pii_draft": pii_in_draft,
+        "validator": "local" if local and local["verdict"] != "inconclusive" else "gemini",
     })
     return state
 
+@trace_node
 def rewrite_reply(state: AgentState) -> AgentState:
     fb = state.get("reason") or state.get("validation", {}).get("reason", "Fix issues.")
+    if config.DRAFT_MODE == "fused":
+        revision = (f"\nYour previous reply was rejected: {fb}\nPrevious reply:\n---\n"
+                    f"{state.get('draft_reply', '')}\n---\nWrite a corrected reply.\n")
+        state["draft_reply"] = _fused_draft(state, revision)
+    else:
+        state["draft_reply"] = _rewrite(state, fb)
+    state["rewrite_count"] = int(state.get("rewrite_count", 0)) + 1
+    deps.log_event({
+        "message_id": state["message_id"],
+        "from_addr": state["from_addr"],          # <<< added
+        "subject": state["subject"],              # <<< added
+        "decision": "REWRITE",
+        "reason": f"Rewrite #{state['rewrite_count']}"
+    })
+    return state
+
+def _rewrite(state: AgentState, fb: str) -> str:
     fix_prompt = f"""Revise the reply to fix issues: {fb}
 Stay strictly within policy context below. Never include PII. Redact any PII as [REDACTED].
 ---
@@ -153,19 +284,13 @@ Original reply:
 {state.get("draft_reply","")}
 ---
 New reply (concise, polite):"""
-    state["draft_reply"] = deps.LLM.generate(fix_prompt)
-    state["rewrite_count"] = int(state.get("rewrite_count", 0)) + 1
-    deps.log_event({
-        "message_id": state["message_id"],
-        "from_addr": state["from_addr"],          # <<< added
-        "subject": state["subject"],              # <<< added
-        "decision": "REWRITE",
-        "reason": f"Rewrite #{state['rewrite_count']}"
-    })
-    return state
+    return deps.LLM.generate(fix_prompt)
 
+@trace_node
 def send_email(state: AgentState) -> AgentState:
-    escalate_after = bool(state.get("pii_in_request"))
+    escalate_after = bool(state.get("pii_in_request") or state.get("escalate_requested"))
+    # validate_reply (or a cache hit) leaves decision == "REPLY" only for a passing draft
+    validated = state.get("decision") == "REPLY"
     deps.send_reply(
         state["from_addr"],
         state["subject"],
@@ -175,7 +300,18 @@ def send_email(state: AgentState) -> AgentState:
     )
     state["final_reply"] = state["draft_reply"]
     state["decision"] = "REPLY"
-    state["reason"] = "Reply sent" + (" (escalated for PII review)" if escalate_after else "")
+    state["reason"] = "Reply sent" + (" (escalated for PII review)" if state.get("pii_in_request") else "")
+    if state.get("escalate_requested"):
+        state["reason"] += " (escalated: self-check requested review)"
+    if state.get("cache_hit"):
+        state["reason"] += " (cached)"
+    elif (config.REPLY_CACHE_ENABLED and validated and not escalate_after and state.get("retrieved_ids")
+          and not (state.get("validation") or {}).get("pii_draft") and not detect_pii(state["final_reply"])):
+        # validated, PII-free reply to a PII-free request: reusable for the same question
+        deps.REPLY_CACHE.put(
+            state["email_text"], state["query_vec"], state["retrieved_ids"],
+            state["final_reply"], version=state.get("index_version"),
+        )
     deps.log_event({
         "message_id": state["message_id"],
         "from_addr": state["from_addr"],          # <<< added
@@ -185,6 +321,7 @@ def send_email(state: AgentState) -> AgentState:
     })
     return state
 
+@trace_node
 def escalate(state: AgentState) -> AgentState:
     deps.escalate(state["message_id"])
     state["decision"] = "ESCALATE"
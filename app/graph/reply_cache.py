@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core import metrics
+from app.llm.embed_cache import normalize_text
+
+
+class ReplyCache:
+    """
+    Validated replies keyed by the exact set of retrieved chunk ids, matched
+    on query-embedding similarity.
+
+    A lookup hits when an entry for the same chunk set is younger than `ttl`,
+    was built against the current index version, and either has the same
+    normalized question text or a query cosine >= `threshold`. Callers must
+    only `put` replies that passed validation for PII-free requests.
+    """
+
+    per_key = 16  # near-duplicate questions kept per chunk set
+
+    def __init__(self, ttl: float = 3600, threshold: float = 0.95, max_items: int = 512):
+        self.ttl = ttl
+        self.threshold = threshold
+        self.max_items = max(1, max_items)
+        self.version: Optional[str] = None
+        # frozenset(chunk ids) -> [entry], LRU over chunk sets
+        self._entries: "OrderedDict[frozenset, List[Dict[str, Any]]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.puts = self.invalidations = 0
+
+    def set_version(self, version: Optional[str]):
+        """Drop everything when the policy index changes."""
+        with self._lock:
+            if version != self.version:
+                if self._entries:
+                    self.invalidations += 1
+                    metrics.REGISTRY.inc("reply_cache_invalidations_total", help="Reply cache flushes on index change.")
+                self._entries.clear()
+                self._size = 0
+                self.version = version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _live(self, entries: List[Dict[str, Any]], now: float) -> List[Dict[str, Any]]:
+        return [e for e in entries if now - e["at"] < self.ttl]
+
+    def get(self, question: str, query_vec, chunk_ids: List[str]) -> Optional[Tuple[str, float]]:
+        """Returns (reply, similarity) on a hit, else None."""
+        key = frozenset(chunk_ids)
+        norm = normalize_text(question)
+        now = time.time()
+        best: Optional[Tuple[str, float]] = None
+        with self._lock:
+            entries = self._entries.get(key)
+            if entries:
+                live = self._live(entries, now)
+                self._size -= len(entries) - len(live)
+                if live:
+                    self._entries[key] = live
+                    self._entries.move_to_end(key)
+                else:
+                    del self._entries[key]
+                for e in live:
+                    if e["question"] == norm:
+                        sim = 1.0
+                    elif query_vec is None or e["vec"] is None:
+                        continue  # lexical-only retrieval: exact question matches only
+                    else:
+                        sim = float(np.dot(e["vec"], query_vec))
+                    if sim >= self.threshold and (best is None or sim > best[1]):
+                        best = (e["reply"], sim)
+            if best is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        metrics.REGISTRY.inc("reply_cache_requests_total", help="Reply cache lookups.", result="hit" if best else "miss")
+        return best
+
+    def put(self, question: str, query_vec, chunk_ids: List[str], reply: str, version: Optional[str] = None):
+        if version is not None and version != self.version:
+            return  # built against an index that has since been replaced
+        key = frozenset(chunk_ids)
+        entry = {
+            "question": normalize_text(question),
+            "vec": np.asarray(query_vec, dtype=np.float32) if query_vec is not None else None,
+            "reply": reply,
+            "at": time.time(),
+        }
+        with self._lock:
+            entries = self._entries.setdefault(key, [])
+            entries.append(entry)
+            self._size += 1
+            if len(entries) > self.per_key:
+                del entries[0]
+                self._size -= 1
+            self._entries.move_to_end(key)
+            self.puts += 1
+            while self._size > self.max_items and self._entries:
+                _, dropped = self._entries.popitem(last=False)
+                self._size -= len(dropped)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "puts": self.puts,
+            "invalidations": self.invalidations,
+            "version": self.version,
+        }
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class Snapshot:
+    """
+    Immutable view of the reloadable runtime: keywords, compiled matcher and
+    policy index. Readers grab one reference and use it for the whole
+    message, so a reload mid-run never mixes old and new data.
+    """
+
+    __slots__ = ("keywords", "matcher", "index", "stamp", "created")
+
+    def __init__(self, keywords=None, matcher=None, index: Optional[Dict[str, Any]] = None,
+                 stamp: Optional[Dict[str, Any]] = None):
+        self.keywords = keywords
+        self.matcher = matcher
+        self.index = index
+        self.stamp = stamp or {}  # source file (mtime_ns, size) it was built from
+        self.created = time.time()
+
+    @property
+    def version(self) -> Optional[str]:
+        return (self.index or {}).get("version")
+
+
+class SnapshotRegistry:
+    """
+    Current snapshot plus the last few by index version, so a graph run that
+    started before a swap can still resolve the index it retrieved from.
+    """
+
+    def __init__(self, keep: int = 3):
+        self.keep = max(1, keep)
+        self._current: Optional[Snapshot] = None
+        self._recent: "OrderedDict[str, Snapshot]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.swaps = 0
+
+    def publish(self, snap: Snapshot):
+        with self._lock:
+            if snap.version is not None:
+                self._recent.pop(snap.version, None)
+                self._recent[snap.version] = snap
+                while len(self._recent) > self.keep:
+                    self._recent.popitem(last=False)
+            self._current = snap  # single reference assignment: readers see old or new, never half
+            self.swaps += 1
+
+    def current(self) -> Optional[Snapshot]:
+        return self._current
+
+    def get(self, version: Optional[str] = None) -> Optional[Snapshot]:
+        """Snapshot for `version`; the current one if it was evicted (callers check .version)."""
+        if version is None:
+            return self._current
+        with self._lock:
+            return self._recent.get(version) or self._current
@@ -9,9 +9,15 @@ class AgentState(TypedDict, total=False):
     matched_keywords: List[str]
 
     retrieved_docs: List[str]  # RAG context
+    retrieved_ids: List[str]   # content-hash ids of retrieved_docs
+    query_vec: Any             # normalized query embedding (reply cache lookup)
+    index_version: str         # index snapshot this run is pinned to
+    cache_hit: bool            # draft_reply reused from the reply cache
     draft_reply: str
+    fused: Dict[str, Any]      # DRAFT_MODE=fused: {citations, self_check} of the current draft
+    escalate_requested: bool   # a fused self-check asked for human review (escalate after reply)
 
-    validation: Dict[str, Any] # {is_valid, reason, tone_ok, grounded_ok, pii: [...]}
+    validation: Dict[str, Any] # {is_valid, reason, tone_ok, grounded_ok, pii_request: [...], pii_draft: [...]}
     rewrite_count: int
 
     decision: str              # "REWRITE" | "REPLY" | "ESCALATE" | "SKIP"
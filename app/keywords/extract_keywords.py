@@ -26,14 +26,19 @@ def normalize_word(w: str) -> str:
     return re.sub(r"[^a-z0-9\-]+", "", w.lower())
 
 
+def tokenize(text: str) -> List[str]:
+    """Lowercased content words (stopwords and <=2-char tokens dropped)."""
+    tokens = [normalize_word(x) for x in re.findall(r"[A-Za-z0-9\-']+", text)]
+    return [t for t in tokens if t and t not in STOP and len(t) > 2]
+
+
 def extract_phrases(lines: List[str]) -> List[str]:
     """Pull 2–5 word phrases mostly from headings/Q lines."""
     phrases = []
     for ln in lines:
         if ln.startswith("#") or "?" in ln or ln.strip().endswith(":"):
             t = re.sub(r"^[\-\*\d\.\)\(]+\s*", "", ln).strip()
-            tokens = [normalize_word(x) for x in re.findall(r"[A-Za-z0-9\-']+", t)]
-            tokens = [x for x in tokens if x and x not in STOP and len(x) > 2]
+            tokens = tokenize(t)
             for n in (2, 3, 4, 5):
                 for i in range(0, len(tokens) - n + 1):
                     phrases.append(" ".join(tokens[i : i + n]))
@@ -43,9 +48,7 @@ def extract_phrases(lines: List[str]) -> List[str]:
 
 
 def extract_unigrams(text: str) -> List[str]:
-    tokens = [normalize_word(x) for x in re.findall(r"[A-Za-z0-9\-']+", text)]
-    tokens = [t for t in tokens if t and t not in STOP and len(t) > 2]
-    c = collections.Counter(tokens)
+    c = collections.Counter(tokenize(text))
     kept = [w for w, f in c.items() if f >= 3 or len(w) >= 8]
     kept = sorted(set(kept), key=lambda x: (-len(x), x))
     return kept[:300]
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Set
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+# phrases shorter than this are too noisy for substring matching
+MIN_PHRASE_LEN = 5
+
+
+def split_words(s: str) -> List[str]:
+    return _NON_ALNUM.sub(" ", s).split()
+
+
+class AhoCorasick:
+    """
+    Substring automaton: finds every pattern occurring in a text in a single
+    pass, independent of how many patterns there are.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+        for p in patterns:
+            self._add(p)
+        self._link()
+
+    def _add(self, pattern: str):
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(pattern)
+
+    def _link(self):
+        # BFS: fail[child] = longest proper suffix that is also a trie path
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                cand = self._goto[f].get(ch, 0)
+                self._fail[child] = cand if cand != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find_all(self, text: str) -> Set[str]:
+        found: Set[str] = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+class KeywordMatcher:
+    """
+    Precompiled subject gate for a keywords.json dict:
+    - phrases (len >= 5): substring match via one Aho–Corasick pass
+    - unigrams: whole-word match via set intersection with the subject's words
+    """
+
+    def __init__(self, kw: dict):
+        self.phrases = [p for p in kw.get("phrases", []) if len(p) >= MIN_PHRASE_LEN]
+        self.unigrams = frozenset(kw.get("unigrams", []))
+        self._ac = AhoCorasick(self.phrases)
+
+    def match(self, subject: str) -> List[str]:
+        subject_norm = subject.lower()
+        matched = self._ac.find_all(subject_norm)
+        matched.update(self.unigrams.intersection(split_words(subject_norm)))
+        return sorted(matched)
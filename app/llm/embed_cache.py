@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+
+def normalize_text(text: str) -> str:
+    """Case/whitespace-insensitive form so trivially different queries share a key."""
+    return " ".join((text or "").lower().split()).strip(" .,!?;:")
+
+
+def cache_key(model: str, task: str, dim: int, text: str) -> str:
+    h = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model}|{task}|{dim}|{h}"
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by (model, task, dim, normalized-text hash).
+
+    - In-memory LRU (`max_items` entries).
+    - Optional SQLite file shared across restarts and processes (WAL mode).
+      `ts` is the last write or disk hit; rows older than `ttl` seconds and
+      the least recently used rows beyond `max_rows` are pruned on open and
+      as inserts push the table past the cap (0 = no limit).
+    """
+
+    def __init__(self, max_items: int = 4096, db_path: Optional[str] = None,
+                 max_rows: int = 0, ttl: float = 0.0):
+        self.max_items = max(0, max_items)
+        self.db_path = db_path or None
+        self.max_rows = max(0, max_rows)
+        self.ttl = max(0.0, ttl)
+        self._rows = 0  # approximate row count (replaced keys overcount until the next prune)
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.db_path:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vec BLOB NOT NULL, ts REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_ts ON embeddings (ts)")
+            self._db.commit()
+            with self._lock:
+                self._prune()
+
+    # -----------------
+    # SQLite tier
+    # -----------------
+    def _prune(self):
+        """Apply ttl / max_rows to the SQLite tier (caller holds the lock)."""
+        if self.ttl:
+            self._db.execute("DELETE FROM embeddings WHERE ts < ?", (time.time() - self.ttl,))
+        n = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if self.max_rows and n > self.max_rows:
+            self._db.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY ts LIMIT ?)",
+                (n - self.max_rows,),
+            )
+            n = self.max_rows
+        self._db.commit()
+        self._rows = n
+
+    # -----------------
+    # LRU tier
+    # -----------------
+    def _lru_put(self, key: str, vec: List[float]):
+        if not self.max_items:
+            return
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_items:
+            self._lru.popitem(last=False)
+
+    # -----------------
+    # Public API
+    # -----------------
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        missing: List[str] = []
+        with self._lock:
+            for k in keys:
+                v = self._lru.get(k)
+                if v is not None:
+                    self._lru.move_to_end(k)
+                    found[k] = v
+                else:
+                    missing.append(k)
+            if missing and self._db is not None:
+                for i in range(0, len(missing), 500):
+                    part = missing[i : i + 500]
+                    rows = self._db.execute(
+                        f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                    ).fetchall()
+                    for k, blob in rows:
+                        vec = array("f", blob).tolist()
+                        found[k] = vec
+                        self._lru_put(k, vec)
+                        self.disk_hits += 1
+                    if rows:
+                        # keep recently used rows ahead of the max_rows / ttl pruning
+                        self._db.executemany("UPDATE embeddings SET ts = ? WHERE key = ?",
+                                             [(time.time(), k) for k, _ in rows])
+                        self._db.commit()
+            self.hits += len(found)
+            self.misses += len(set(missing) - set(found))
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        with self._lock:
+            for k, v in items.items():
+                self._lru_put(k, list(v))
+            if self._db is not None:
+                now = time.time()
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vec, ts) VALUES (?, ?, ?)",
+                    [(k, array("f", v).tobytes(), now) for k, v in items.items()],
+                )
+                self._db.commit()
+                self._rows += len(items)
+                # 10% slack so a full table isn't pruned on every insert
+                if self.max_rows and self._rows > self.max_rows * 1.1:
+                    self._prune()
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "memory_items": len(self._lru),
+        }
@@ -1,11 +1,18 @@
 from __future__ import annotations
 
+import asyncio
 import time
 from typing import List, Optional
 
 from google import genai
 from google.genai import types
-from google.genai.errors import ClientError
+from google.genai.errors import APIError
+
+from app.core import config, metrics
+from app.llm.embed_cache import EmbeddingCache, cache_key
+from app.llm.rate_limit import (
+    RateLimitExceeded, backoff_delay, estimate_tokens, get_limiter, is_retryable, is_throttled,
+)
 
 
 class GeminiClient:
@@ -16,8 +23,13 @@ class GeminiClient:
     - Embeddings: gemini-embedding-001
     - Handles:
         * Batch limit for embeddings (<=100 items/request)
-        * Free-tier 429 (RESOURCE_EXHAUSTED) with per-batch retry/backoff
+        * Shared per-model RPM/TPM token buckets and in-flight caps
+        * 429/5xx retries with jittered exponential backoff (honors retry-after)
         * Optional per-batch sleep to be extra gentle on quotas
+        * Optional EmbeddingCache: only uncached texts hit the embedding API
+        * Latency/retry/token/byte metrics per call (app.core.metrics)
+    - Async counterparts (`aembed`, `agenerate`) use the SDK's aio client, so a
+      throttled call only parks its own coroutine.
     """
 
     def __init__(
@@ -28,6 +40,8 @@ class GeminiClient:
         emb_dim: int = 768,
         batch_size: int = 100,        # Gemini cap per embed request
         per_batch_sleep: float = 0.0, # optional delay between batches (seconds)
+        max_retries: Optional[int] = None,
+        cache: Optional[EmbeddingCache] = None,
     ):
         # If api_key is set via environment, passing empty here is also fine.
         self.client = genai.Client(api_key=api_key) if api_key else genai.Client()
@@ -36,62 +50,206 @@ class GeminiClient:
         self.emb_dim = emb_dim
         self.batch_size = max(1, min(batch_size, 100))
         self.per_batch_sleep = max(0.0, per_batch_sleep)
+        self.max_retries = config.GEMINI_MAX_RETRIES if max_retries is None else max_retries
+        self.cache = cache
+
+    # -----------------
+    # Retry plumbing
+    # -----------------
+    def _kind(self, model: str) -> str:
+        return "generate" if model == self.gen_model else "embed"
+
+    def _record(self, model: str, tokens: int, t0: float, attempt: int, res=None, prompt_bytes: int = 0,
+                throttled: bool = False):
+        """
+        Report one logical call (all its retries) to metrics: wall time,
+        retries, tokens (usage_metadata when the API returns it, else our
+        estimate) and text bytes. `throttled`: given up with RateLimitExceeded.
+        """
+        usage = getattr(res, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", None) or tokens
+        response_tokens = getattr(usage, "candidates_token_count", None) or 0
+        text = getattr(res, "text", None) if self._kind(model) == "generate" else None
+        metrics.record_llm(
+            model,
+            self._kind(model),
+            time.perf_counter() - t0,
+            retries=attempt,
+            prompt_tokens=int(prompt_tokens) if res is not None else 0,
+            response_tokens=int(response_tokens),
+            nbytes=prompt_bytes + (len(text.encode("utf-8")) if isinstance(text, str) else 0),
+            error=res is None and not throttled,
+            throttled=throttled,
+        )
+
+    def _give_up(self, err: APIError, attempt: int, t0: float, unbounded: bool) -> bool:
+        if not is_retryable(err):
+            return True
+        if attempt < self.max_retries:
+            return False
+        # past the cap only quota throttling is retried (index builds), and only
+        # until EMBED_RETRY_DEADLINE: an outage (5xx) must not hang startup/reload
+        return not (unbounded and is_throttled(err) and time.perf_counter() - t0 < config.EMBED_RETRY_DEADLINE)
+
+    def _call(self, model: str, tokens: int, fn, prompt_bytes: int = 0, max_wait: Optional[float] = None,
+              unbounded: bool = False):
+        """
+        `max_wait` bounds time spent waiting on our own limiter or a 429
+        backoff: past it, RateLimitExceeded is raised instead of sleeping.
+        `unbounded` keeps retrying 429s past max_retries, up to
+        EMBED_RETRY_DEADLINE (index builds).
+        """
+        limiter = get_limiter(model)
+        attempt = 0
+        t0 = time.perf_counter()
+        while True:
+            try:
+                with limiter.slot(tokens, max_wait):
+                    res = fn()
+                self._record(model, tokens, t0, attempt, res, prompt_bytes)
+                return res
+            except RateLimitExceeded:
+                self._record(model, tokens, t0, attempt, throttled=True)
+                raise
+            except APIError as e:
+                if self._give_up(e, attempt, t0, unbounded):
+                    self._record(model, tokens, t0, attempt)
+                    raise
+                delay = backoff_delay(attempt, e)
+                if max_wait is not None and delay > max_wait:
+                    self._record(model, tokens, t0, attempt, throttled=True)
+                    raise RateLimitExceeded(model, delay) from e
+                time.sleep(delay)
+                attempt += 1
+
+    async def _acall(self, model: str, tokens: int, fn, prompt_bytes: int = 0, unbounded: bool = False):
+        limiter = get_limiter(model)
+        attempt = 0
+        t0 = time.perf_counter()
+        while True:
+            try:
+                async with limiter.aslot(tokens):
+                    res = await fn()
+                self._record(model, tokens, t0, attempt, res, prompt_bytes)
+                return res
+            except APIError as e:
+                if self._give_up(e, attempt, t0, unbounded):
+                    self._record(model, tokens, t0, attempt)
+                    raise
+                await asyncio.sleep(backoff_delay(attempt, e))
+                attempt += 1
+
+    def _embed_config(self, task: str, dim: Optional[int]) -> types.EmbedContentConfig:
+        return types.EmbedContentConfig(
+            task_type=task,
+            output_dimensionality=dim or self.emb_dim,
+        )
 
     # -----------------
     # Embeddings
     # -----------------
+    def _split_cached(self, texts: List[str], task: str, dim: int):
+        """
+        Returns (keys, cached vectors by key, {key: text} still to embed).
+        Duplicate texts within one call are embedded once.
+        """
+        keys = [cache_key(self.emb_model, task, dim, t) for t in texts]
+        found = self.cache.get_many(set(keys)) if self.cache is not None else {}
+        todo: dict = {}
+        for k, t in zip(keys, texts):
+            if k not in found and k not in todo:
+                todo[k] = t
+        return keys, found, todo
+
+    def _store(self, found: dict, todo: dict, vectors: list) -> None:
+        fresh = dict(zip(todo.keys(), vectors))
+        if self.cache is not None:
+            self.cache.put_many(fresh)
+        found.update(fresh)
+
     def embed(
         self,
         texts: List[str],
         task: str = "RETRIEVAL_DOCUMENT",  # or "RETRIEVAL_QUERY"
         dim: Optional[int] = None,
+        max_wait: Optional[float] = None,
     ) -> list[list[float]]:
         """
-        Embed a list of texts with batching and 429 backoff.
-        Returns a list of vectors aligned with `texts`.
+        Embed a list of texts with caching, batching and 429 backoff.
+        Returns a list of vectors aligned with `texts`. With `max_wait`,
+        raises RateLimitExceeded rather than wait longer than that.
         """
         if not texts:
             return []
 
-        output_dim = dim or self.emb_dim
-        cfg = types.EmbedContentConfig(
-            task_type=task,
-            output_dimensionality=output_dim,
-        )
+        dim = dim or self.emb_dim
+        keys, found, todo = self._split_cached(texts, task, dim)
+        if todo:
+            self._store(found, todo, self._embed_batches(list(todo.values()), task, dim, max_wait))
+        return [found[k] for k in keys]
 
+    def _embed_batches(self, texts: List[str], task: str, dim: int, max_wait: Optional[float] = None) -> list[list[float]]:
+        cfg = self._embed_config(task, dim)
+        # document embeddings build the index at startup: a free-tier 429 burst
+        # must slow that down, not fail it (see _give_up)
+        unbounded = task == "RETRIEVAL_DOCUMENT" and max_wait is None
         vectors: list[list[float]] = []
 
         for i in range(0, len(texts), self.batch_size):
             chunk = texts[i : i + self.batch_size]
+            # NOTE: google-genai supports batching by passing list[str] to `contents`
+            res = self._call(
+                self.emb_model,
+                sum(estimate_tokens(t) for t in chunk),
+                lambda: self.client.models.embed_content(model=self.emb_model, contents=chunk, config=cfg),
+                prompt_bytes=sum(len(t.encode("utf-8")) for t in chunk),
+                max_wait=max_wait,
+                unbounded=unbounded,
+            )
+            vectors.extend([e.values for e in res.embeddings])
 
-            # Retry loop for this batch only (handles free-tier 429s)
-            while True:
-                try:
-                    # NOTE: google-genai supports batching by passing list[str] to `contents`
-                    res = self.client.models.embed_content(
-                        model=self.emb_model,
-                        contents=chunk,
-                        config=cfg,
-                    )
-                    vectors.extend([e.values for e in res.embeddings])
-
-                    # Gentle throttle between batches if configured
-                    if self.per_batch_sleep:
-                        time.sleep(self.per_batch_sleep)
-                    break
-
-                except ClientError as e:
-                    # Handle free-tier rate limit
-                    is_429 = getattr(e, "status_code", None) == 429 or "RESOURCE_EXHAUSTED" in str(e)
-                    if is_429:
-                        # Sleep a little over a minute, then retry this same batch
-                        time.sleep(65)
-                        continue
-                    # Other errors: bubble up
-                    raise
+            # Gentle throttle between batches if configured
+            if self.per_batch_sleep and i + self.batch_size < len(texts):
+                time.sleep(self.per_batch_sleep)
 
         return vectors
 
+    async def aembed(
+        self,
+        texts: List[str],
+        task: str = "RETRIEVAL_DOCUMENT",
+        dim: Optional[int] = None,
+    ) -> list[list[float]]:
+        """
+        Async `embed`: batches run concurrently (bounded by the model's
+        in-flight cap) and backoff sleeps never block the event loop.
+        """
+        if not texts:
+            return []
+
+        dim = dim or self.emb_dim
+        keys, found, todo = self._split_cached(texts, task, dim)
+        if not todo:
+            return [found[k] for k in keys]
+
+        cfg = self._embed_config(task, dim)
+
+        async def _batch(chunk: List[str]):
+            res = await self._acall(
+                self.emb_model,
+                sum(estimate_tokens(t) for t in chunk),
+                lambda: self.client.aio.models.embed_content(model=self.emb_model, contents=chunk, config=cfg),
+                prompt_bytes=sum(len(t.encode("utf-8")) for t in chunk),
+                unbounded=task == "RETRIEVAL_DOCUMENT",
+            )
+            return [e.values for e in res.embeddings]
+
+        pending = list(todo.values())
+        batches = [pending[i : i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        results = await asyncio.gather(*[_batch(b) for b in batches])
+        self._store(found, todo, [v for batch in results for v in batch])
+        return [found[k] for k in keys]
+
     # -----------------
     # Generation
     # -----------------
@@ -99,8 +257,22 @@ class GeminiClient:
         """
         Simple text generation call with the flash model.
         """
-        res = self.client.models.generate_content(
-            model=self.gen_model,
-            contents=prompt,
+        res = self._call(
+            self.gen_model,
+            estimate_tokens(prompt),
+            lambda: self.client.models.generate_content(model=self.gen_model, contents=prompt),
+            prompt_bytes=len(prompt.encode("utf-8")),
+        )
+        return res.text or ""
+
+    async def agenerate(self, prompt: str) -> str:
+        """
+        Async `generate` via the SDK's aio client.
+        """
+        res = await self._acall(
+            self.gen_model,
+            estimate_tokens(prompt),
+            lambda: self.client.aio.models.generate_content(model=self.gen_model, contents=prompt),
+            prompt_bytes=len(prompt.encode("utf-8")),
         )
         return res.text or ""
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import random
+import re
+import threading
+import time
+import weakref
+from typing import Dict, Optional, Tuple
+
+from app.core import config
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 chars/token), good enough for TPM budgeting."""
+    return max(1, len(text or "") // 4)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `reserve()` takes tokens immediately (the level
+    may go negative) and returns how long the caller must wait before using
+    them, so concurrent callers queue fairly without holding the lock.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+            self.level -= amount
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def refund(self, amount: float):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self.level = min(self.capacity, self.level + min(float(amount), self.capacity))
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call would have to wait longer than the caller allows."""
+
+    def __init__(self, model: str, wait: float):
+        super().__init__(f"rate limit for {model}: would wait {wait:.1f}s")
+        self.model = model
+        self.wait = wait
+
+
+class ModelLimiter:
+    """
+    RPM + TPM buckets and an in-flight cap for one model. Usable from both
+    worker threads (`slot`) and coroutines (`aslot`).
+    """
+
+    def __init__(self, model: str, rpm: int, tpm: int, max_inflight: int):
+        self.model = model
+        self.rpm = TokenBucket(rpm)
+        self.tpm = TokenBucket(tpm)
+        self.max_inflight = max_inflight
+        self._sem = threading.BoundedSemaphore(max_inflight)
+        # asyncio primitives are bound to one loop; keep one per loop, dropped with it
+        self._asems: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _reserve(self, tokens: int, max_wait: Optional[float]) -> float:
+        wait = max(self.rpm.reserve(1), self.tpm.reserve(tokens))
+        if max_wait is not None and wait > max_wait:
+            self.rpm.refund(1)
+            self.tpm.refund(tokens)
+            raise RateLimitExceeded(self.model, wait)
+        return wait
+
+    @contextlib.contextmanager
+    def slot(self, tokens: int = 1, max_wait: Optional[float] = None):
+        wait = self._reserve(tokens, max_wait)
+        if wait:
+            time.sleep(wait)
+        with self._sem:
+            yield
+
+    @contextlib.asynccontextmanager
+    async def aslot(self, tokens: int = 1, max_wait: Optional[float] = None):
+        wait = self._reserve(tokens, max_wait)
+        if wait:
+            await asyncio.sleep(wait)
+        loop = asyncio.get_running_loop()
+        sem = self._asems.get(loop)
+        if sem is None:
+            sem = self._asems.setdefault(loop, asyncio.Semaphore(self.max_inflight))
+        async with sem:
+            yield
+
+
+def _parse_limits(spec: str) -> Dict[str, Tuple[int, int]]:
+    out: Dict[str, Tuple[int, int]] = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        model, _, lim = item.partition("=")
+        rpm, _, tpm = lim.partition(":")
+        out[model.strip()] = (int(rpm or 0), int(tpm or 0))
+    return out
+
+
+_LIMITERS: Dict[str, ModelLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_limiter(model: str) -> ModelLimiter:
+    """Shared limiter per model name (all GeminiClient instances share quota)."""
+    with _LIMITERS_LOCK:
+        lim = _LIMITERS.get(model)
+        if lim is None:
+            rpm, tpm = _parse_limits(config.GEMINI_RATE_LIMITS).get(model, (config.GEMINI_RPM, config.GEMINI_TPM))
+            lim = _LIMITERS[model] = ModelLimiter(model, rpm, tpm, config.GEMINI_MAX_INFLIGHT)
+        return lim
+
+
+# -----------------
+# Backoff helpers
+# -----------------
+_RETRY_DELAY = re.compile(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s")
+
+
+def retry_after(err: Exception) -> Optional[float]:
+    """
+    Seconds the server asked us to wait, from a Retry-After header or the
+    RetryInfo.retryDelay detail Gemini attaches to RESOURCE_EXHAUSTED errors.
+    """
+    resp = getattr(err, "response", None)
+    headers = getattr(resp, "headers", None) or {}
+    try:
+        val = headers.get("retry-after") or headers.get("Retry-After")
+        if val:
+            return float(val)
+    except (TypeError, ValueError, AttributeError):
+        pass
+    m = _RETRY_DELAY.search(str(getattr(err, "details", "") or err))
+    return float(m.group(1)) if m else None
+
+
+def is_retryable(err: Exception) -> bool:
+    code = getattr(err, "code", None) or getattr(err, "status_code", None)
+    return code in (429, 500, 503) or "RESOURCE_EXHAUSTED" in str(err) or "UNAVAILABLE" in str(err)
+
+
+def is_throttled(err: Exception) -> bool:
+    """Quota throttling (429 / RESOURCE_EXHAUSTED), as opposed to an outage (5xx)."""
+    code = getattr(err, "code", None) or getattr(err, "status_code", None)
+    return code == 429 or "RESOURCE_EXHAUSTED" in str(err)
+
+
+def backoff_delay(attempt: int, err: Optional[Exception] = None) -> float:
+    """Full-jitter exponential backoff, never shorter than a server retry hint."""
+    hinted = retry_after(err) if err is not None else None
+    expo = min(config.GEMINI_BACKOFF_MAX, config.GEMINI_BACKOFF_BASE * (2 ** attempt))
+    delay = random.uniform(0, expo)
+    if hinted is not None:
+        delay = hinted + random.uniform(0, config.GEMINI_BACKOFF_BASE)
+    return delay
@@ -1,6 +1,7 @@
 from __future__ import annotations
 import json, re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
+from app.keywords.extract_keywords import tokenize
 from app.llm.gemini_client import GeminiClient
 
 # PII regex heuristics
@@ -9,16 +10,18 @@ RE_PNR = re.compile(r"\b([A-Z0-9]{6,8})\b")
 RE_EMAIL = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
 RE_PHONE = re.compile(r"\+?\d[\d\s\-()]{8,}")
 
-def detect_pii(text: str) -> List[str]:
-    hits = []
-    if RE_CC.search(text): hits.append("credit_card_like_number")
-    if RE_EMAIL.search(text): hits.append("email_address")
-    if RE_PHONE.search(text): hits.append("phone_number_like")
-    for m in RE_PNR.findall(text):
-        if m.isupper() and any(ch.isdigit() for ch in m):
-            hits.append("booking_reference_like"); break
+def find_pii(text: str) -> List[Tuple[str, str]]:
+    """[(kind, matched text)] for every PII-like match, same rules as detect_pii."""
+    hits = [("credit_card_like_number", m.group(0)) for m in RE_CC.finditer(text)]
+    hits += [("email_address", m.group(0)) for m in RE_EMAIL.finditer(text)]
+    hits += [("phone_number_like", m.group(0)) for m in RE_PHONE.finditer(text)]
+    hits += [("booking_reference_like", m) for m in RE_PNR.findall(text)
+             if m.isupper() and any(ch.isdigit() for ch in m)]
     return hits
 
+def detect_pii(text: str) -> List[str]:
+    return list(dict.fromkeys(kind for kind, _ in find_pii(text)))
+
 def redact_pii(text: str) -> str:
     text = RE_CC.sub("[redacted_card]", text)
     text = RE_EMAIL.sub("[redacted_email]", text)
@@ -58,6 +61,63 @@ def _loose_json_parse(s: str):
             except Exception: return None
         return None
 
+RE_CITATION = re.compile(r"C(\d+)", re.IGNORECASE)
+# greeting / closing words that need no grounding
+_COURTESY = set(
+    "thank thanks hello dear reaching out contact help happy assist regards sincerely team indigo "
+    "please questions further any let know glad kind best customer support".split()
+)
+
+def parse_fused(raw: str):
+    """{"reply", "citations", "self_check"} from a fused draft response, or None."""
+    obj = _loose_json_parse(raw or "")
+    if not isinstance(obj, dict) or not isinstance(obj.get("reply"), str) or not obj["reply"].strip():
+        return None
+    obj["citations"] = [str(c) for c in obj.get("citations") or []]
+    obj["self_check"] = obj.get("self_check") if isinstance(obj.get("self_check"), dict) else {}
+    return obj
+
+def verify_grounding(draft: str, citations: List[str], self_check: Dict[str, Any],
+                     context: List[str], min_support: float = 0.6) -> Dict[str, Any]:
+    """
+    Local (no API) check of a fused draft. verdict:
+      - "fail":  PII in the draft, or the model's own self-check failed
+      - "pass":  self-check ok, citations point at retrieved chunks and at
+                 least `min_support` of the reply's content words occur in them
+      - "inconclusive": anything else (caller runs validate_with_gemini)
+    PII-like strings quoted verbatim from the cited chunks (e.g. the
+    policy's own service phone numbers) are not counted as PII.
+    """
+    cited = sorted({int(m) - 1 for c in citations for m in RE_CITATION.findall(c) if 0 < int(m) <= len(context)})
+    source_text = "\n".join(context[i] for i in cited)
+    pii = [kind for kind, m in find_pii(draft) if m.strip() not in source_text]
+    out: Dict[str, Any] = {"verdict": "inconclusive", "reason": "", "support": 0.0, "cited": cited,
+                           "pii_draft": list(dict.fromkeys(pii))}
+    if out["pii_draft"]:
+        out.update(verdict="fail", reason="PII found in draft")
+        return out
+    if self_check.get("grounded") is False or self_check.get("tone_ok") is False or self_check.get("contains_pii"):
+        out.update(verdict="fail", reason=str(self_check.get("notes") or "Self-check failed"))
+        return out
+    if not (self_check.get("grounded") and self_check.get("tone_ok")) or self_check.get("needs_escalation"):
+        out["reason"] = "Self-check incomplete or escalation suggested"
+        return out
+
+    if not cited:
+        out["reason"] = "No valid citations"
+        return out
+    words = {t for t in tokenize(draft) if t not in _COURTESY}
+    if not words:
+        out["reason"] = "No content to verify"
+        return out
+    source = set(tokenize(source_text))
+    out["support"] = round(len(words & source) / len(words), 3)
+    if out["support"] < min_support:
+        out["reason"] = f"Low citation support ({out['support']:.2f})"
+        return out
+    out.update(verdict="pass", reason=f"Grounded in cited chunks (support {out['support']:.2f})")
+    return out
+
 def validate_with_gemini(llm: GeminiClient, context: List[str], draft: str) -> Dict[str, Any]:
     prompt = _VALIDATOR_PROMPT.format(context="\n---\n".join(context), draft=draft)
     for _ in range(2):
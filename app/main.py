@@ -1,25 +1,47 @@
 from __future__ import annotations
 
-import asyncio, json, os, re
-from typing import Any, Dict, List
+import asyncio, functools, json, os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from rich import print as rprint
 
-from app.core import config
+from app.core import config, metrics
 from app.email import gmail_client
+from app.email.sync import MailboxSync
+from app.email import push
 from app.llm.gemini_client import GeminiClient
+from app.llm.embed_cache import EmbeddingCache
 from app.llm.validators import detect_pii
+from app.keywords.matcher import KeywordMatcher, split_words
 from app.graph import deps
+from app.graph.snapshot import Snapshot
+from app.core.log_retention import apply_retention, retention_cutoff
 from app.graph.build_graph import build_graph
+from app.retrieval.bm25 import BM25Index
+from app.retrieval.policy_index import build_policy_index
+from app.retrieval.vector_index import chunk_id, index_version, make_index, normalize_rows
 
 SERVICE = None
 LLM = None
 KEYWORDS = None
+MATCHER = None   # KeywordMatcher compiled from KEYWORDS
 INDEX = None
 LABEL_IDS = {}
 GRAPH = None  # compiled LangGraph app
+EXECUTOR = None  # bounded worker pool for blocking Gmail/Gemini I/O
+SYNC = None      # MailboxSync (incremental history or full scans)
+READY = asyncio.Event()          # set once poller() has initialised the runtime
+INGEST_QUEUE = None              # bounded asyncio.Queue of (message ID, prefetched message, matches)
+INFLIGHT: set = set()            # message IDs queued or being processed
+COMPLETED: set = set()           # handled IDs, confirmed to SYNC once their labels are flushed
+LAST_PUSH_HISTORY_ID = 0
+_PUSH_LOCK = None
+PUSH_TASKS: set = set()          # running _on_push tasks
+_RELOAD_LOCK = None              # serializes reloads (watcher + /reload)
 
 app = FastAPI(title="Email Agent (LangGraph + Gemini)")
 
@@ -29,59 +51,84 @@ def load_keywords():
     return json.loads(open(config.KEYWORDS_JSON, "r", encoding="utf-8").read())
 
 def re_split_words(s: str):
-    return re.sub(r"[^a-z0-9]+", " ", s).split()
-
-def subject_matches(subject: str, kw: dict) -> List[str]:
-    subject_norm = subject.lower()
-    matched = set()
-    for p in kw.get("phrases", []):
-        if len(p) >= 5 and p in subject_norm:
-            matched.add(p)
-    words = set(re_split_words(subject_norm))
-    for u in kw.get("unigrams", []):
-        if u in words:
-            matched.add(u)
-    return sorted(matched)
+    return split_words(s)
+
+_MATCHER_CACHE = (None, None)
+
+def subject_matches(subject: str, kw) -> List[str]:
+    """
+    Matched phrases/unigrams for `subject`. `kw` is a KeywordMatcher or a raw
+    keywords dict (compiled once and cached).
+    """
+    global _MATCHER_CACHE
+    if not isinstance(kw, KeywordMatcher):
+        src, matcher = _MATCHER_CACHE
+        if src is not kw:
+            matcher = KeywordMatcher(kw or {})
+            _MATCHER_CACHE = (kw, matcher)
+        kw = matcher
+    return kw.match(subject)
+
+def _executor() -> ThreadPoolExecutor:
+    global EXECUTOR
+    if EXECUTOR is None:
+        EXECUTOR = ThreadPoolExecutor(max_workers=config.MAX_CONCURRENCY, thread_name_prefix="agent-worker")
+    return EXECUTOR
+
+async def run_blocking(fn, *args, **kwargs):
+    """
+    Run a blocking call (Gmail/Gemini/graph) on the worker pool so the event
+    loop stays free for /health, /poll-now and other messages.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor(), functools.partial(fn, *args, **kwargs))
 
 def extract_text_body(msg) -> str:
     return gmail_client.extract_text_body(msg)
 
+def _finish_index(texts, embeds, parent_ids=None, parents=None, model=""):
+    # normalize once at load time; queries then only need a dot product
+    normed = normalize_rows(embeds)
+    ids = [chunk_id(t) for t in texts]
+    version = index_version(ids)
+    kw = {"m": config.HNSW_M, "ef": config.HNSW_EF} if config.INDEX_BACKEND == "hnsw" else {}
+    backend = make_index(config.INDEX_BACKEND, normed, mmap_path=config.INDEX_MMAP, version=f"{version}:{model}", **kw)
+    if backend.name == "mmap":
+        normed = backend.matrix  # keep only the mapped file, not a second in-RAM copy
+    return {
+        "texts": texts, "embeds": normed, "backend": backend, "ids": ids, "version": version,
+        "parent_ids": parent_ids or [], "parents": parents or {},
+        "bm25": BM25Index(texts),
+    }
+
 def build_index(llm: GeminiClient):
-    # Load or build a small NPZ index (already batched/backoff in client)
-    if os.path.exists(config.INDEX_NPZ) and os.path.exists(config.INDEX_CHUNKS):
-        import numpy as np
-        data = json.loads(open(config.INDEX_CHUNKS, "r", encoding="utf-8").read())
-        arr = np.load(config.INDEX_NPZ)
-        return {"texts": data["texts"], "embeds": arr["embeds"]}
-
-    import numpy as np, re as _re, math
-    md = open(config.POLICY_MD, "r", encoding="utf-8").read()
-    texts = [_c.strip() for _c in _re.split(r"\n(?=#+\s)|\n{2,}", md) if _c.strip()]
-
-    max_items = 95
-    if len(texts) > max_items:
-        group = (len(texts) + max_items - 1) // max_items
-        texts = ["\n\n".join(texts[i:i+group]) for i in range(0, len(texts), group)]
-
-    embeds = llm.embed(texts, task="RETRIEVAL_DOCUMENT", dim=768)
-    np.savez(config.INDEX_NPZ, embeds=np.array(embeds))
-    json.dump({"texts": texts}, open(config.INDEX_CHUNKS, "w", encoding="utf-8"), indent=2)
-    return {"texts": texts, "embeds": np.array(embeds)}
-
-async def process_message_with_graph(msg: Dict[str, Any]):
+    """
+    Load the policy index, re-embedding only chunks whose content hash is new
+    (see app.retrieval.policy_index / chunker).
+    """
+    built = build_policy_index(
+        llm, config.POLICY_MD, config.INDEX_NPZ, config.INDEX_CHUNKS, dim=768,
+        max_tokens=config.CHUNK_MAX_TOKENS, overlap=config.CHUNK_OVERLAP_TOKENS,
+    )
+    return _finish_index(built["texts"], built["embeds"], built.get("parent_ids"), built.get("parents"),
+                         built.get("model", ""))
+
+# headers the subject gate (and SKIP logging) needs from a metadata-only fetch
+GATE_HEADERS = ["Subject", "From", "Message-ID"]
+
+async def gate_message(msg: Dict[str, Any]) -> List[str]:
+    """
+    Subject keyword gate. Works on metadata-only or full messages.
+    Returns matched keywords; on no match logs the SKIP and labels the message.
+    """
     headers = gmail_client.headers_map(msg)
     subject = headers.get("Subject", "(no subject)")
-    from_addr = headers.get("From", "")
-    body_text = extract_text_body(msg) or ""
-    email_text = f"{subject}\n{body_text}"
-
-    # 1) subject keyword gate
-    matches = subject_matches(subject, KEYWORDS)
+    matches = subject_matches(subject, MATCHER or KEYWORDS)
     if not matches:
         reason = "No policy keyword match in subject"
         deps.log_event({
             "message_id": msg["id"],
-            "from_addr": from_addr,
+            "from_addr": headers.get("From", ""),
             "subject": subject,
             "decision": "SKIP" if not config.ESCALATE_ON_NOMATCH else "ESCALATE",
             "reason": reason,
@@ -89,11 +136,25 @@ async def process_message_with_graph(msg: Dict[str, Any]):
         })
         # prevent loops: remove IN+UNREAD, mark scanned or escalate
         if config.ESCALATE_ON_NOMATCH:
-            deps.escalate(msg["id"])
+            await run_blocking(deps.escalate, msg["id"])
         else:
-            deps.mark_scanned(msg["id"])
+            await run_blocking(deps.mark_scanned, msg["id"])
+    return matches
+
+async def process_message_with_graph(msg: Dict[str, Any], matches: Optional[List[str]] = None):
+    headers = gmail_client.headers_map(msg)
+    subject = headers.get("Subject", "(no subject)")
+    from_addr = headers.get("From", "")
+
+    # 1) subject keyword gate (skipped when triage already matched the subject)
+    if matches is None:
+        matches = await gate_message(msg)
+    if not matches:
         return
 
+    body_text = extract_text_body(msg) or ""
+    email_text = f"{subject}\n{body_text}"
+
     # 2) detect PII in incoming request (we'll redact in reply and escalate after reply)
     pii_req = detect_pii(email_text)
 
@@ -106,8 +167,9 @@ async def process_message_with_graph(msg: Dict[str, Any]):
         "matched_keywords": matches,
         "rewrite_count": 0,
         "pii_in_request": pii_req,  # list or []
+        "index_version": deps.current_index_version(),  # pin this run to the current snapshot
     }
-    GRAPH.invoke(state)
+    await run_blocking(GRAPH.invoke, state)
 
 def _build_query() -> str:
     base = f"label:{config.LABEL_IN} is:unread"
@@ -117,49 +179,369 @@ def _build_query() -> str:
     return " ".join(q.split())
 
 
-async def _poll_once():
+def _sync() -> MailboxSync:
+    global SYNC
+    if SYNC is None:
+        mode = config.SYNC_MODE
+        if mode == "history" and config.GMAIL_QUERY:
+            # history.list can't apply arbitrary search terms
+            rprint("[yellow]GMAIL_QUERY is set; using full sync (history sync can't apply query filters)[/]")
+            mode = "full"
+        SYNC = MailboxSync(config.SYNC_STATE, mode=mode, full_every=config.SYNC_FULL_EVERY,
+                           max_attempts=config.SYNC_MAX_TRIES)
+    return SYNC
+
+async def process_message_id(mid: str, full: Optional[Dict[str, Any]] = None,
+                             matches: Optional[List[str]] = None):
+    """
+    Fetch (unless `full` was prefetched) + process one message, unless it's
+    already queued/in flight or awaiting a label flush (push and the
+    safety-net poll can both report the same ID).
+    """
+    if mid in INFLIGHT or deps.LABELS.is_pending(mid):
+        return
+    INFLIGHT.add(mid)
+    try:
+        if full is None:
+            full = await run_blocking(lambda: gmail_client.get_message(deps.gmail_service(), mid))
+        headers = gmail_client.headers_map(full)
+        subj = headers.get("Subject", "(no subject)")
+        rprint(f" • [white]{subj}[/]")
+        await process_message_with_graph(full, matches)
+        COMPLETED.add(mid)
+    except Exception as e:
+        # one bad message must not cancel the rest of the batch
+        deps.log_event({"event": "ERROR", "message_id": mid, "detail": str(e)})
+        rprint(f"[red]ERROR:[/] {mid}: {e}")
+    finally:
+        INFLIGHT.discard(mid)
+
+async def fetch_messages(ids: List[str], **kwargs) -> Dict[str, Dict[str, Any]]:
+    """
+    Batch-fetch messages (one BatchHttpRequest per GMAIL_BATCH_SIZE IDs, chunks
+    fetched concurrently). IDs that fail in the batch are simply left out;
+    process_message_id fetches those singly.
+    """
+    size = config.GMAIL_BATCH_SIZE
+    chunks = [ids[i:i + size] for i in range(0, len(ids), size)]
+    results = await asyncio.gather(*[
+        run_blocking(lambda c=c: gmail_client.batch_get_messages(deps.gmail_service(), c, batch_size=size, **kwargs))
+        for c in chunks
+    ])
+    out: Dict[str, Dict[str, Any]] = {}
+    for got, _failed in results:
+        out.update(got)
+    return out
+
+async def flush_labels():
+    # only IDs completed before the flush starts are known to have their labels applied
+    done = list(COMPLETED)
+    try:
+        calls = await run_blocking(deps.flush_labels)
+        if calls:
+            rprint(f"[dim]Flushed label changes in {calls} batchModify call(s)[/]")
+    except Exception as e:
+        deps.log_event({"event": "ERROR", "detail": f"label flush: {e}"})
+        rprint(f"[red]ERROR:[/] label flush: {e}")
+        return
+    COMPLETED.difference_update(done)
+    if done:
+        await run_blocking(_sync().done, done)
+
+async def _fetch_candidates(scheduled: bool = False) -> List[Dict[str, Any]]:
     query = _build_query()
     rprint(f"[dim]Polling with query:[/] {query}")
-    msgs = gmail_client.list_messages(SERVICE, q=query)
+    label_in = LABEL_IDS.get(config.LABEL_IN, config.LABEL_IN)
+    # handled-but-unflushed IDs are still in flight as far as SYNC is concerned
+    inflight = INFLIGHT | COMPLETED
+    return await run_blocking(lambda: _sync().candidates(deps.gmail_service(), query, label_in,
+                                                         scheduled=scheduled, inflight=inflight))
+
+def _handled(msg: Dict[str, Any]) -> bool:
+    """Already read, or already carries one of our outcome labels."""
+    labels = set(msg.get("labelIds") or [])
+    if "labelIds" in msg and "UNREAD" not in labels:
+        return True
+    done = {LABEL_IDS.get(n, n) for n in (config.LABEL_OUT, config.LABEL_REVIEW, config.LABEL_SCANNED)}
+    return bool(labels & done)
+
+Gated = Dict[str, Optional[List[str]]]
+Triaged = Dict[str, Tuple[Optional[Dict[str, Any]], Optional[List[str]]]]
+
+async def triage(ids: List[str]) -> Gated:
+    """
+    Phase 1 of the two-phase fetch: pull only GATE_HEADERS (format=metadata)
+    and run the subject gate, so non-policy mail (most of it, often with large
+    HTML/attachments) never has its MIME body downloaded. Returns {id:
+    matched keywords, or None if the gate couldn't run on metadata} for the
+    messages to process; fetch_full() then streams their full payloads.
+    """
+    metas = await fetch_messages(ids, format="metadata", metadata_headers=GATE_HEADERS)
+    sem = asyncio.Semaphore(config.MAX_CONCURRENCY)
+    async def _gate(mid) -> Tuple[bool, Optional[List[str]]]:
+        meta = metas.get(mid)
+        if meta is None:
+            return True, None  # metadata fetch failed: let the full path decide
+        if _handled(meta):
+            COMPLETED.add(mid)  # a re-offered retry that finished after all
+            return False, None
+        try:
+            async with sem:
+                matches = await gate_message(meta)
+        except Exception as e:
+            # one bad message must not cancel the rest of the poll; it stays
+            # pending in SYNC and is retried
+            deps.log_event({"event": "ERROR", "message_id": mid, "detail": f"gate: {e}"})
+            rprint(f"[red]ERROR:[/] {mid}: gate: {e}")
+            return False, None
+        if not matches:
+            COMPLETED.add(mid)
+        return bool(matches), matches
+
+    gated = dict(zip(ids, await asyncio.gather(*[_gate(mid) for mid in ids])))
+    matched = [mid for mid in ids if gated[mid][0]]
+    if len(ids) - len(matched):
+        rprint(f"[dim]Skipped {len(ids) - len(matched)} message(s) on metadata[/]")
+    return {mid: gated[mid][1] for mid in matched}
+
+async def fetch_full(ids: List[str]) -> AsyncIterator[Dict[str, Optional[Dict[str, Any]]]]:
+    """
+    Phase 2: full payloads, one GMAIL_BATCH_SIZE chunk at a time ({id: message
+    or None if its fetch failed}). The next chunk is fetched while the caller
+    works on the current one, so at most two chunks of MIME bodies are held
+    in memory however many messages matched.
+    """
+    size = config.GMAIL_BATCH_SIZE
+    chunks = [ids[i:i + size] for i in range(0, len(ids), size)]
+    nxt = asyncio.ensure_future(fetch_messages(chunks[0])) if chunks else None
+    try:
+        for i, chunk in enumerate(chunks):
+            got = await nxt
+            nxt = asyncio.ensure_future(fetch_messages(chunks[i + 1])) if i + 1 < len(chunks) else None
+            yield {mid: got.get(mid) for mid in chunk}
+    finally:
+        if nxt is not None:
+            nxt.cancel()
+
+async def _poll_once(scheduled: bool = False):
+    # only the poller's own ticks advance the SYNC_FULL_EVERY cadence
+    msgs = await _fetch_candidates(scheduled)
     if not msgs:
         return
     rprint(f"[bold cyan]Found {len(msgs)} candidate message(s)[/bold cyan]")
 
-    # process in parallel (bounded)
-    sem = asyncio.Semaphore(config.MAX_CONCURRENCY)
-    async def _run(m):
-        async with sem:
-            full = gmail_client.get_message(SERVICE, m["id"])
-            headers = gmail_client.headers_map(full)
-            subj = headers.get("Subject", "(no subject)")
-            rprint(f" • [white]{subj}[/]")
-            await process_message_with_graph(full)
+    ids = [m["id"] for m in msgs if m["id"] not in INFLIGHT and not deps.LABELS.is_pending(m["id"])]
+    try:
+        gated = await triage(ids)
+
+        # process in parallel (bounded); blocking I/O runs on the worker pool
+        sem = asyncio.Semaphore(config.MAX_CONCURRENCY)
+        async def _run(mid, full):
+            async with sem:
+                await process_message_id(mid, full, gated[mid])
+
+        async for fulls in fetch_full(list(gated)):
+            await asyncio.gather(*[ _run(mid, full) for mid, full in fulls.items() ])
+    finally:
+        await flush_labels()
+
+# -----------------------
+# Push ingestion
+# -----------------------
+async def _ingest_worker():
+    while True:
+        mid, full, matches = await INGEST_QUEUE.get()
+        try:
+            INFLIGHT.discard(mid)  # claimed by _on_push; process_message_id re-claims
+            await process_message_id(mid, full, matches)
+        finally:
+            INGEST_QUEUE.task_done()
+        if INGEST_QUEUE.empty():
+            await flush_labels()
+
+async def _on_push(history_id: int):
+    gated: Gated = {}
+    queued = set()
+    try:
+        # serialize history reads so two notifications don't race on historyId;
+        # matched IDs are claimed before the lock is released
+        async with _PUSH_LOCK:
+            msgs = await _fetch_candidates()
+            ids = [m["id"] for m in msgs if m["id"] not in INFLIGHT and not deps.LABELS.is_pending(m["id"])]
+            gated = await triage(ids) if ids else {}
+            INFLIGHT.update(gated)
+        # backpressure: the queue is bounded, so further chunks are fetched
+        # only as the workers drain it
+        async for fulls in fetch_full(list(gated)):
+            for mid, full in fulls.items():
+                await INGEST_QUEUE.put((mid, full, gated[mid]))
+                queued.add(mid)
+        if queued:
+            rprint(f"[bold cyan]Push {history_id}: queued {len(queued)} message(s)[/bold cyan]")
+    except Exception as e:
+        deps.log_event({"event": "ERROR", "detail": f"push {history_id}: {e}"})
+        rprint(f"[red]ERROR:[/] push {history_id}: {e}")
+    finally:
+        # release claims that never reached the queue; the next read re-offers them
+        INFLIGHT.difference_update(set(gated) - queued)
+        # SKIPs decided during triage never reach the ingest workers
+        await flush_labels()
+
+async def _renew_watch():
+    label_in = LABEL_IDS.get(config.LABEL_IN, config.LABEL_IN)
+    while True:
+        try:
+            resp = await run_blocking(
+                lambda: gmail_client.watch(deps.gmail_service(), config.GMAIL_PUBSUB_TOPIC, label_ids=[label_in])
+            )
+            rprint(f"[green]Gmail watch active[/green] historyId={resp.get('historyId')} expiration={resp.get('expiration')}")
+        except Exception as e:
+            deps.log_event({"event": "ERROR", "detail": f"watch: {e}"})
+            rprint(f"[red]ERROR:[/] watch: {e}")
+        await asyncio.sleep(config.WATCH_RENEW_SECONDS)
+
+def _source_stamp() -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for path in (config.POLICY_MD, config.KEYWORDS_JSON):
+        try:
+            st = os.stat(path)
+            out[path] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            out[path] = None
+    return out
+
+def load_runtime(llm: GeminiClient) -> Snapshot:
+    """
+    Build keywords, matcher and policy index off to the side (blocking).
+    The index rebuild is incremental, so an edited policy only re-embeds
+    the chunks that changed.
+    """
+    stamp = _source_stamp()
+    keywords = load_keywords()
+    return Snapshot(keywords=keywords, matcher=KeywordMatcher(keywords), index=build_index(llm), stamp=stamp)
+
+def install_runtime(snap: Snapshot):
+    global KEYWORDS, MATCHER, INDEX
+    deps.install_snapshot(snap)
+    KEYWORDS, MATCHER, INDEX = snap.keywords, snap.matcher, snap.index
+
+async def reload_runtime(reason: str = "manual") -> Dict[str, Any]:
+    """
+    Rebuild on the worker pool, then swap. On failure the current snapshot
+    stays in place.
+    """
+    global _RELOAD_LOCK
+    if _RELOAD_LOCK is None:
+        _RELOAD_LOCK = asyncio.Lock()
+    async with _RELOAD_LOCK:
+        old = deps.SNAPSHOTS.current()
+        snap = await run_blocking(load_runtime, LLM)
+        install_runtime(snap)
+    changed = old is None or old.version != snap.version or old.keywords != snap.keywords
+    rprint(f"[green]Reloaded[/green] ({reason}): index {snap.version}, {len(snap.index['texts'])} chunks" + ("" if changed else " (no change)"))
+    return {
+        "ok": True,
+        "reason": reason,
+        "index_version": snap.version,
+        "previous_version": old.version if old is not None else None,
+        "chunks": len(snap.index["texts"]),
+        "changed": changed,
+    }
 
-    await asyncio.gather(*[ _run(m) for m in msgs ])
+async def watch_sources():
+    """Poll POLICY_MD / KEYWORDS_JSON mtimes; reload when either changes."""
+    seen = None  # last stamp acted on (snapshots are immutable; a failed reload leaves the old one)
+    while True:
+        await asyncio.sleep(config.RELOAD_WATCH_INTERVAL)
+        snap = deps.SNAPSHOTS.current()
+        if snap is None:
+            continue
+        stamp = _source_stamp()
+        if stamp in (snap.stamp, seen):
+            continue
+        seen = stamp  # don't retry the same broken files every tick
+        try:
+            await reload_runtime("file change")
+        except Exception as e:
+            deps.log_event({"event": "ERROR", "detail": f"reload: {e}"})
+            rprint(f"[red]ERROR:[/] reload: {e}")
 
 async def poller():
-    global SERVICE, LLM, KEYWORDS, INDEX, LABEL_IDS, GRAPH
-    SERVICE = gmail_client.build_service()
-    LLM = GeminiClient(api_key=config.GEMINI_API_KEY, per_batch_sleep=1.0)
-    KEYWORDS = load_keywords()
-    INDEX = build_index(LLM)
+    global SERVICE, LLM, LABEL_IDS, GRAPH, INGEST_QUEUE, _PUSH_LOCK
+    creds = gmail_client._creds()
+    SERVICE = gmail_client.build_service(creds)
+    LLM = GeminiClient(
+        api_key=config.GEMINI_API_KEY,
+        per_batch_sleep=1.0,
+        cache=EmbeddingCache(config.EMBED_CACHE_SIZE, config.EMBED_CACHE_DB, config.EMBED_CACHE_ROWS, config.EMBED_CACHE_TTL),
+    )
+    snap = load_runtime(LLM)
     LABEL_IDS = gmail_client.ensure_labels(SERVICE, [config.LABEL_IN, config.LABEL_OUT, config.LABEL_REVIEW, config.LABEL_SCANNED])
 
-    deps.set_runtime(SERVICE, LLM, LABEL_IDS, INDEX)
+    deps.set_runtime(SERVICE, LLM, LABEL_IDS, None, service_factory=gmail_client.service_factory(creds))
+    install_runtime(snap)
     GRAPH = build_graph()
 
-    rprint(f"[green]Poller started. Interval:[/green] {config.POLL_INTERVAL}")
+    interval = config.POLL_INTERVAL
+    background = []
+    if config.RELOAD_WATCH_INTERVAL > 0:
+        background.append(asyncio.create_task(watch_sources()))
+    if config.PUSH_ENABLED:
+        INGEST_QUEUE = asyncio.Queue(maxsize=max(1, config.PUSH_QUEUE_SIZE))
+        _PUSH_LOCK = asyncio.Lock()
+        background += [asyncio.create_task(_ingest_worker()) for _ in range(config.MAX_CONCURRENCY)]
+        if config.GMAIL_PUBSUB_TOPIC:
+            background.append(asyncio.create_task(_renew_watch()))
+        # push delivers new mail; polling stays on as a low-frequency safety net
+        interval = max(config.POLL_INTERVAL, config.PUSH_POLL_INTERVAL)
+    READY.set()
+
+    rprint(f"[green]Poller started. Interval:[/green] {interval}" + (" (push enabled)" if config.PUSH_ENABLED else ""))
+    try:
+        while True:
+            try:
+                await _poll_once(scheduled=True)
+            except Exception as e:
+                deps.log_event({"event": "ERROR", "detail": str(e)})
+                rprint(f"[red]ERROR:[/] {e}")
+            await asyncio.sleep(interval)
+    finally:
+        for t in background:
+            t.cancel()
+
+def run_log_maintenance():
+    """
+    Compact closed segments to Parquet (before they can expire), then apply
+    LOG_RETENTION_DAYS. Blocking; run on the worker pool.
+    """
+    deps.flush_logs(timeout=5.0)
+    store = deps.log_store()
+    if config.LOG_COMPACT:
+        try:
+            from app.core.log_compact import ParquetLogs
+            n = ParquetLogs(config.LOG_PARQUET_DIR).compact(store)
+            if n:
+                rprint(f"[dim]Compacted {n} log segment(s) to Parquet[/]")
+        except ImportError as e:
+            rprint(f"[yellow]Skipping log compaction:[/] {e}")
+    if config.LOG_RETENTION_DAYS > 0:
+        removed, _ = apply_retention(store, retention_cutoff(config.LOG_RETENTION_DAYS),
+                                     config.LOG_RETENTION_BACKUP_DIR or None, config.LOG_PARQUET_DIR)
+        if removed:
+            rprint(f"[dim]Retention removed {removed} event(s) older than {config.LOG_RETENTION_DAYS} day(s)[/]")
+
+async def log_maintenance():
     while True:
         try:
-            await _poll_once()
+            await run_blocking(run_log_maintenance)
         except Exception as e:
-            deps.log_event({"event": "ERROR", "detail": str(e)})
-            rprint(f"[red]ERROR:[/] {e}")
-        await asyncio.sleep(config.POLL_INTERVAL)
+            rprint(f"[red]ERROR:[/] log maintenance: {e}")
+        await asyncio.sleep(config.LOG_MAINTENANCE_INTERVAL)
 
 @app.on_event("startup")
 async def on_start():
     app.state.poller_task = asyncio.create_task(poller())
+    app.state.maintenance_task = asyncio.create_task(log_maintenance()) if config.LOG_MAINTENANCE_INTERVAL > 0 else None
 
 @app.on_event("shutdown")
 async def on_shutdown():
@@ -169,6 +551,11 @@ async def on_shutdown():
             await app.state.poller_task
         except asyncio.CancelledError:
             pass
+    if getattr(app.state, "maintenance_task", None):
+        app.state.maintenance_task.cancel()
+    if EXECUTOR is not None:
+        EXECUTOR.shutdown(wait=False, cancel_futures=True)
+    deps.close_logs()
 
 class Health(BaseModel):
     status: str
@@ -196,19 +583,158 @@ async def poll_now():
     await _poll_once()
     return {"ok": True}
 
+@app.get("/stats")
+def stats():
+    cache = getattr(LLM, "cache", None)
+    return {
+        "embed_cache": cache.stats() if cache is not None else None,
+        "reply_cache": deps.REPLY_CACHE.stats(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Prometheus text format: per-node latency histograms (+ p50/p95/p99),
+    Gemini/Gmail call counts, retries, tokens and bytes.
+    """
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/gmail/push")
+async def gmail_push(request: Request, token: str = ""):
+    """
+    Pub/Sub push endpoint for Gmail watch notifications. Acks immediately;
+    the history read and message processing happen in the background.
+    """
+    global LAST_PUSH_HISTORY_ID
+    if not config.PUSH_ENABLED:
+        raise HTTPException(status_code=404, detail="push ingestion disabled")
+    if config.PUSH_TOKEN and token != config.PUSH_TOKEN:
+        raise HTTPException(status_code=403, detail="bad token")
+    if not READY.is_set():
+        # non-2xx makes Pub/Sub redeliver once we're up
+        raise HTTPException(status_code=503, detail="agent starting")
+    try:
+        _, history_id = push.decode_notification(await request.json())
+    except ValueError as e:
+        # ack malformed messages so Pub/Sub doesn't retry them forever
+        rprint(f"[yellow]Ignoring push:[/] {e}")
+        return {"ok": False, "detail": str(e)}
+    if history_id <= LAST_PUSH_HISTORY_ID:
+        return {"ok": True, "duplicate": True}
+    LAST_PUSH_HISTORY_ID = history_id
+    task = asyncio.create_task(_on_push(history_id))
+    # the loop holds tasks weakly: keep a reference until it finishes
+    PUSH_TASKS.add(task)
+    task.add_done_callback(PUSH_TASKS.discard)
+    return {"ok": True}
+
+@app.post("/reload")
+async def reload():
+    """
+    Rebuild keywords, matcher and policy index and swap them in atomically.
+    In-flight messages finish on the snapshot they started with.
+    """
+    if not READY.is_set():
+        raise HTTPException(status_code=503, detail="agent starting")
+    try:
+        return await reload_runtime("api")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"reload failed: {e}")
+
 @app.get("/keywords")
 def get_keywords():
     return KEYWORDS or {}
 
 @app.get("/logs")
-def get_logs():
-    path = config.LOGS_PATH
-    if not os.path.exists(path): return []
-    out = []
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            try:
-                out.append(json.loads(line))
-            except:
-                continue
-    return out[-500:]
+def get_logs(limit: int = 500, since: Optional[float] = None):
+    """
+    Last `limit` events (default 500), or the first `limit` events newer
+    than `since` (unix ts); page forward with the last event's ts.
+    Reads backwards / via the segment index, so cost doesn't grow with history.
+    """
+    deps.flush_logs(timeout=2.0)
+    store = deps.log_store()
+    limit = max(1, min(limit, 10000))
+    if since is not None:
+        return store.since(since, limit=limit)
+    return store.tail(limit)
+
+def _sse(event: dict) -> str:
+    # the event's ts doubles as its SSE id, so Last-Event-ID resumes via LogStore.since
+    return f"id: {event.get('ts')!r}\nevent: log\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+def _event_key(event: dict):
+    # events logged before event_id existed fall back to their content
+    return event.get("event_id") or (event.get("ts"), event.get("message_id"), event.get("decision"), event.get("event"))
+
+REPLAY_PAGE = 1000
+REPLAY_SLACK = 1.0  # seconds: writers may append slightly out of ts order
+
+@app.get("/logs/stream")
+async def stream_logs(request: Request, decision: Optional[str] = None,
+                      message_id: Optional[str] = None, since: Optional[float] = None):
+    """
+    Server-sent events, pushed as `deps.log_event` emits them.
+    `decision` (comma-separated) and `message_id` filter the stream. To resume,
+    pass `since` (unix ts) or reconnect with a Last-Event-ID header: missed events
+    are replayed from the log store first.
+    """
+    if since is None and request.headers.get("last-event-id"):
+        try:
+            since = float(request.headers["last-event-id"])
+        except ValueError:
+            pass
+    decisions = [d.strip() for d in decision.split(",") if d.strip()] if decision else None
+    # subscribe before replaying so nothing falls between the two
+    sub = deps.BUS.subscribe(config.LOG_STREAM_QUEUE, decisions, message_id)
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            # keys of replayed events, so live copies of them are not sent twice
+            sent: Dict[Any, float] = {}
+            if since is not None:
+                await run_blocking(deps.flush_logs, 2.0)
+                cursor = since
+                while True:
+                    # page forward until caught up; each page re-reads REPLAY_SLACK
+                    # seconds so late-appended events aren't skipped
+                    page = await run_blocking(deps.log_store().since, cursor, REPLAY_PAGE)
+                    new = [ev for ev in page if _event_key(ev) not in sent]
+                    for ev in new:
+                        sent[_event_key(ev)] = float(ev.get("ts") or 0.0)
+                        if sub.wants(ev):
+                            yield _sse(ev)
+                    if len(page) < REPLAY_PAGE:
+                        break
+                    last = float(page[-1].get("ts") or cursor)
+                    nxt = last - REPLAY_SLACK if new else last
+                    if nxt <= cursor:
+                        nxt = last
+                    if nxt <= cursor:
+                        break
+                    cursor = nxt
+                # only the tail can still show up live
+                if sent:
+                    horizon = max(sent.values()) - REPLAY_SLACK
+                    sent = {k: t for k, t in sent.items() if t >= horizon}
+            dropped = 0
+            while True:
+                try:
+                    ev = await asyncio.wait_for(sub.queue.get(), timeout=config.LOG_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                if sent and sent.pop(_event_key(ev), None) is not None:
+                    continue  # already sent by the replay
+                if sub.dropped != dropped:
+                    yield f"event: dropped\ndata: {sub.dropped - dropped}\n\n"
+                    dropped = sub.dropped
+                yield _sse(ev)
+        finally:
+            deps.BUS.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.keywords.extract_keywords import tokenize
+from app.retrieval.vector_index import top_k
+
+
+class BM25Index:
+    """
+    Okapi BM25 over an inverted index. Per-posting term weights are
+    precomputed at build time, so a query is one vectorized add per query
+    term (no per-document loop). Local only: no API calls.
+    """
+
+    def __init__(self, texts: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.n = len(texts)
+        docs = [Counter(tokenize(t)) for t in texts]
+        lengths = np.asarray([sum(d.values()) for d in docs], dtype=np.float32)
+        avgdl = float(lengths.mean()) if self.n else 0.0
+        norm = k1 * (1.0 - b + b * lengths / (avgdl or 1.0))
+
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for i, d in enumerate(docs):
+            for term, tf in d.items():
+                postings.setdefault(term, []).append((i, tf))
+
+        # term -> (doc ids, idf * saturated tf)
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, plist in postings.items():
+            ids = np.fromiter((i for i, _ in plist), dtype=np.int64, count=len(plist))
+            tf = np.fromiter((t for _, t in plist), dtype=np.float32, count=len(plist))
+            idf = math.log(1.0 + (self.n - len(plist) + 0.5) / (len(plist) + 0.5))
+            self.postings[term] = (ids, (idf * tf * (k1 + 1.0) / (tf + norm[ids])).astype(np.float32))
+
+    def __len__(self) -> int:
+        return self.n
+
+    def scores(self, query: str) -> np.ndarray:
+        out = np.zeros(self.n, dtype=np.float32)
+        for term in set(tokenize(query)):
+            hit = self.postings.get(term)
+            if hit is not None:
+                np.add.at(out, hit[0], hit[1])
+        return out
+
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(row ids, scores) of the top-k documents with a non-zero score."""
+        s = self.scores(query)
+        ids = top_k(s, k)
+        ids = ids[s[ids] > 0]
+        return ids, s[ids]
+
+    def containing(self, terms: Iterable[str]) -> Dict[int, int]:
+        """
+        {row: number of `terms` it contains}. Multi-word terms match when
+        every word is in the chunk.
+        """
+        hits: Counter = Counter()
+        for term in terms:
+            toks = tokenize(term)
+            if not toks:
+                continue
+            rows: Optional[set] = None
+            for t in toks:
+                p = self.postings.get(t)
+                found = set(p[0].tolist()) if p is not None else set()
+                rows = found if rows is None else rows & found
+                if not rows:
+                    break
+            for r in rows or ():
+                hits[r] += 1
+        return dict(hits)
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[int]],
+    weights: Optional[Sequence[float]] = None,
+    k: int = 60,
+    boost: Optional[Dict[int, float]] = None,
+) -> List[int]:
+    """
+    Fuse ranked id lists: score(d) = sum_i w_i / (k + rank_i(d)) + boost(d).
+    Rank-based, so dense cosines and BM25 scores need no calibration.
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[int, float] = {}
+    for w, ranking in zip(weights, rankings):
+        for rank, doc in enumerate(ranking):
+            fused[int(doc)] = fused.get(int(doc), 0.0) + w / (k + rank + 1)
+    for doc, extra in (boost or {}).items():
+        if doc in fused:
+            fused[doc] += extra
+    return sorted(fused, key=lambda d: -fused[d])
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Tuple
+
+from app.llm.rate_limit import estimate_tokens
+from app.retrieval.vector_index import chunk_id
+
+RE_HEADING = re.compile(r"^(#{1,6})\s+(.*\S)\s*$")
+# "1. How can I change my booking?" / "Q: ..." / a bare line ending in "?"
+RE_QUESTION = re.compile(r"^\s*(?:\d+[.)]\s+\S.*|Q[:.]\s*\S.*|[A-Z][^\n]{8,}\?)\s*$")
+RE_SENTENCE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"(])|\n+")
+
+
+class Chunk:
+    """A retrieval unit: compact child text plus the id of its parent section."""
+
+    __slots__ = ("text", "parent_id", "heading")
+
+    def __init__(self, text: str, parent_id: str, heading: str):
+        self.text = text
+        self.parent_id = parent_id
+        self.heading = heading
+
+    def __repr__(self) -> str:
+        return f"Chunk({self.heading!r}, {self.text[:40]!r})"
+
+
+def _sections(md: str) -> List[Tuple[List[Tuple[int, str]], List[str]]]:
+    """[(heading path as (level, title), body lines)] in document order."""
+    out: List[Tuple[List[Tuple[int, str]], List[str]]] = []
+    path: List[Tuple[int, str]] = []
+    body: List[str] = []
+    for line in md.replace("\r\n", "\n").split("\n"):
+        m = RE_HEADING.match(line)
+        if m:
+            if any(b.strip() for b in body):
+                out.append((path, body))
+            body = []
+            level = len(m.group(1))
+            path = [(lvl, t) for lvl, t in path if lvl < level] + [(level, m.group(2))]
+        else:
+            body.append(line)
+    if any(b.strip() for b in body):
+        out.append((path, body))
+    return out
+
+
+def _units(lines: List[str]) -> List[str]:
+    """
+    Split a section body at Q/A boundaries: each question line starts a new
+    unit that runs until the next question. Before the first question,
+    blank lines separate paragraphs.
+    """
+    units: List[List[str]] = []
+    cur: List[str] = []
+    in_qa = False
+    for line in lines:
+        if RE_QUESTION.match(line) and not line.startswith(("\t", "  ")):
+            if cur:
+                units.append(cur)
+            cur, in_qa = [line], True
+        elif not line.strip():
+            if cur and not in_qa:
+                units.append(cur)
+                cur = []
+            elif cur:
+                cur.append(line)
+        else:
+            cur.append(line)
+    if cur:
+        units.append(cur)
+    return [u for u in ("\n".join(x).strip() for x in units) if u]
+
+
+def _windows(text: str, max_tokens: int, overlap: int) -> List[str]:
+    """
+    Token-bounded windows over sentences (bullets count as sentences), with
+    `overlap` tokens of trailing context repeated at the start of the next.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+    sents: List[str] = []
+    for s in RE_SENTENCE.split(text):
+        s = s.strip()
+        if not s:
+            continue
+        if estimate_tokens(s) > max_tokens:
+            # single over-long sentence: hard split on words
+            words, piece = s.split(), []
+            for w in words:
+                if piece and estimate_tokens(" ".join(piece + [w])) > max_tokens:
+                    sents.append(" ".join(piece))
+                    piece = []
+                piece.append(w)
+            if piece:
+                sents.append(" ".join(piece))
+        else:
+            sents.append(s)
+
+    out: List[str] = []
+    cur: List[str] = []
+    for s in sents:
+        if cur and estimate_tokens("\n".join(cur + [s])) > max_tokens:
+            out.append("\n".join(cur))
+            tail: List[str] = []
+            for prev in reversed(cur):
+                if estimate_tokens("\n".join([prev] + tail)) > overlap:
+                    break
+                tail.insert(0, prev)
+            cur = tail if estimate_tokens("\n".join(tail + [s])) <= max_tokens else []
+        cur.append(s)
+    if cur:
+        out.append("\n".join(cur))
+    return out
+
+
+def chunk_markdown(md: str, max_tokens: int = 200, overlap: int = 40) -> Tuple[List[Chunk], Dict[str, str]]:
+    """
+    Structure-aware chunking of the policy markdown:
+      - sections follow the heading hierarchy (parents)
+      - inside a section, each Q/A pair (or preamble paragraph) is a unit
+      - units longer than `max_tokens` become overlapping sentence windows
+    Child texts are prefixed with their heading path so they embed (and
+    read) in context; the prefix counts against `max_tokens` (down to half
+    of it for very long headings). Returns (children, {parent_id: section text}).
+    """
+    children: List[Chunk] = []
+    parents: Dict[str, str] = {}
+    for path, lines in _sections(md):
+        heading = " > ".join(t for _, t in path)
+        section = "\n".join(lines).strip()
+        parent_text = f"{'#' * path[-1][0]} {path[-1][1]}\n{section}" if path else section
+        pid = chunk_id(parent_text)
+        parents[pid] = parent_text
+        # +1: the newline, and len//4 rounding on the joined text
+        budget = max(max_tokens - estimate_tokens(heading) - 1, max_tokens // 2) if heading else max_tokens
+        for unit in _units(lines):
+            for win in _windows(unit, budget, min(overlap, budget // 2)):
+                text = f"{heading}\n{win}" if heading else win
+                children.append(Chunk(text, pid, heading))
+    return children, parents
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+import numpy as np
+from rich import print as rprint
+
+from app.retrieval.chunker import chunk_markdown
+from app.retrieval.vector_index import chunk_id
+
+def _sha(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def load_manifest(chunks_path: str, npz_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Saved index: {"texts", "ids", "parent_ids", "parents", "embeds", "model",
+    "dim", "chunking", "policy_sha"}. Manifests written before ids were stored
+    get them derived from the texts.
+    """
+    if not (os.path.exists(chunks_path) and os.path.exists(npz_path)):
+        return None
+    with open(chunks_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    embeds = np.load(npz_path)["embeds"]
+    texts = data.get("texts") or []
+    if len(texts) != len(embeds):
+        return None  # half-written / mismatched pair: treat as no index
+    data["ids"] = data.get("ids") or [chunk_id(t) for t in texts]
+    data["embeds"] = embeds
+    return data
+
+
+def save_manifest(chunks_path: str, npz_path: str, manifest: Dict[str, Any], embeds: np.ndarray):
+    """Writes both files via temp + rename; the NPZ goes first so the JSON never points past it."""
+    os.makedirs(os.path.dirname(os.path.abspath(npz_path)), exist_ok=True)
+    tmp = npz_path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, embeds=embeds)
+    os.replace(tmp, npz_path)
+    tmp = chunks_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, chunks_path)
+
+
+def build_policy_index(
+    llm,
+    policy_path: str,
+    npz_path: str,
+    chunks_path: str,
+    dim: int = 768,
+    max_tokens: int = 200,
+    overlap: int = 40,
+) -> Dict[str, Any]:
+    """
+    Incremental rebuild. Chunks are keyed by content hash: unchanged chunks
+    keep their saved embeddings, only new/edited ones are embedded, removed
+    ones are dropped. Cost is O(changed chunks) in embedding calls; an
+    unchanged policy file (with the same chunking settings) is loaded
+    without chunking or embedding anything.
+
+    Returns {"texts", "ids", "parent_ids", "parents", "embeds" (raw),
+    "stats": {"reused", "embedded", "dropped"}}.
+    """
+    with open(policy_path, "rb") as f:
+        raw = f.read()
+    policy_sha = _sha(raw)
+    model = getattr(llm, "emb_model", "")
+    chunking = {"max_tokens": max_tokens, "overlap": overlap}
+    old = load_manifest(chunks_path, npz_path)
+    if old is not None and (old.get("model", model) != model or int(old.get("dim", dim)) != dim):
+        rprint(f"[yellow]Embedding model/dim changed ({old.get('model')}/{old.get('dim')}); re-embedding policy[/]")
+        old = None
+
+    if old is not None and old.get("policy_sha") == policy_sha and old.get("chunking") == chunking and "parents" in old:
+        n = len(old["texts"])
+        old["stats"] = {"reused": n, "embedded": 0, "dropped": 0}
+        return old
+
+    # line endings don't change a chunk's identity
+    children, parents = chunk_markdown(raw.decode("utf-8").replace("\r\n", "\n"), max_tokens, overlap)
+    texts = [c.text for c in children]
+    ids = [chunk_id(t) for t in texts]
+    known: Dict[str, np.ndarray] = {}
+    if old is not None:
+        known = {cid: old["embeds"][i] for i, cid in enumerate(old["ids"])}
+
+    todo: Dict[str, str] = {}
+    for cid, t in zip(ids, texts):
+        if cid not in known and cid not in todo:
+            todo[cid] = t
+    if todo:
+        # GeminiClient.embed batches (100 per request), so chunk count is unbounded
+        fresh = llm.embed(list(todo.values()), task="RETRIEVAL_DOCUMENT", dim=dim)
+        known.update(zip(todo.keys(), (np.asarray(v, dtype=np.float32) for v in fresh)))
+
+    embeds = np.asarray([known[cid] for cid in ids], dtype=np.float32).reshape(len(ids), dim)
+    stats = {
+        "reused": sum(1 for cid in set(ids) if cid not in todo),
+        "embedded": len(todo),
+        "dropped": len(set(old["ids"]) - set(ids)) if old is not None else 0,
+    }
+    manifest = {
+        "texts": texts,
+        "ids": ids,
+        "parent_ids": [c.parent_id for c in children],
+        "parents": parents,
+        "model": model,
+        "dim": dim,
+        "chunking": chunking,
+        "policy_sha": policy_sha,
+    }
+    save_manifest(chunks_path, npz_path, manifest, embeds)
+    rprint(f"[cyan]Policy index:[/] {len(ids)} chunks in {len(parents)} sections ({stats['embedded']} embedded, "
+           f"{stats['reused']} reused, {stats['dropped']} dropped)")
+    manifest["embeds"] = embeds
+    manifest["stats"] = stats
+    return manifest
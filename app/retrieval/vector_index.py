@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+def normalize_rows(mat) -> np.ndarray:
+    """L2-normalize rows once, as contiguous float32 (cosine == dot product)."""
+    arr = np.ascontiguousarray(mat, dtype=np.float32)
+    if arr.ndim == 1:
+        return arr / (np.linalg.norm(arr) + 1e-9)
+    return arr / (np.linalg.norm(arr, axis=1, keepdims=True) + 1e-9)
+
+
+def chunk_id(text: str) -> str:
+    """Stable content hash of a chunk (survives re-ordering and rebuilds)."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def index_version(ids: List[str]) -> str:
+    """Fingerprint of an index's chunk set; changes whenever any chunk does."""
+    return hashlib.sha1("\n".join(ids).encode("utf-8")).hexdigest()[:12]
+
+
+def top_k(sims: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first (argpartition, not a full sort)."""
+    n = sims.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < n:
+        part = np.argpartition(-sims, k - 1)[:k]
+    else:
+        part = np.arange(n)
+    return part[np.argsort(-sims[part])]
+
+
+class VectorIndex(ABC):
+    """
+    Nearest-neighbour search over L2-normalized vectors.
+    `search` takes a normalized query and returns (row ids, cosine scores).
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @abstractmethod
+    def search(self, q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        ...
+
+
+class BruteForceIndex(VectorIndex):
+    """Exact search: one mat-vec product + argpartition. Fine up to ~1e5 rows."""
+
+    name = "numpy"
+
+    def __init__(self, normed: np.ndarray):
+        self.matrix = normed
+
+    def __len__(self) -> int:
+        return int(self.matrix.shape[0])
+
+    def search(self, q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        sims = self.matrix @ q
+        ids = top_k(sims, k)
+        return ids, sims[ids]
+
+
+class MemmapIndex(BruteForceIndex):
+    """
+    Exact search over a memory-mapped .npy on disk, so large indexes are paged
+    in by the OS instead of being held in (per-process) RAM.
+
+    With `version`, the file is only rewritten when its `<path>.version`
+    sidecar (or its shape) differs, so restarts with an unchanged index
+    reuse the file already on disk.
+    """
+
+    name = "mmap"
+
+    def __init__(self, path: str, normed: Optional[np.ndarray] = None, version: Optional[str] = None):
+        if normed is not None and not (version and self._current(path, version, normed.shape)):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # write-then-rename: an older index may still be mapping the previous file
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, normed)
+            os.replace(tmp, path)
+            if version:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(version)
+                os.replace(tmp, path + ".version")
+        super().__init__(np.load(path, mmap_mode="r"))
+        self.path = path
+
+    @staticmethod
+    def _current(path: str, version: str, shape) -> bool:
+        try:
+            with open(path + ".version", "r", encoding="utf-8") as f:
+                if f.read().strip() != version:
+                    return False
+            return np.load(path, mmap_mode="r").shape == tuple(shape)
+        except (OSError, ValueError):
+            return False
+
+
+class HNSWIndex(VectorIndex):
+    """
+    Approximate search with hnswlib (optional dependency: `pip install hnswlib`).
+    """
+
+    name = "hnsw"
+
+    def __init__(self, normed: np.ndarray, m: int = 16, ef_construction: int = 200, ef: int = 64):
+        try:
+            import hnswlib
+        except ImportError as e:
+            raise ImportError("INDEX_BACKEND=hnsw requires hnswlib: pip install hnswlib") from e
+        n, dim = normed.shape
+        self._n = n
+        self.index = hnswlib.Index(space="ip", dim=dim)
+        self.index.init_index(max_elements=max(1, n), M=m, ef_construction=ef_construction)
+        if n:
+            self.index.add_items(normed, np.arange(n))
+        self.index.set_ef(max(ef, 1))
+
+    def __len__(self) -> int:
+        return self._n
+
+    def search(self, q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(k, self._n)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        labels, dists = self.index.knn_query(q, k=k)
+        # hnswlib "ip" distance is 1 - dot
+        return labels[0].astype(np.int64), 1.0 - dists[0]
+
+
+def make_index(backend: str, normed: np.ndarray, mmap_path: Optional[str] = None,
+               version: Optional[str] = None, **kw) -> VectorIndex:
+    """
+    Build the configured backend ("numpy" | "mmap" | "hnsw") over normalized
+    vectors. `version` identifies the vectors (mmap: skip rewriting an
+    up-to-date file).
+    """
+    backend = (backend or "numpy").lower()
+    if backend == "numpy":
+        return BruteForceIndex(normed)
+    if backend == "mmap":
+        if not mmap_path:
+            raise ValueError("mmap backend needs a file path")
+        return MemmapIndex(mmap_path, normed, version=version)
+    if backend == "hnsw":
+        return HNSWIndex(normed, **kw)
+    raise ValueError(f"unknown INDEX_BACKEND: {backend}")
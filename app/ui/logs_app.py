@@ -126,16 +126,27 @@
 
 
 
-import os, json, time, html, shutil, tempfile
-from datetime import datetime, date, timedelta
+import os, sys, json, time, html
+from datetime import datetime, timedelta, timezone
 import pandas as pd
 import streamlit as st
 
+# `streamlit run app/ui/logs_app.py` puts app/ui on sys.path, not the repo root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from app.core.log_store import LogStore
+from app.core.log_compact import ParquetLogs
+from app.core.log_retention import apply_retention
+
 # -------------------- PAGE / SETTINGS --------------------
 st.set_page_config(page_title="Agent Logs", layout="wide")
 LOGS_PATH  = os.getenv("LOGS_PATH", "./data/logs.jsonl")
 BACKUP_DIR = os.getenv("LOGS_BACKUP_DIR", "./data/backups")
+SEGMENT_DIR = os.getenv("LOG_SEGMENT_DIR", "./data/log_segments")
+UI_MAX_EVENTS = int(os.getenv("LOGS_UI_MAX_EVENTS", "50000"))  # newest events loaded into the dashboard
 TABLE_LIMIT = 10  # show only the most recent 10 monitoring logs
+STORE = LogStore(LOGS_PATH, SEGMENT_DIR)
+PARQUET = ParquetLogs(os.getenv("LOG_PARQUET_DIR", "./data/log_parquet"))
+HISTORY_COLUMNS = ["ts","message_id","from_addr","subject","decision","reason","matched_keywords"]
 
 # -------------------- THEME (Clean Light, High Contrast) --------------------
 st.markdown("""
@@ -233,6 +244,7 @@ section[data-testid="stSidebar"] > div {
 .thread h4 { margin:0 0 6px 0; font-size: 15px; }
 .caption { color: var(--muted); font-size: 12px; }
 .hr { height:1px; background: var(--line); border:0; margin:10px 0; }
+pre.code { background:#f8fafc; border:1px solid var(--line); border-radius:8px; padding:8px; white-space:pre-wrap; font-size:12px; }
 
 /* Inputs */
 .stTextInput input, .stDateInput input {
@@ -258,11 +270,23 @@ with st.sidebar:
     )
     st.markdown("</div>", unsafe_allow_html=True)
 
+    st.markdown("<div class='sidebar-card'><div class='sidebar-title'>History</div>", unsafe_allow_html=True)
+    history = st.toggle("Historical view (compacted Parquet)", value=False,
+                        help="Query compacted segments (python -m app.core.log_compact) by date range")
+    # Parquet partitions are UTC dates (app.core.log_compact._day); so is every date here
+    today = datetime.now(timezone.utc).date()
+    hist_range = st.date_input(
+        "Date range (UTC)",
+        value=(today - timedelta(days=30), today),
+        disabled=not history,
+    )
+    st.markdown("</div>", unsafe_allow_html=True)
+
     st.markdown("<div class='sidebar-card'><div class='sidebar-title'>Maintenance</div>", unsafe_allow_html=True)
     cutoff_date = st.date_input(
-        "Delete entries before",
-        value=date.today() - timedelta(days=7),
-        help="Entries on/after this date are kept."
+        "Delete entries before (UTC)",
+        value=today - timedelta(days=7),
+        help="Entries on/after this date (00:00 UTC) are kept."
     )
     confirm_phrase = st.text_input("Type DELETE to confirm", value="")
     do_backup = st.checkbox("Backup to /data/backups", value=True)
@@ -270,21 +294,97 @@ with st.sidebar:
     st.markdown("</div>", unsafe_allow_html=True)
 
 # -------------------- HELPERS --------------------
-def ensure_dirs():
-    os.makedirs(os.path.dirname(LOGS_PATH), exist_ok=True)
-    if do_backup:
-        os.makedirs(BACKUP_DIR, exist_ok=True)
+def read_new_lines(path, offset, end=None):
+    """
+    Parse complete lines in [offset, end) of `path`.
+    Returns (rows, new offset); a trailing partial line is left for next time.
+    """
+    rows = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read() if end is None else f.read(max(0, end - offset))
+    cut = data.rfind(b"\n") + 1
+    for line in data[:cut].splitlines():
+        try:
+            rows.append(json.loads(line))
+        except Exception:
+            pass
+    return rows, offset + cut
 
 def read_logs():
-    if not os.path.exists(LOGS_PATH): return []
-    rows=[]
-    with open(LOGS_PATH,"r",encoding="utf-8") as f:
-        for line in f:
-            try:
-                rows.append(json.loads(line))
-            except Exception:
-                pass
-    return rows
+    """
+    Initial load: the active file plus the newest rotated segments, capped at
+    UI_MAX_EVENTS. Returns (rows, follow state for follow_logs).
+    """
+    try:
+        stt = os.stat(LOGS_PATH)
+    except FileNotFoundError:
+        return STORE.tail(UI_MAX_EVENTS, include_active=False), {"ino": None, "offset": 0}
+    active, offset = read_new_lines(LOGS_PATH, 0, stt.st_size)
+    active = active[-UI_MAX_EVENTS:]
+    older = STORE.tail(UI_MAX_EVENTS - len(active), include_active=False)
+    return older + active, {"ino": stt.st_ino, "offset": offset}
+
+def follow_logs(follow):
+    """
+    Rows appended since the last refresh, handling rotation (finish the old
+    inode inside its segment, then start the new active file at 0).
+    Returns (rows, follow state) or (None, None) when a full reload is needed.
+    """
+    try:
+        stt = os.stat(LOGS_PATH)
+    except FileNotFoundError:
+        stt = None
+    rows = []
+    if follow["ino"] is not None and (stt is None or stt.st_ino != follow["ino"]):
+        rotated = STORE.find_segment_by_inode(follow["ino"])
+        if rotated is None:
+            return None, None  # file was replaced (e.g. retention rewrite)
+        rows, _ = read_new_lines(rotated, follow["offset"])
+        follow = {"ino": None, "offset": 0}
+    if stt is None:
+        return rows, follow
+    if follow["ino"] is None:
+        follow = {"ino": stt.st_ino, "offset": 0}
+    if stt.st_size < follow["offset"]:
+        return None, None  # truncated in place
+    if stt.st_size > follow["offset"]:
+        new, off = read_new_lines(LOGS_PATH, follow["offset"], stt.st_size)
+        rows += new
+        follow = {"ino": stt.st_ino, "offset": off}
+    return rows, follow
+
+def load_df():
+    """
+    Cached DataFrame in st.session_state, extended with only the newly
+    appended lines on each refresh instead of re-reading the whole log.
+    """
+    ss = st.session_state
+    if "log_df" in ss:
+        rows, follow = follow_logs(ss["log_follow"])
+        if rows is not None:
+            ss["log_follow"] = follow
+            if rows:
+                new = to_df(rows)
+                df = pd.concat([ss["log_df"], new], ignore_index=True) if not ss["log_df"].empty else new
+                ss["log_df"] = df.iloc[-UI_MAX_EVENTS:].reset_index(drop=True)
+            return ss["log_df"]
+    rows, follow = read_logs()
+    ss["log_df"], ss["log_follow"] = to_df(rows), follow
+    return ss["log_df"]
+
+def reset_df():
+    for k in ("log_df", "log_follow"):
+        st.session_state.pop(k, None)
+
+TEXT_COLS = ["from_addr","subject","decision","reason","message_id"]
+
+def add_search_col(df):
+    """Lowercased subject/from/reason computed once per row (not per keystroke)."""
+    df["_search"] = (
+        df["subject"].astype(str) + "\x1f" + df["from_addr"].astype(str) + "\x1f" + df["reason"].astype(str)
+    ).str.lower()
+    return df
 
 def to_df(rows):
     if not rows: return pd.DataFrame()
@@ -293,11 +393,10 @@ def to_df(rows):
         df["ts"] = pd.to_datetime(df["ts"], unit="s", errors="coerce")
     else:
         df["ts"] = pd.NaT
-    for c in ["from_addr","subject","decision","reason","message_id"]:
+    for c in TEXT_COLS:
         if c not in df: df[c] = ""
-    df[["from_addr","subject","decision","reason","message_id"]] = \
-        df[["from_addr","subject","decision","reason","message_id"]].fillna("")
-    return df
+    df[TEXT_COLS] = df[TEXT_COLS].fillna("")
+    return add_search_col(df)
 
 def decorate_badge(dec):
     dec = html.escape(str(dec or ""))
@@ -308,128 +407,122 @@ def filtered(df, decisions, search):
     if decisions:
         df = df[df["decision"].isin(decisions)]
     if search:
-        s = search.lower()
-        df = df[
-            df["subject"].fillna("").str.lower().str.contains(s)
-            | df["from_addr"].fillna("").str.lower().str.contains(s)
-            | df["reason"].fillna("").str.lower().str.contains(s)
-        ]
+        df = df[df["_search"].str.contains(search.lower(), regex=False)]
     return df
 
-def render_kpis(df):
-    total   = len(df)
-    replied = int((df["decision"]=="REPLY").sum())
-    skipped = int((df["decision"]=="SKIP").sum())
-    escal   = int((df["decision"]=="ESCALATE").sum())
+def decision_counts(df):
+    if df.empty: return {}
+    return {str(k): int(v) for k, v in df["decision"].value_counts().items()}
+
+def render_kpis(counts):
+    total   = sum(counts.values())
+    replied = counts.get("REPLY", 0)
+    skipped = counts.get("SKIP", 0)
+    escal   = counts.get("ESCALATE", 0)
     st.markdown("<div class='kpi-grid'>", unsafe_allow_html=True)
     for label, val in [("Total", total), ("Replied", replied), ("Skipped", skipped), ("Escalated", escal)]:
         st.markdown(f"<div class='kpi'><small>{label}</small><h1>{val}</h1></div>", unsafe_allow_html=True)
     st.markdown("</div>", unsafe_allow_html=True)
 
-def render_table(df):
-    if df.empty:
-        st.info("No logs match your filters yet.")
-        return
-    # Sort newest first, then take only the most recent N
-    dfv = df[["ts","from_addr","subject","decision","reason"]].sort_values("ts", ascending=False).copy()
-    dfv = dfv.fillna("").head(TABLE_LIMIT)
+def _esc(col):
+    return col.fillna("").astype(str).map(html.escape)
 
-    for col in ["from_addr","subject","reason"]:
-        dfv[col] = dfv[col].astype(str).map(html.escape)
-    dfv["decision"] = dfv["decision"].astype(str).map(lambda x: f"<span class='badge badge-{html.escape(x)}'>{html.escape(x)}</span>")
+def _badges(col):
+    d = _esc(col)
+    return "<span class='badge badge-" + d + "'>" + d + "</span>"
 
+def _when(col):
+    return col.astype(str).where(col.notna(), "")
+
+def table_html(df):
+    """Newest TABLE_LIMIT rows as one HTML table, built with column-wise string ops."""
+    top = df.nlargest(TABLE_LIMIT, "ts") if df["ts"].notna().any() else df.tail(TABLE_LIMIT).iloc[::-1]
+    cells = (
+        "<tr><td>" + _when(top["ts"]) + "</td><td>" + _esc(top["from_addr"]) + "</td><td>"
+        + _esc(top["subject"]) + "</td><td>" + _badges(top["decision"]) + "</td><td>" + _esc(top["reason"]) + "</td></tr>"
+    )
     headers = "<tr>" + "".join(f"<th>{h}</th>" for h in ["Time","From","Subject","Decision","Reason"]) + "</tr>"
-    rows = []
-    for _, r in dfv.iterrows():
-        cells = {
-            "ts": r["ts"] if pd.notna(r["ts"]) else "",
-            "from_addr": r["from_addr"],
-            "subject": r["subject"],
-            "decision": r["decision"],
-            "reason": r["reason"],
-        }
-        rows.append("<tr>" + "".join(
-            f"<td>{cells[c]}</td>" for c in ["ts","from_addr","subject","decision","reason"]
-        ) + "</tr>")
-    st.markdown("<div class='table-wrap card'><table class='table'>" + headers + "".join(rows) + "</table></div>", unsafe_allow_html=True)
+    return "<div class='table-wrap card'><table class='table'>" + headers + "".join(cells) + "</table></div>"
+
+def _previews(col, limit=None):
+    def one(v):
+        if isinstance(v, str) and v:
+            v = [v]
+        if not isinstance(v, (list, tuple)):
+            return ""
+        return "".join(f"<pre class='code'>{html.escape(str(c))}</pre>" for c in list(v)[:limit])
+    return col.map(one) if col is not None else ""
+
+def threads_html(df, n=10):
+    """
+    HTML for the last `n` threads. One groupby over only the rows of those
+    threads (instead of re-filtering the frame per thread); per-row HTML is
+    built column-wise.
+    """
+    ids = df["message_id"]
+    ids = ids[ids != ""]
+    if ids.empty:
+        return []
+    last = pd.unique(ids)[-n:][::-1]
+    sub = df[df["message_id"].isin(last)].sort_values("ts", kind="stable")
+    ctx = sub["context_preview"] if "context_preview" in sub else None
+    draft = sub["draft_preview"] if "draft_preview" in sub else None
+    reason = _esc(sub["reason"])
+    rows = (
+        "<p><b>" + _when(sub["ts"]) + " — " + _esc(sub["decision"]) + "</b></p>"
+        + reason.where(reason == "", "<p>" + reason + "</p>")
+        + _previews(ctx, 2) + _previews(draft)
+    )
+    body = rows.groupby(sub["message_id"], sort=False).agg("".join)
+    heads = sub.groupby("message_id", sort=False).tail(1).set_index("message_id")
+    out = []
+    for mid in last:
+        head = heads.loc[mid]
+        out.append(
+            f"<div class='thread'><h4>{html.escape(str(head['subject'] or '(no subject)'))} {decorate_badge(head['decision'])}</h4>"
+            f"<div class='caption'>From: {html.escape(str(head['from_addr']))} • ID: {html.escape(str(mid))}</div>"
+            f"<div class='hr'></div>{body.loc[mid]}</div>"
+        )
+    return out
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def render_cache(_df, version, decisions, search):
+    """
+    Filtered view + rendered HTML, memoized on (log offset/version, filters):
+    a refresh with no new events and unchanged filters does no pandas work.
+    """
+    dfv = filtered(_df, list(decisions), search)
+    if dfv.empty:
+        return None, []
+    return table_html(dfv), threads_html(dfv)
+
+def render_table(table):
+    if table is None:
+        st.info("No logs match your filters yet.")
+        return
+    st.markdown(table, unsafe_allow_html=True)
     st.caption(f"Showing the most recent {TABLE_LIMIT} events.")
 
-def render_timeline(df):
-    if df.empty or "message_id" not in df: return
+def render_timeline(threads):
     st.subheader("Recent Threads (last 10)")
-    mids = list(df["message_id"].fillna("").replace("", pd.NA).dropna().unique())
-    if not mids:
+    if not threads:
         st.caption("No message threads to display.")
         return
-    for mid in mids[-10:][::-1]:
-        chunk = df[df["message_id"]==mid].sort_values("ts")
-        if chunk.empty:
-            continue
-        head  = chunk.iloc[-1]
-        title = html.escape(str(head.get("subject","(no subject)")))
-        dec   = str(head.get("decision",""))
-        st.markdown(f"<div class='thread'><h4>{title} {decorate_badge(dec)}</h4>", unsafe_allow_html=True)
-        st.markdown(f"<div class='caption'>From: {html.escape(str(head.get('from_addr','')))} • ID: {html.escape(str(mid))}</div>", unsafe_allow_html=True)
-        st.markdown("<div class='hr'></div>", unsafe_allow_html=True)
-        for _,row in chunk.iterrows():
-            when = row['ts'] if pd.notna(row['ts']) else ""
-            d    = html.escape(str(row.get('decision','')))
-            st.markdown(f"**{when} — {d}**")
-            if row.get("reason"): st.write(str(row["reason"]))
-            if isinstance(row.get("context_preview"), list):
-                for c in row["context_preview"][:2]:
-                    st.code(c, language="text")
-            if row.get("draft_preview"):
-                st.code(row["draft_preview"], language="markdown")
-        st.markdown("</div>", unsafe_allow_html=True)
-
-def safe_write_lines(lines):
-    """Atomic rewrite with optional backup."""
-    ensure_dirs()
-    dirpath = os.path.dirname(LOGS_PATH) or "."
-    fd, tmp_path = tempfile.mkstemp(prefix="logs_", suffix=".jsonl", dir=dirpath, text=True)
-    try:
-        with os.fdopen(fd, "w", encoding="utf-8") as tmp:
-            for line in lines:
-                tmp.write(line.rstrip("\n") + "\n")
-        if do_backup and os.path.exists(LOGS_PATH):
-            os.makedirs(BACKUP_DIR, exist_ok=True)
-            stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = os.path.join(BACKUP_DIR, f"logs_backup_{stamp}.jsonl")
-            shutil.copy2(LOGS_PATH, backup_file)
-        shutil.move(tmp_path, LOGS_PATH)
-        return True, None
-    except Exception as e:
-        try: os.remove(tmp_path)
-        except Exception: pass
-        return False, str(e)
+    st.markdown("".join(threads), unsafe_allow_html=True)
 
 def delete_before(cutoff_dt: datetime):
-    if not os.path.exists(LOGS_PATH):
+    """
+    Streaming retention (same code path as the API server's scheduled job):
+    drops whole expired segments and rewrites the rest line by line under the
+    writer lock, so it never holds the log in memory or races the appender.
+    """
+    if not os.path.exists(LOGS_PATH) and not STORE.segments():
         return 0, 0, "No log file found."
-    removed, kept = 0, 0
-    new_lines = []
-    with open(LOGS_PATH, "r", encoding="utf-8") as f:
-        for raw in f:
-            line = raw.rstrip("\n")
-            try:
-                obj = json.loads(line)
-                ts = obj.get("ts", None)
-                if ts is None:
-                    kept += 1; new_lines.append(line)
-                else:
-                    ts_dt = pd.to_datetime(ts, unit="s", errors="coerce")
-                    if pd.isna(ts_dt):
-                        kept += 1; new_lines.append(line)
-                    else:
-                        if ts_dt.to_pydatetime() < cutoff_dt:
-                            removed += 1
-                        else:
-                            kept += 1; new_lines.append(line)
-            except Exception:
-                kept += 1; new_lines.append(line)
-    ok, err = safe_write_lines(new_lines)
-    if not ok: return removed, kept, f"Write failed: {err}"
+    try:
+        removed, kept = apply_retention(STORE, cutoff_dt.timestamp(), BACKUP_DIR if do_backup else None,
+                                        PARQUET.out_dir)
+    except Exception as e:
+        return 0, 0, f"Write failed: {e}"
     return removed, kept, None
 
 # -------------------- MAIN --------------------
@@ -439,30 +532,54 @@ def main():
         if confirm_phrase.strip().upper() != "DELETE":
             st.error("Please type DELETE to confirm.")
         else:
-            cut = datetime.combine(cutoff_date, datetime.min.time())
+            cut = datetime.combine(cutoff_date, datetime.min.time(), tzinfo=timezone.utc)
             removed, kept, err = delete_before(cut)
             if err: st.error(f"Deletion error: {err}")
             else:   st.success(f"Deleted {removed} old log(s). Kept {kept}.")
-
-    rows = read_logs()
-    df   = to_df(rows)
+            reset_df()
+
+    if history:
+        rng = list(hist_range) if isinstance(hist_range, (list, tuple)) else [hist_range]
+        start, end = rng[0], rng[-1]  # a half-picked range has one date
+        try:
+            # date partitions + decision filter are pushed down into the Parquet scan
+            counts = PARQUET.decision_counts(start, end)
+            df = PARQUET.query(start, end, decisions=decisions, columns=HISTORY_COLUMNS)
+        except ImportError as e:
+            st.error(str(e))
+            return
+        for c in TEXT_COLS:
+            if c not in df: df[c] = ""
+            df[c] = df[c].fillna("")
+        if not df.empty:
+            add_search_col(df)
+        # the decision filter already shaped `df` (pushed down), so it must key the cache
+        # len(df): retention prunes Parquet rows without moving the watermark
+        version = ("history", str(start), str(end), tuple(decisions), PARQUET.watermark(), len(df))
+        mark = PARQUET.watermark()
+        st.caption(f"Historical view {start} → {end} UTC (compacted up to {datetime.fromtimestamp(mark, tz=timezone.utc):%Y-%m-%d %H:%M:%S} UTC)." if mark else f"Historical view {start} → {end} UTC (compacted up to n/a).")
+    else:
+        df = load_df()
+        counts = decision_counts(df)
+        follow = st.session_state.get("log_follow") or {}
+        version = ("live", follow.get("ino"), follow.get("offset"), len(df))
 
     # KPIs
-    render_kpis(df)
+    render_kpis(counts)
 
     # Table (limited to recent 10)
     st.markdown("<div class='card'>", unsafe_allow_html=True)
-    dfv = filtered(df, decisions, search)
-    render_table(dfv)
+    table, threads = render_cache(df, version, tuple(decisions) if not history else (), search)
+    render_table(table)
     st.markdown("</div>", unsafe_allow_html=True)
 
     # Timeline (already shows last 10 threads)
     st.markdown("<div class='card'>", unsafe_allow_html=True)
-    render_timeline(dfv)
+    render_timeline(threads)
     st.markdown("</div>", unsafe_allow_html=True)
 
     # Auto-refresh
-    if auto:
+    if auto and not history:
         time.sleep(5)
         st.rerun()
 
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import pytest
+
+from app.llm.rate_limit import estimate_tokens
+from app.retrieval.chunker import chunk_markdown
+
+LONG_ANSWER = " ".join(f"Sentence number {i} explains one more detail of the refund rules." for i in range(60))
+MD = f"""# Swiss Airlines Customer Service Policy
+## Refunds and Cancellations Within Twenty Four Hours
+Q: How do refunds work?
+{LONG_ANSWER}
+Q: Short one?
+Yes.
+"""
+
+
+@pytest.mark.parametrize("max_tokens", [60, 120, 200])
+def test_chunks_with_heading_prefix_stay_within_max_tokens(max_tokens):
+    children, parents = chunk_markdown(MD, max_tokens=max_tokens, overlap=20)
+    assert len(children) > 2
+    for c in children:
+        assert c.text.startswith(c.heading + "\n")
+        assert estimate_tokens(c.text) <= max_tokens
+    assert len(parents) == 1
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from app.llm import embed_cache
+from app.llm.embed_cache import EmbeddingCache, cache_key
+
+
+def test_cache_key_normalizes_text_but_not_model_task_or_dim():
+    k = cache_key("m", "RETRIEVAL_QUERY", 768, "Can I cancel my flight?")
+    assert cache_key("m", "RETRIEVAL_QUERY", 768, "  can i CANCEL   my flight ") == k
+    assert cache_key("m2", "RETRIEVAL_QUERY", 768, "Can I cancel my flight?") != k
+    assert cache_key("m", "RETRIEVAL_DOCUMENT", 768, "Can I cancel my flight?") != k
+    assert cache_key("m", "RETRIEVAL_QUERY", 256, "Can I cancel my flight?") != k
+    assert cache_key("m", "RETRIEVAL_QUERY", 768, "Can I cancel my booking?") != k
+
+
+def test_lru_evicts_least_recently_used():
+    c = EmbeddingCache(max_items=2)
+    c.put_many({"a": [1.0], "b": [2.0]})
+    assert c.get_many(["a"]) == {"a": [1.0]}  # b is now the oldest
+    c.put_many({"c": [3.0]})
+    assert c.get_many(["a", "b", "c"]) == {"a": [1.0], "c": [3.0]}
+    assert c.stats()["memory_items"] == 2
+    assert (c.hits, c.misses) == (3, 1)
+
+
+def test_sqlite_tier_serves_hits_across_instances(tmp_path):
+    db = str(tmp_path / "emb.sqlite")
+    EmbeddingCache(max_items=8, db_path=db).put_many({"a": [0.5, 0.25]})
+    c = EmbeddingCache(max_items=8, db_path=db)
+    assert c.get_many(["a", "b"]) == {"a": [0.5, 0.25]}
+    assert (c.disk_hits, c.misses) == (1, 1)
+    assert c.get_many(["a"]) == {"a": [0.5, 0.25]}
+    assert c.disk_hits == 1  # second read served from memory
+
+
+def rows(c):
+    return {k for (k,) in c._db.execute("SELECT key FROM embeddings")}
+
+
+def test_sqlite_tier_prunes_least_recently_used_beyond_max_rows(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(embed_cache.time, "time", lambda: now[0])
+    db = str(tmp_path / "emb.sqlite")
+    c = EmbeddingCache(max_items=0, db_path=db, max_rows=3)
+    for k in "abc":
+        now[0] += 1
+        c.put_many({k: [1.0]})
+    now[0] += 1
+    assert c.get_many(["a"])  # disk hit refreshes a's ts
+    now[0] += 1
+    c.put_many({"d": [1.0], "e": [1.0]})
+    assert rows(c) == {"a", "d", "e"}
+
+    # reopening with a smaller cap prunes on open
+    assert rows(EmbeddingCache(max_items=0, db_path=db, max_rows=1)) == {"e"}
+
+
+def test_sqlite_tier_drops_rows_past_ttl_on_open(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(embed_cache.time, "time", lambda: now[0])
+    db = str(tmp_path / "emb.sqlite")
+    c = EmbeddingCache(db_path=db)
+    c.put_many({"old": [1.0]})
+    now[0] += 50
+    c.put_many({"new": [1.0]})
+    now[0] += 20
+    assert rows(EmbeddingCache(db_path=db, ttl=60)) == {"new"}
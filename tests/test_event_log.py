@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import json
+
+from app.core import metrics
+from app.core.event_log import EventLogSink
+
+
+def test_flush_writes_and_returns_after_close(tmp_path):
+    path = tmp_path / "logs.jsonl"
+    sink = EventLogSink(str(path), flush_interval=60)
+    sink.emit({"n": 1})
+    assert sink.flush(timeout=5)
+    assert [json.loads(line)["n"] for line in path.read_text().splitlines()] == [1]
+
+    sink.close()
+    assert sink.flush() is True  # timeout=None must not block on a stopped writer
+    sink.emit({"n": 2})
+    assert sink.dropped == 1
+
+
+def test_write_errors_are_counted(tmp_path, capsys):
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    metrics.REGISTRY.reset()
+    sink = EventLogSink(str(blocker / "logs.jsonl"))
+    sink.emit({"n": 1})
+    sink.emit({"n": 2})
+    assert sink.flush(timeout=5)
+    sink.close()
+    assert sink.dropped == 2
+    assert sum(metrics.REGISTRY.counters["log_events_dropped_total"].values()) == 2
+    assert "dropped 2 event(s)" in " ".join(capsys.readouterr().out.split())  # rich wraps long lines
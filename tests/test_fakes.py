@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from app.bench.fakes import FakeGmailService, make_message
+from app.email import gmail_client
+
+
+def test_batched_fetch_counts_one_round_trip_per_batch():
+    svc = FakeGmailService([make_message(f"m{i}", "Subject", "Body") for i in range(120)])
+    got, failed = gmail_client.batch_get_messages(svc, [f"m{i}" for i in range(120)], batch_size=50)
+    assert len(got) == 120 and failed == []
+    assert svc.calls == {"batch": 3}
+    assert svc.batched == {"messages.get": 120}
+
+
+def test_requests_are_counted_when_executed():
+    svc = FakeGmailService([make_message("m1", "Subject", "Body")])
+    req = svc.users().messages().get(userId="me", id="m1")
+    assert svc.calls == {}
+    req.execute()
+    assert svc.calls == {"messages.get": 1}
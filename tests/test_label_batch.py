@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from app.email import gmail_client
+from app.email.label_batch import LabelBatcher
+
+
+def test_id_requeued_during_flush_stays_pending(monkeypatch):
+    b = LabelBatcher()
+    b.queue("m1", ["SCANNED"], ["UNREAD"])
+    sent = []
+
+    def batch_modify(service, ids, add, remove):
+        sent.append((list(ids), add))
+        if len(sent) == 1:
+            b.queue("m1", ["REVIEW"], [])  # re-queued for another label mid-flush
+        return 1
+
+    monkeypatch.setattr(gmail_client, "batch_modify", batch_modify)
+    assert b.flush(None) == 1
+    assert b.is_pending("m1")
+    assert b.flush(None) == 1
+    assert not b.is_pending("m1")
+    assert sent == [(["m1"], ["SCANNED"]), (["m1"], ["REVIEW"])]
+
+
+def test_failed_group_is_requeued(monkeypatch):
+    b = LabelBatcher()
+    b.queue("m1", ["SCANNED"], [])
+
+    def boom(service, ids, add, remove):
+        raise RuntimeError("503")
+
+    monkeypatch.setattr(gmail_client, "batch_modify", boom)
+    try:
+        b.flush(None)
+    except RuntimeError:
+        pass
+    assert b.is_pending("m1") and len(b) == 1
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import json
+import os
+
+import pytest
+
+from app.core.log_retention import apply_retention
+from app.core.log_store import LogStore
+
+pytest.importorskip("pyarrow")
+pd = pytest.importorskip("pandas")
+from app.core.log_compact import ParquetLogs, _day  # noqa: E402
+
+DAY = 86400.0
+T0 = 1_700_000_000.0 - 1_700_000_000.0 % DAY  # midnight UTC
+
+
+def append(path, events):
+    with open(path, "a", encoding="utf-8") as f:
+        for ev in events:
+            f.write(json.dumps(ev) + "\n")
+
+
+@pytest.fixture
+def tiers(tmp_path):
+    """Three one-day segments (8 events, every 3h), compacted, plus one event in the active file."""
+    store = LogStore(str(tmp_path / "logs.jsonl"), str(tmp_path / "segments"))
+    for day in range(3):
+        append(store.path, [{"ts": T0 + day * DAY + h * 3600, "decision": "REPLY"} for h in range(0, 24, 3)])
+        assert store.rotate()
+    append(store.path, [{"ts": T0 + 3 * DAY, "decision": "SKIP"}])
+    parquet = ParquetLogs(str(tmp_path / "parquet"))
+    assert parquet.compact(store) == 3
+    return store, parquet
+
+
+def test_retention_prunes_the_parquet_tier(tiers):
+    store, parquet = tiers
+    mark = parquet.watermark()
+    cutoff = T0 + 1 * DAY + 12 * 3600  # midday of the second day
+
+    removed, _ = apply_retention(store, cutoff, parquet_dir=parquet.out_dir)
+    assert removed == 12
+
+    df = parquet.query()
+    assert len(df) == 12
+    assert df["ts"].min() == pd.to_datetime(cutoff, unit="s")
+    days = [f"date={_day(T0 + d * DAY)}" for d in (1, 2)]
+    assert sorted(os.listdir(parquet.out_dir)) == ["_compacted.json"] + days
+    man = parquet.manifest()
+    assert len([k for k in man if not k.startswith("_")]) == 2  # first segment ended before the cutoff
+    assert parquet.watermark() == mark
+
+    # a later compaction does not bring expired events back
+    assert parquet.compact(store) == 0
+    assert len(parquet.query()) == 12
+
+
+def test_retention_without_parquet_dir_leaves_parquet_alone(tiers):
+    store, parquet = tiers
+    apply_retention(store, T0 + 2 * DAY)
+    assert len(parquet.query()) == 24
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from app.core.log_store import LogStore
+
+
+def append(path, events):
+    with open(path, "a", encoding="utf-8") as f:
+        for ev in events:
+            f.write(json.dumps(ev) + "\n")
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Three closed segments of 100 events each plus 100 in the active file (ts 1..400)."""
+    s = LogStore(str(tmp_path / "logs.jsonl"), str(tmp_path / "segments"), checkpoint_every=10)
+    for seg in range(4):
+        append(s.path, [{"ts": float(seg * 100 + i), "n": seg * 100 + i} for i in range(1, 101)])
+        if seg < 3:
+            assert s.rotate()
+    return s
+
+
+def ns(events):
+    return [e["n"] for e in events]
+
+
+def test_since_returns_oldest_events_first(store):
+    assert ns(store.since(50.0, limit=5)) == [51, 52, 53, 54, 55]
+    assert ns(store.since(290.0, limit=20)) == list(range(291, 311))  # crosses into the next segment
+    assert ns(store.since(395.0)) == [396, 397, 398, 399, 400]
+    assert store.since(400.0) == []
+
+
+def test_since_pages_forward_without_gaps(store):
+    seen, cursor = [], 0.0
+    while True:
+        page = store.since(cursor, limit=37)
+        if not page:
+            break
+        seen += ns(page)
+        cursor = page[-1]["ts"]
+    assert seen == list(range(1, 401))
+
+
+def test_since_stops_reading_at_limit(store, monkeypatch):
+    opened = []
+    real_open = open
+
+    def spy(path, *a, **kw):
+        opened.append(str(path))
+        return real_open(path, *a, **kw)
+
+    monkeypatch.setattr("builtins.open", spy)
+    assert ns(store.since(10.0, limit=3)) == [11, 12, 13]
+    assert not any(p.endswith(("00000002.jsonl", "00000003.jsonl", "logs.jsonl")) for p in opened)
+
+
+def test_since_tolerates_slightly_out_of_order_active_file(tmp_path):
+    s = LogStore(str(tmp_path / "logs.jsonl"), str(tmp_path / "segments"))
+    # 5000 ordered events, then one stamped 0.5s before its predecessor
+    append(s.path, [{"ts": 1000.0 + i, "n": i} for i in range(5000)] + [{"ts": 5998.6, "n": "late"}])
+    assert ns(s.since(5998.0)) == [4999, "late"]
+    assert ns(s.since(2500.0, limit=2)) == [1501, 1502]
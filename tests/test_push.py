@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.core import config
+from app.email.push import encode_notification
+
+
+@pytest.fixture
+def push_app(monkeypatch):
+    monkeypatch.setattr(config, "PUSH_ENABLED", True)
+    monkeypatch.setattr(config, "PUSH_TOKEN", "")
+    monkeypatch.setattr(main, "LAST_PUSH_HISTORY_ID", 0)
+    monkeypatch.setattr(main, "INFLIGHT", set())
+    monkeypatch.setattr(main, "INGEST_QUEUE", None)
+    monkeypatch.setattr(main, "_PUSH_LOCK", None)
+    main.READY.set()
+    yield
+    main.READY.clear()
+
+
+def test_gmail_push_ignores_duplicate_and_stale_history_ids(push_app, monkeypatch):
+    started = []
+
+    async def on_push(history_id):
+        started.append(history_id)
+
+    monkeypatch.setattr(main, "_on_push", on_push)
+    client = TestClient(main.app)  # no `with`: the poller is not started
+    post = lambda h: client.post("/gmail/push", json=encode_notification("me@example.com", h)).json()
+    assert post(200) == {"ok": True}
+    assert post(200) == {"ok": True, "duplicate": True}
+    assert post(150) == {"ok": True, "duplicate": True}
+    assert post(201) == {"ok": True}
+    assert started == [200, 201]
+    assert client.post("/gmail/push", json={"message": {}}).json()["ok"] is False
+
+
+def test_on_push_claims_and_queues_ids_outside_the_lock(push_app, monkeypatch):
+    async def fetch_candidates(scheduled=False):
+        return [{"id": i} for i in ("m1", "m2", "m3", "busy")]
+
+    async def triage(ids):
+        return {mid: ["refund"] for mid in ids if mid != "m3"}  # m3 skipped on metadata
+
+    async def fetch_messages(ids, **kwargs):
+        return {mid: {"id": mid} for mid in ids}
+
+    async def flush_labels():
+        pass
+
+    monkeypatch.setattr(main, "_fetch_candidates", fetch_candidates)
+    monkeypatch.setattr(main, "triage", triage)
+    monkeypatch.setattr(main, "fetch_messages", fetch_messages)
+    monkeypatch.setattr(main, "flush_labels", flush_labels)
+    main.INFLIGHT.add("busy")
+
+    async def run():
+        main.INGEST_QUEUE = asyncio.Queue(maxsize=1)
+        main._PUSH_LOCK = asyncio.Lock()
+        task = asyncio.create_task(main._on_push(300))
+        await asyncio.sleep(0.01)
+        # blocked on the full queue, with both IDs claimed and the lock free
+        assert not task.done()
+        assert main.INFLIGHT == {"busy", "m1", "m2"}
+        assert not main._PUSH_LOCK.locked()
+        got = [await main.INGEST_QUEUE.get(), await main.INGEST_QUEUE.get()]
+        await task
+        return got
+
+    got = asyncio.run(run())
+    assert got == [("m1", {"id": "m1"}, ["refund"]), ("m2", {"id": "m2"}, ["refund"])]
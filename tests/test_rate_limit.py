@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import types
+
+import pytest
+from google.genai.errors import APIError
+
+from app.bench.fakes import make_gemini_client
+from app.core import config, metrics
+from app.llm import rate_limit
+from app.llm.rate_limit import RateLimitExceeded, TokenBucket, backoff_delay, retry_after
+
+
+def test_token_bucket_reserves_refunds_and_reports_wait(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    b = TokenBucket(60)  # 1 token/s, starts full
+    assert b.reserve(60) == 0.0
+    assert b.reserve(2) == pytest.approx(2.0)  # level -2: wait 2s
+    b.refund(2)
+    assert b.reserve(1) == pytest.approx(1.0)
+    now[0] += 1.0
+    assert b.reserve(0) == 0.0
+    assert TokenBucket(0).reserve(10 ** 6) == 0.0  # 0 = unlimited
+
+
+def test_retry_after_header_and_retry_delay_detail():
+    err = Exception("429")
+    err.response = types.SimpleNamespace(headers={"Retry-After": "7"})
+    assert retry_after(err) == 7.0
+    assert retry_after(Exception("RESOURCE_EXHAUSTED ... 'retryDelay': '12s'")) == 12.0
+    assert retry_after(Exception("boom")) is None
+
+
+def test_backoff_honours_hint_and_cap(monkeypatch):
+    monkeypatch.setattr(config, "GEMINI_BACKOFF_BASE", 1.0)
+    monkeypatch.setattr(config, "GEMINI_BACKOFF_MAX", 4.0)
+    assert all(0 <= backoff_delay(10) <= 4.0 for _ in range(50))
+    hinted = Exception("'retryDelay': '30s'")
+    assert all(30.0 <= backoff_delay(0, hinted) <= 31.0 for _ in range(50))
+
+
+@pytest.fixture
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(config, "GEMINI_BACKOFF_BASE", 0.001)
+    metrics.REGISTRY.reset()
+
+
+def failing(code):
+    def enter(kind):
+        raise APIError(code, {"error": {"code": code, "message": "failing", "status": "UNAVAILABLE" if code == 503 else "RESOURCE_EXHAUSTED"}})
+    return enter
+
+
+def test_generate_stops_at_the_retry_cap(fast_backoff):
+    llm = make_gemini_client(error_rate=1.0, max_retries=2)
+    with pytest.raises(APIError):
+        llm.generate("hello")
+    assert llm.client.calls == {"generate": 3}
+
+
+def test_document_embeds_retry_429_past_the_cap_until_the_deadline(fast_backoff, monkeypatch):
+    monkeypatch.setattr(config, "EMBED_RETRY_DEADLINE", 0.2)
+    llm = make_gemini_client(error_rate=1.0, max_retries=1)
+    with pytest.raises(APIError):
+        llm.embed(["policy text"], task="RETRIEVAL_DOCUMENT")
+    assert llm.client.calls["embed"] > 2
+    # queries keep the cap
+    llm.client.calls.clear()
+    with pytest.raises(APIError):
+        llm.embed(["question"], task="RETRIEVAL_QUERY")
+    assert llm.client.calls["embed"] == 2
+
+
+def test_document_embeds_do_not_retry_outages_past_the_cap(fast_backoff, monkeypatch):
+    monkeypatch.setattr(config, "EMBED_RETRY_DEADLINE", 60.0)
+    llm = make_gemini_client(max_retries=2)
+    llm.client._enter = failing(503)
+    with pytest.raises(APIError):
+        llm.embed(["policy text"], task="RETRIEVAL_DOCUMENT")
+
+
+def test_limiter_rejection_is_recorded_as_throttled(fast_backoff, monkeypatch):
+    monkeypatch.setattr(config, "GEMINI_RATE_LIMITS", "throttle-test-model=1:0")
+    llm = make_gemini_client(emb_model="throttle-test-model")
+    llm.embed(["one"], task="RETRIEVAL_QUERY", max_wait=0.01)
+    with pytest.raises(RateLimitExceeded):
+        llm.embed(["two"], task="RETRIEVAL_QUERY", max_wait=0.01)
+    throttled = metrics.REGISTRY.counters["llm_throttled_total"]
+    assert sum(throttled.values()) == 1
+    assert "llm_errors_total" not in metrics.REGISTRY.counters
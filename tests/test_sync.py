@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import pytest
+
+from app.email import gmail_client
+from app.email.sync import MailboxSync
+
+LABEL = "Label_in"
+
+
+class Mailbox:
+    """Stands in for the three gmail_client calls MailboxSync makes."""
+
+    def __init__(self):
+        self.inbox = []        # ids a full scan (the query) returns
+        self.added = []        # ids history.list reports since the last call
+        self.history_id = 100
+        self.expired = False
+        self.calls = []
+
+    def get_history_id(self, service):
+        return str(self.history_id)
+
+    def list_messages(self, service, q=None):
+        self.calls.append("full")
+        return [{"id": i} for i in self.inbox]
+
+    def list_history(self, service, start, label_id=None):
+        self.calls.append("history")
+        if self.expired:
+            raise gmail_client.HistoryExpired("404")
+        added, self.added = self.added, []
+        self.history_id += len(added)
+        return [{"id": i, "labelIds": [LABEL, "UNREAD"]} for i in added], str(self.history_id)
+
+
+@pytest.fixture
+def box(monkeypatch):
+    mb = Mailbox()
+    for name in ("get_history_id", "list_messages", "list_history"):
+        monkeypatch.setattr(gmail_client, name, getattr(mb, name))
+    return mb
+
+
+def ids(msgs):
+    return sorted(m["id"] for m in msgs)
+
+
+def test_full_scan_without_checkpoint_then_history(tmp_path, box):
+    state = str(tmp_path / "sync.json")
+    box.inbox = ["a"]
+    sync = MailboxSync(state, mode="history")
+    assert ids(sync.candidates(None, "q", LABEL)) == ["a"]
+    sync.done(["a"])
+
+    box.added = ["b"]
+    assert ids(sync.candidates(None, "q", LABEL)) == ["b"]
+    assert box.calls == ["full", "history"]
+
+    # a restart resumes from the saved historyId
+    box.calls.clear()
+    box.added = ["c"]
+    restarted = MailboxSync(state, mode="history")
+    assert restarted.history_id == sync.history_id
+    assert ids(restarted.candidates(None, "q", LABEL)) == ["b", "c"]  # "b" still pending
+    assert box.calls == ["history"]
+
+
+def test_unfinished_messages_are_reoffered(tmp_path, box):
+    state = str(tmp_path / "sync.json")
+    sync = MailboxSync(state, mode="history")
+    sync.candidates(None, "q", LABEL)
+
+    box.added = ["a", "b"]
+    assert ids(sync.candidates(None, "q", LABEL)) == ["a", "b"]
+    sync.done(["a"])  # "b" failed
+
+    box.added = ["c"]
+    assert ids(sync.candidates(None, "q", LABEL)) == ["b", "c"]
+
+    # crash before "b"/"c" finish: the pending set survives the restart
+    restarted = MailboxSync(state, mode="history")
+    assert ids(restarted.candidates(None, "q", LABEL)) == ["b", "c"]
+    restarted.done(["b", "c"])
+    assert restarted.pending == {}
+    assert MailboxSync(state, mode="history").pending == {}
+
+
+def test_gives_up_after_max_attempts(tmp_path, box):
+    sync = MailboxSync(str(tmp_path / "sync.json"), mode="history", max_attempts=2)
+    sync.candidates(None, "q", LABEL)
+    box.added = ["a"]
+    assert ids(sync.candidates(None, "q", LABEL)) == ["a"]
+    assert ids(sync.candidates(None, "q", LABEL)) == ["a"]
+    assert sync.candidates(None, "q", LABEL) == []
+    assert "a" not in sync.pending
+
+
+def test_in_flight_ids_are_not_reoffered_or_charged(tmp_path, box):
+    sync = MailboxSync(str(tmp_path / "sync.json"), mode="history", max_attempts=2)
+    sync.candidates(None, "q", LABEL)
+    box.added = ["a"]
+    assert ids(sync.candidates(None, "q", LABEL)) == ["a"]
+    for _ in range(5):  # "a" is still being processed
+        assert sync.candidates(None, "q", LABEL, inflight={"a"}) == []
+    assert sync.pending == {"a": 1}
+    # it failed after all: one retry left
+    assert ids(sync.candidates(None, "q", LABEL)) == ["a"]
+    assert sync.candidates(None, "q", LABEL) == []
+
+
+def test_expired_history_falls_back_to_full_scan(tmp_path, box):
+    sync = MailboxSync(str(tmp_path / "sync.json"), mode="history")
+    sync.candidates(None, "q", LABEL)
+    box.expired = True
+    box.inbox = ["x", "y"]
+    box.history_id = 500
+    assert ids(sync.candidates(None, "q", LABEL)) == ["x", "y"]
+    assert box.calls == ["full", "history", "full"]
+    assert sync.history_id == "500"
+
+
+def test_history_keeps_only_unread_inbox_messages(tmp_path, box, monkeypatch):
+    sync = MailboxSync(str(tmp_path / "sync.json"), mode="history")
+    sync.candidates(None, "q", LABEL)
+    monkeypatch.setattr(gmail_client, "list_history", lambda service, start, label_id=None: (
+        [{"id": "read", "labelIds": [LABEL]}, {"id": "new", "labelIds": [LABEL, "UNREAD"]}], "101"
+    ))
+    assert ids(sync.candidates(None, "q", LABEL)) == ["new"]
+
+
+def test_only_scheduled_polls_advance_full_scan_cadence(tmp_path, box):
+    sync = MailboxSync(str(tmp_path / "sync.json"), mode="history", full_every=3)
+    sync.candidates(None, "q", LABEL)                      # startup full scan (poll 1)
+    for _ in range(5):
+        sync.candidates(None, "q", LABEL, scheduled=False)  # push-triggered reads
+    sync.candidates(None, "q", LABEL)                      # poll 2
+    assert box.calls == ["full"] + ["history"] * 6
+    sync.candidates(None, "q", LABEL)                      # poll 3 -> safety full scan
+    assert box.calls[-1] == "full"
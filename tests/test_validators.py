@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import json
+
+from app.llm.validators import detect_pii, parse_fused, verify_grounding
+
+POLICY = [
+    "Q: Can I cancel within 24 hours?\nA: Yes, cancel within 24 hours of booking for a full refund. "
+    "Call +1-877-507-7341 to cancel.",
+    "Q: What is the baggage allowance?\nA: Economy passengers may check one bag up to 23 kg.",
+]
+OK = {"grounded": True, "tone_ok": True, "contains_pii": False, "needs_escalation": False}
+
+
+def fused(reply, citations=("C1",), **self_check):
+    return json.dumps({"reply": reply, "citations": list(citations), "self_check": {**OK, **self_check}})
+
+
+def test_parse_fused_reads_fenced_json_and_normalizes_fields():
+    obj = parse_fused("```json\n" + json.dumps({"reply": "Hi", "citations": [1, "C2"], "self_check": "yes"}) + "\n```")
+    assert obj["reply"] == "Hi"
+    assert obj["citations"] == ["1", "C2"]
+    assert obj["self_check"] == {}
+
+
+def test_parse_fused_rejects_missing_or_empty_reply():
+    assert parse_fused("") is None
+    assert parse_fused("not json") is None
+    assert parse_fused(json.dumps({"reply": "  ", "citations": []})) is None
+    assert parse_fused(json.dumps(["reply"])) is None
+
+
+def verdict(raw, context=POLICY, min_support=0.6):
+    f = parse_fused(raw)
+    return verify_grounding(f["reply"], f["citations"], f["self_check"], context, min_support)
+
+
+def test_verify_grounding_passes_reply_supported_by_cited_chunk():
+    out = verdict(fused("Hello, you can cancel within 24 hours of booking for a full refund. Thank you."))
+    assert out["verdict"] == "pass"
+    assert out["cited"] == [0]
+    assert out["support"] >= 0.6
+
+
+def test_verify_grounding_needs_support_from_the_cited_chunk():
+    # correct chunk exists, but the reply cites the wrong one
+    out = verdict(fused("You can cancel within 24 hours of booking for a full refund.", citations=["C2"]))
+    assert out["verdict"] == "inconclusive"
+    assert out["reason"].startswith("Low citation support")
+
+    assert verdict(fused("You can cancel for a refund.", citations=["C9"]))["reason"] == "No valid citations"
+
+
+def test_verify_grounding_fails_on_self_check_or_pii():
+    assert verdict(fused("Cancel within 24 hours.", grounded=False))["verdict"] == "fail"
+    assert verdict(fused("Cancel within 24 hours.", contains_pii=True))["verdict"] == "fail"
+
+    out = verdict(fused("Cancel within 24 hours; we will email jane.doe@example.com the refund."))
+    assert out["verdict"] == "fail"
+    assert out["pii_draft"] == ["email_address"]
+
+
+def test_verify_grounding_allows_numbers_quoted_from_cited_policy():
+    reply = "You can cancel within 24 hours of booking for a full refund. Call +1-877-507-7341 to cancel."
+    assert detect_pii(reply) == ["phone_number_like"]
+    out = verdict(fused(reply))
+    assert out["pii_draft"] == []
+    assert out["verdict"] == "pass"
+
+    # the same number is PII when the cited chunk does not contain it
+    assert verdict(fused(reply, citations=["C2"]))["pii_draft"] == ["phone_number_like"]
+
+
+def test_verify_grounding_escalation_request_is_inconclusive():
+    out = verdict(fused("You can cancel within 24 hours of booking for a full refund.", needs_escalation=True))
+    assert out["verdict"] == "inconclusive"